@@ -10,6 +10,8 @@ import { escapeHTML } from './utils.js';
 window.currentUser = null;
 window.personnelCurrentPage = 1;
 window.userCurrentPage = 1;
+// Cursor that opens each listing page; index 0 (page 1) is always null.
+window.pageCursors = { personnelCurrentPage: [null], userCurrentPage: [null] };
 
 // --- Auto Logout Feature ---
 let inactivityTimer;
@@ -174,6 +176,8 @@ window.loadDataForPane = async function(paneId) {
     }
     if (paneConfig.pageState) {
         payload.page = window[paneConfig.pageState];
+        payload.cursor = window.pageCursors[paneConfig.pageState][payload.page - 1] || null;
+        payload.includeTotal = true;
     }
 
     try {
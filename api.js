@@ -2,20 +2,29 @@
 // Handles all communication with the backend server.
 
 const API_URL = '/api';
+const MAX_BUSY_RETRIES = 2;
 
 export async function sendRequest(action, payload = {}) {
     // No need to check for sessionToken here, the HttpOnly cookie is sent automatically by the browser.
     
     try {
-        const response = await fetch(API_URL, {
-            method: 'POST',
-            cache: 'no-cache',
-            headers: {
-                'Content-Type': 'application/json',
-                // Authorization header is no longer needed as we use HttpOnly cookies.
-            },
-            body: JSON.stringify({ action, payload })
-        });
+        let response;
+        for (let attempt = 0; ; attempt++) {
+            response = await fetch(API_URL, {
+                method: 'POST',
+                cache: 'no-cache',
+                headers: {
+                    'Content-Type': 'application/json',
+                    // Authorization header is no longer needed as we use HttpOnly cookies.
+                },
+                body: JSON.stringify({ action, payload })
+            });
+            // 503 means the server turned the request away before running it at a peak.
+            // Come back when it says, spread out so the retries do not all arrive together.
+            if (response.status !== 503 || attempt >= MAX_BUSY_RETRIES) break;
+            const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 3;
+            await new Promise(resolve => setTimeout(resolve, (retryAfter + Math.random()) * 1000));
+        }
 
         if (response.status === 401) {
             // Unauthorized, clear local data and redirect to login page.
@@ -36,3 +45,21 @@ export async function sendRequest(action, payload = {}) {
         throw new Error(error.message || 'การเชื่อมต่อกับเซิร์ฟเวอร์ล้มเหลว');
     }
 }
+
+// Builds a GET URL for a server-side streaming export (CSV/XLSX).
+// Navigating to it lets the browser save the file straight to disk.
+export function buildExportUrl(action, params = {}) {
+    const query = new URLSearchParams({ action, ...params });
+    return `/export?${query.toString()}`;
+}
+
+// Starts an export download without leaving the page, so requests already in
+// flight (such as the archive that follows an export) are not cancelled.
+export function downloadExport(action, params = {}) {
+    const link = document.createElement('a');
+    link.href = buildExportUrl(action, params);
+    link.download = '';
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+}
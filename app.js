@@ -5,14 +5,18 @@ import { sendRequest } from './api.js';
 import * as ui from './ui.js';
 import * as handlers from './handlers.js';
 import { escapeHTML } from './utils.js';
+import { syncRoster, rosterOfficers, rosterStatusesAfter } from './roster.js';
 
 // --- Global State and DOM References ---
 window.currentUser = null;
 window.currentWeeklyReports = [];
+window.currentWeekStartDate = null;
 window.allArchivedReports = {};
 window.allHistoryData = {};
 window.personnelCurrentPage = 1;
 window.userCurrentPage = 1;
+// Cursor that opens each listing page; index 0 (page 1) is always null.
+window.pageCursors = { personnelCurrentPage: [null], userCurrentPage: [null] };
 window.holidayDatepicker = null; // To store the holiday datepicker instance
 
 // --- Auto Logout Feature ---
@@ -347,7 +351,7 @@ window.loadDataForPane = async function(paneId) {
         'pane-active-statuses': { action: 'get_active_statuses', renderer: ui.renderActiveStatuses },
         'pane-personnel': { action: 'list_personnel', renderer: ui.renderPersonnel, searchInput: personnelSearchInput, pageState: 'personnelCurrentPage' },
         'pane-admin': { action: 'list_users', renderer: ui.renderUsers, searchInput: userSearchInput, pageState: 'userCurrentPage' },
-        'pane-submit-status': { action: 'list_personnel', renderer: ui.renderStatusSubmissionForm, fetchAll: true },
+        'pane-submit-status': { action: 'list_personnel', renderer: ui.renderStatusSubmissionForm, fetchAll: true, withRoster: true },
         'pane-history': { action: 'get_submission_history', renderer: ui.renderSubmissionHistory },
         'pane-report': { action: 'get_status_reports', renderer: ui.renderWeeklyReport },
         'pane-archive': { action: 'get_archived_reports', renderer: (res) => {
@@ -370,10 +374,16 @@ window.loadDataForPane = async function(paneId) {
     }
     if (paneConfig.pageState) {
         payload.page = window[paneConfig.pageState];
+        payload.cursor = window.pageCursors[paneConfig.pageState][payload.page - 1] || null;
+        payload.includeTotal = true;
     }
     if (paneConfig.fetchAll) {
         payload.fetchAll = true;
     }
+    if (paneConfig.withRoster) {
+        // The roster comes from the local copy; the server only sends the form's context.
+        payload.rosterCached = true;
+    }
 
     if (paneId === 'pane-submit-status' && window.currentUser.role === 'admin') {
         const deptSelector = document.getElementById('admin-dept-selector');
@@ -383,8 +393,15 @@ window.loadDataForPane = async function(paneId) {
     }
 
     try {
-        const res = await sendRequest(paneConfig.action, payload);
+        const [res] = await Promise.all([
+            sendRequest(paneConfig.action, payload),
+            paneConfig.withRoster ? syncRoster() : null
+        ]);
         if (res && res.status === 'success') {
+            if (paneConfig.withRoster) {
+                res.personnel = rosterOfficers();
+                res.persistent_statuses = rosterStatusesAfter(res.persistent_statuses_after);
+            }
             if (paneConfig.renderer) {
                 paneConfig.renderer(res);
             }
@@ -1,8 +1,8 @@
 // app_daily.js
 // Main application file for the DAILY reporting system.
 
-import { sendRequest } from './api.js';
-import { escapeHTML, formatThaiDateArabic, formatThaiDateRangeArabic, exportDailyReportToExcel } from './utils.js';
+import { sendRequest, downloadExport } from './api.js';
+import { escapeHTML, formatThaiDateArabic, formatThaiDateRangeArabic } from './utils.js';
 import { showMessage, createEmptyState, thai_locale, addStatusRow } from './ui.js';
 
 // --- Global State and DOM References ---
@@ -731,19 +731,14 @@ async function handleSubmitStatusReport() {
     }
 }
 
-async function handleExportDailyReport() {
-    showMessage("กำลังเตรียมข้อมูลสำหรับ Export...", true);
-    try {
-        const res = await sendRequest('get_daily_reports', {});
-        if (res.status === 'success' && res.reports?.length > 0) {
-            const reportDateFormatted = formatThaiDateArabic(res.date);
-            exportDailyReportToExcel(res.reports, `รายงานประจำวัน-${res.date}.xlsx`, reportDateFormatted);
-        } else {
-            showMessage("ไม่พบข้อมูลรายงานประจำวันที่จะ Export", false);
-        }
-    } catch (error) {
-        showMessage(error.message, false);
+function handleExportDailyReport() {
+    const reportDate = reportContainerDaily?.dataset.reportDate;
+    if (!reportDate) {
+        showMessage("ไม่พบข้อมูลรายงานประจำวันที่จะ Export", false);
+        return;
     }
+    // The server streams the workbook; no report data passes through the page.
+    downloadExport('export_daily_reports', { format: 'xlsx', start_date: reportDate, end_date: reportDate });
 }
 
 async function handleArchiveDailyReport() {
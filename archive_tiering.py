@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# archive_tiering.py
+# Moves a closed year of archived weekly/daily reports out of the main
+# database into its own file (archives/<db name>_<year>.db) and VACUUMs the
+# main file. The server keeps serving those archives by ATTACHing the file.
+import argparse
+import os
+import sqlite3
+from datetime import date, datetime
+
+import web_server
+
+ARCHIVE_TABLES = ["archived_reports", "archived_daily_reports"]
+
+
+def _year_filter(table):
+    if table == "archived_daily_reports":
+        return "year = :year"
+    return "timestamp >= :start AND timestamp < :end"
+
+
+def list_tiers(db_file):
+    web_server.DB_FILE = db_file
+    conn = sqlite3.connect(db_file)
+    try:
+        for year, moved_at in conn.execute("SELECT year, moved_at FROM archive_tiers ORDER BY year"):
+            path = web_server.archive_tier_path(year, db_file)
+            size = f"{os.path.getsize(path) / (1024 * 1024):.1f} MB" if os.path.exists(path) else "ไม่พบไฟล์!"
+            print(f"{year}: {path} ({size}, ย้ายเมื่อ {moved_at})")
+    finally:
+        conn.close()
+
+
+def rollover_year(db_file, year, vacuum=True):
+    """Copies `year` into its tier file, then deletes it from the main file."""
+    if year >= date.today().year:
+        print(f"ข้อผิดพลาด: ปี {year} ยังไม่สิ้นสุด ย้ายได้เฉพาะปีที่ผ่านมาแล้ว")
+        return False
+    if not os.path.exists(db_file):
+        print(f"ข้อผิดพลาด: ไม่พบไฟล์ฐานข้อมูล '{db_file}'")
+        return False
+
+    web_server.DB_FILE = db_file
+    web_server.init_db()
+    params = {"year": year, "start": f"{year}-01-01", "end": f"{year + 1}-01-01"}
+    tier_path = web_server.archive_tier_path(year, db_file)
+    os.makedirs(os.path.dirname(tier_path), exist_ok=True)
+
+    conn = sqlite3.connect(db_file, timeout=web_server.DB_BUSY_TIMEOUT)
+    try:
+        # get_daily_target_date() continues from the newest archived day, so it must stay in the main file.
+        newest = conn.execute("SELECT MAX(report_date) FROM archived_daily_reports").fetchone()[0]
+        if newest and int(newest[:4]) == year:
+            print(f"ข้อผิดพลาด: รายงานประจำวันล่าสุด ({newest}) อยู่ในปี {year} ยังย้ายไม่ได้")
+            return False
+
+        conn.execute("ATTACH DATABASE ? AS tier", (tier_path,))
+        for table in ARCHIVE_TABLES:
+            create_sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+            conn.execute(create_sql.replace(f"CREATE TABLE {table}", f"CREATE TABLE IF NOT EXISTS tier.{table}", 1)
+                         .replace(f"CREATE TABLE IF NOT EXISTS {table}", f"CREATE TABLE IF NOT EXISTS tier.{table}", 1))
+
+        # Step 1: copy into the tier file. Re-running after a crash simply overwrites the same rows.
+        print(f"กำลังคัดลอกข้อมูลปี {year} ไปยัง {tier_path}...")
+        counts = {}
+        for table in ARCHIVE_TABLES:
+            where = _year_filter(table)
+            conn.execute(f"INSERT OR REPLACE INTO tier.{table} SELECT * FROM main.{table} WHERE {where}", params)
+            counts[table] = conn.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {where}", params).fetchone()[0]
+            print(f" -> {table}: {counts[table]} แถว")
+        conn.commit()
+
+        for table in ARCHIVE_TABLES:
+            copied = conn.execute(f"SELECT COUNT(*) FROM tier.{table} WHERE {_year_filter(table)}", params).fetchone()[0]
+            if copied < counts[table]:
+                print(f"ข้อผิดพลาด: คัดลอก {table} ไม่ครบ ({copied}/{counts[table]}) ยกเลิกการย้าย")
+                return False
+
+        # Step 2: register the tier and drop the rows from the main file in one transaction.
+        for table in ARCHIVE_TABLES:
+            conn.execute(f"DELETE FROM main.{table} WHERE {_year_filter(table)}", params)
+        conn.execute("INSERT OR REPLACE INTO main.archive_tiers (year, moved_at) VALUES (?, ?)", (year, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        conn.commit()
+        conn.execute("DETACH DATABASE tier")
+        print(f" -> ย้ายข้อมูลปี {year} สำเร็จ")
+
+        if vacuum:
+            size_before = os.path.getsize(db_file)
+            print("กำลัง VACUUM ไฟล์ฐานข้อมูลหลัก...")
+            # VACUUM also switches older files over to incremental vacuum (see MAINTENANCE_JOBS).
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            print(f" -> ขนาดไฟล์ {size_before / (1024 * 1024):.1f} MB -> {os.path.getsize(db_file) / (1024 * 1024):.1f} MB")
+        return True
+    except sqlite3.Error as e:
+        print(f"เกิดข้อผิดพลาดในการเชื่อมต่อฐานข้อมูล: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ย้ายรายงานที่เก็บถาวรของปีที่ปิดแล้วไปยังไฟล์แยกรายปี")
+    parser.add_argument("--db", default=web_server.DB_FILE, help="ไฟล์ฐานข้อมูลหลัก")
+    parser.add_argument("--year", type=int, help="ปี ค.ศ. ที่ต้องการย้าย เช่น 2023")
+    parser.add_argument("--list", action="store_true", help="แสดงรายการปีที่ย้ายไปแล้ว")
+    parser.add_argument("--no-vacuum", action="store_true", help="ไม่ต้อง VACUUM ไฟล์หลักหลังย้าย")
+    args = parser.parse_args()
+
+    if args.list:
+        list_tiers(args.db)
+    elif args.year:
+        rollover_year(args.db, args.year, vacuum=not args.no_vacuum)
+    else:
+        parser.print_help()
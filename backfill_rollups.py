@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# backfill_rollups.py
+# Rebuilds the monthly daily-report rollups (daily_rollups,
+# daily_status_rollups) from every archived daily report, including the
+# per-year cold tiers. Run once after upgrading, or whenever the rollups
+# need to be checked against the archives.
+import argparse
+import os
+import sqlite3
+
+import web_server
+
+
+def backfill(db_file):
+    if not os.path.exists(db_file):
+        print(f"ข้อผิดพลาด: ไม่พบไฟล์ฐานข้อมูล '{db_file}'")
+        return False
+
+    web_server.DB_FILE = db_file
+    web_server.init_db()
+    conn = sqlite3.connect(db_file, timeout=web_server.DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    try:
+        print("กำลังคำนวณสรุปรายเดือนจากรายงานประจำวันที่เก็บถาวร...")
+        processed = web_server.rebuild_daily_rollups(conn)
+        months = conn.execute("SELECT COUNT(DISTINCT year * 100 + month) FROM daily_rollups").fetchone()[0]
+        print(f" -> ประมวลผล {processed} รายงาน ({months} เดือน)")
+        return True
+    except sqlite3.Error as e:
+        print(f"เกิดข้อผิดพลาดในการเชื่อมต่อฐานข้อมูล: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="สร้างตารางสรุปรายเดือนของรายงานประจำวันใหม่ทั้งหมด")
+    parser.add_argument("--db", default=web_server.DB_FILE, help="ไฟล์ฐานข้อมูลหลัก")
+    args = parser.parse_args()
+    backfill(args.db)
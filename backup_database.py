@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# backup_database.py
+# Takes an online snapshot of the database while the server keeps running
+# (see backup_database in web_server.py) and keeps the newest N copies in
+# backups/. Safe to run from cron / Task Scheduler.
+import argparse
+import os
+import sys
+
+import web_server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="สำรองฐานข้อมูลขณะเซิร์ฟเวอร์ทำงาน")
+    parser.add_argument("--db", default=web_server.DB_FILE, help="ไฟล์ฐานข้อมูล")
+    parser.add_argument("--keep", type=int, default=web_server.BACKUP_KEEP, help="จำนวนไฟล์สำรองล่าสุดที่เก็บไว้")
+    parser.add_argument("--list", action="store_true", help="แสดงรายการไฟล์สำรองที่มีอยู่")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"ข้อผิดพลาด: ไม่พบไฟล์ฐานข้อมูล '{args.db}'")
+
+    if args.list:
+        for path in web_server.list_backups(args.db):
+            print(f"{path.name} ({path.stat().st_size / (1024 * 1024):.1f} MB)")
+        sys.exit(0)
+
+    print(f"กำลังสำรองข้อมูล '{args.db}'...")
+    try:
+        result = web_server.backup_database(args.db, args.keep)
+    except web_server.BackupError as e:
+        sys.exit(f"สำรองข้อมูลไม่สำเร็จ: {e}")
+    print(f" -> {result['file']}: {result['pages']} หน้า, {result['size_kb']} KB, {result['seconds']} วินาที (integrity_check ผ่าน)")
+    for name in result["removed"]:
+        print(f" -> ลบไฟล์สำรองเก่า {name}")
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# benchmark_handlers.py
+# Calls every handle_* action directly against a generated database and
+# records wall time and peak Python memory, so regressions show up in review.
+#
+#   python generate_dataset.py --db bench_database.db
+#   python benchmark_handlers.py --db bench_database.db --output bench_baseline.json
+#   python benchmark_handlers.py --db bench_database.db --compare bench_baseline.json
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import web_server
+from generate_dataset import USER_PASSWORD
+
+
+class _NoCommitConnection:
+    """Wraps a connection so handlers can 'commit' without changing the benchmark database."""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def commit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class CaseFailed(Exception):
+    """The handler did not answer with status 'success', so its timing would be meaningless."""
+
+
+def _build_cases(cursor):
+    """Returns (action_name, payload, session) tuples built from the rows already in the database."""
+    cursor.execute("SELECT username, department FROM users WHERE role = 'user' ORDER BY username LIMIT 1")
+    user = cursor.fetchone()
+    if not user:
+        sys.exit("ไม่พบผู้ใช้ทั่วไปในฐานข้อมูล กรุณาสร้างด้วย generate_dataset.py ก่อน")
+    department = user['department']
+    admin_session = {"username": "jeerawut", "role": "admin", "department": "ส่วนกลาง", "token": "bench-admin"}
+    user_session = {"username": user['username'], "role": "user", "department": department, "token": "bench-user"}
+
+    cursor.execute("SELECT * FROM personnel WHERE department = ?", (department,))
+    dept_personnel = [dict(row) for row in cursor.fetchall()]
+    person = dept_personnel[0]
+    cursor.execute("SELECT id FROM status_reports LIMIT 1")
+    report_row = cursor.fetchone()
+    cursor.execute("SELECT report_id, source FROM submission_history WHERE department = ? ORDER BY timestamp DESC LIMIT ?",
+                   (department, web_server.HISTORY_PAGE_SIZE))
+    history_rows = cursor.fetchall()
+    if not any(row['source'] == 'archived' for row in history_rows):
+        sys.exit("ดัชนีประวัติการส่งรายงานไม่มีรายงานที่เก็บถาวร กรุณาสร้างฐานข้อมูลใหม่ด้วย generate_dataset.py")
+    history_ids = [row['report_id'] for row in history_rows]
+    target_date = web_server.get_daily_target_date(cursor).isoformat()
+    roster_version = web_server.current_roster_version(cursor)
+    year_before_target = (web_server.date.fromisoformat(target_date) - web_server.timedelta(days=365)).isoformat()
+
+    classified = web_server.classify_personnel(dept_personnel)
+    report_items = [
+        {"personnel_id": p['id'], "personnel_name": f"{p['rank']} {p['first_name']} {p['last_name']}",
+         "status": "ราชการ", "details": "benchmark", "start_date": target_date, "end_date": target_date}
+        for p in dept_personnel[:max(1, len(dept_personnel) // 10)]
+    ]
+    daily_report_data = {k: [i for i in report_items if i['personnel_id'] in {p['id'] for p in v}] for k, v in classified.items()}
+    daily_summary = {k: {"total": len(v), "available": len(v) - len(daily_report_data[k]), "mission": len(daily_report_data[k])} for k, v in classified.items()}
+
+    personnel_import = [{k: p[k] for k in ('rank', 'first_name', 'last_name', 'position', 'specialty', 'department')} for p in dept_personnel]
+
+    return [
+        ("login", {"username": user['username'], "password": USER_PASSWORD}, None),
+        ("get_dashboard_summary", {}, admin_session),
+        ("list_users", {"page": 1, "searchTerm": ""}, admin_session),
+        ("list_personnel", {"page": 1, "searchTerm": ""}, admin_session),
+        ("list_personnel", {"fetchAll": True}, admin_session),
+        ("list_personnel", {"fetchAll": True}, user_session),
+        ("sync_roster", {"since": 0}, admin_session),
+        ("sync_roster", {"since": max(0, roster_version - 50)}, user_session),
+        ("get_personnel_details", {"id": person['id']}, admin_session),
+        ("update_personnel", {"data": dict(person)}, admin_session),
+        ("import_personnel", {"personnel": personnel_import}, admin_session),
+        ("submit_status_report", {"report": {"department": department, "items": report_items}}, user_session),
+        ("get_status_reports", {}, admin_session),
+        ("get_archived_reports", {}, admin_session),
+        ("get_submission_history", {}, user_session),
+        ("get_submission_reports", {"ids": history_ids}, user_session),
+        ("get_report_for_editing", {"id": report_row['id'] if report_row else ""}, user_session),
+        ("get_active_statuses", {}, admin_session),
+        ("get_active_statuses", {}, user_session),
+        ("get_availability_range", {"start_date": target_date, "end_date": (web_server.date.fromisoformat(target_date) + web_server.timedelta(days=90)).isoformat()}, admin_session),
+        ("get_daily_dashboard_summary", {}, admin_session),
+        ("get_daily_personnel_for_submission", {}, user_session),
+        ("submit_daily_report", {"data": {"department": department, "report_date": target_date, "report_data": daily_report_data, "summary_data": daily_summary}}, user_session),
+        ("get_daily_submission_history", {}, admin_session),
+        ("get_daily_final_report", {}, admin_session),
+        ("get_archived_daily_reports", {}, admin_session),
+        ("archive_daily_reports", {"report_date": target_date}, admin_session),
+        ("archive_reports", {}, admin_session),
+        ("get_daily_trends", {"start": f"{target_date[:4]}-01", "end": target_date[:7]}, admin_session),
+        ("list_holidays", {}, admin_session),
+        ("export_daily_reports", {"format": "csv", "start_date": year_before_target, "end_date": target_date}, admin_session),
+        ("export_weekly_reports", {"format": "xlsx", "start_date": year_before_target, "end_date": target_date}, admin_session),
+    ]
+
+
+def _call_handler(action_name, payload, session, conn):
+    handler = web_server.APIHandler.ACTION_MAP[action_name]["handler"]
+    params = inspect.signature(handler).parameters
+    kwargs = {"payload": payload, "conn": _NoCommitConnection(conn), "cursor": conn.cursor()}
+    if "session" in params:
+        kwargs["session"] = session or {}
+    if "client_address" in params:
+        kwargs["client_address"] = ("127.0.0.1", 0)
+    try:
+        # Handlers print progress messages; keep them out of the result table.
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = handler(**kwargs)
+            if isinstance(response, web_server.StreamingResponse):
+                # Exports read their rows while the file is sent; drain it so the timing covers them.
+                try:
+                    for _ in response.chunks:
+                        pass
+                finally:
+                    response.close()
+                return response
+        if isinstance(response, tuple):
+            response = response[0]
+        if response.get("status") != "success":
+            raise CaseFailed(response.get("message", response.get("status")))
+        return response
+    finally:
+        # Writes made on conn are rolled back so each run sees the same data.
+        # Submissions commit through the writer thread, but they only replace
+        # the same department's report on every run.
+        conn.rollback()
+
+
+def run_benchmarks(db_file, repeat=5):
+    web_server.DB_FILE = db_file
+    # Bring databases generated by older versions up to the current schema.
+    with contextlib.redirect_stdout(io.StringIO()):
+        web_server.init_db()
+    conn = web_server.get_db_connection()
+    cases = _build_cases(conn.cursor())
+    results = []
+    for action_name, payload, session in cases:
+        label = action_name
+        if session:
+            label += f"[{session['role']}]"
+        if payload.get("fetchAll"):
+            label += "[fetchAll]"
+
+        timings = []
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _call_handler(action_name, payload, session, conn)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            tracemalloc.start()
+            _call_handler(action_name, payload, session, conn)
+            _, peak = tracemalloc.get_traced_memory()
+        except CaseFailed as e:
+            results.append({"case": label, "error": str(e)})
+            print(f"{label:<55} ล้มเหลว: {e}")
+            continue
+        finally:
+            tracemalloc.stop()
+
+        results.append({
+            "case": label,
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "peak_kb": round(peak / 1024, 1)
+        })
+        print(f"{label:<55} {results[-1]['median_ms']:>10.2f} ms {results[-1]['peak_kb']:>12.1f} KB")
+    conn.close()
+    return results
+
+
+def compare(results, baseline_file, threshold):
+    """Prints cases that got slower or hungrier than the baseline; returns True if any regressed."""
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = {r["case"]: r for r in json.load(f)["results"]}
+    regressed = False
+    print(f"\nเปรียบเทียบกับ '{baseline_file}' (เกณฑ์ +{threshold:.0%}):")
+    for r in results:
+        base = baseline.get(r["case"])
+        if not base or "error" in r or "error" in base:
+            continue
+        for metric in ("median_ms", "peak_kb"):
+            if base[metric] and r[metric] > base[metric] * (1 + threshold):
+                regressed = True
+                print(f" -> {r['case']}: {metric} {base[metric]} -> {r[metric]}")
+    if not regressed:
+        print(" -> ไม่พบการถดถอยของประสิทธิภาพ")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="วัดเวลาและหน่วยความจำของ handler แต่ละตัว")
+    parser.add_argument("--db", default="bench_database.db", help="ฐานข้อมูลที่สร้างจาก generate_dataset.py")
+    parser.add_argument("--repeat", type=int, default=5, help="จำนวนรอบที่วัดต่อ handler")
+    parser.add_argument("--output", help="บันทึกผลเป็นไฟล์ JSON")
+    parser.add_argument("--compare", help="ไฟล์ JSON ผลลัพธ์เดิมที่ใช้เปรียบเทียบ")
+    parser.add_argument("--threshold", type=float, default=0.2, help="สัดส่วนที่ถือว่าถดถอย (ค่าเริ่มต้น 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"ไม่พบไฟล์ฐานข้อมูล '{args.db}' กรุณาสร้างด้วย generate_dataset.py ก่อน")
+
+    print(f"{'handler':<55} {'median':>13} {'peak memory':>15}")
+    results = run_benchmarks(args.db, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"db": args.db, "repeat": args.repeat, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\nบันทึกผลลงไฟล์ '{args.output}' แล้ว")
+    failed = [r["case"] for r in results if "error" in r]
+    if failed:
+        print(f"\nกรณีที่ล้มเหลว {len(failed)} กรณี: {', '.join(failed)}")
+    if (args.compare and compare(results, args.compare, args.threshold)) or failed:
+        sys.exit(1)
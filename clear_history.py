@@ -1,20 +1,21 @@
 # -*- coding: utf-8 -*-
+import argparse
 import sqlite3
 import os
 
 DB_FILE = "database.db"
 
-def clear_all_reports():
+def clear_all_reports(db_file=DB_FILE):
     """
     Connects to the database and clears all records from the report, 
     archive, and persistent status tables.
     """
-    if not os.path.exists(DB_FILE):
-        print(f"ข้อผิดพลาด: ไม่พบไฟล์ฐานข้อมูล '{DB_FILE}'")
+    if not os.path.exists(db_file):
+        print(f"ข้อผิดพลาด: ไม่พบไฟล์ฐานข้อมูล '{db_file}'")
         return
 
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(db_file)
         cursor = conn.cursor()
 
         print("กำลังลบข้อมูลจากตาราง status_reports...")
@@ -22,6 +23,7 @@ def clear_all_reports():
         
         print("กำลังลบข้อมูลจากตาราง archived_reports...")
         cursor.execute("DELETE FROM archived_reports")
+        cursor.execute("DELETE FROM submission_history")
         
         print("กำลังลบข้อมูลจากตาราง persistent_statuses...")
         cursor.execute("DELETE FROM persistent_statuses")
@@ -36,9 +38,13 @@ def clear_all_reports():
             conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ลบประวัติการส่งรายงานทั้งหมด")
+    parser.add_argument("--db", default=DB_FILE, help="ไฟล์ฐานข้อมูลของหน่วยที่ต้องการล้าง")
+    args = parser.parse_args()
+
     # Ask for confirmation before deleting
-    confirm = input("คุณแน่ใจหรือไม่ว่าต้องการลบประวัติการส่งรายงานทั้งหมด? การกระทำนี้ไม่สามารถย้อนกลับได้ (พิมพ์ 'yes' เพื่อยืนยัน): ")
+    confirm = input(f"[{args.db}] " + "คุณแน่ใจหรือไม่ว่าต้องการลบประวัติการส่งรายงานทั้งหมด? การกระทำนี้ไม่สามารถย้อนกลับได้ (พิมพ์ 'yes' เพื่อยืนยัน): ")
     if confirm.lower() == 'yes':
-        clear_all_reports()
+        clear_all_reports(args.db)
     else:
         print("ยกเลิกการลบข้อมูล")
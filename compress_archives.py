@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# compress_archives.py
+# Converts archived report payloads that are still stored as plain JSON text
+# into compressed blobs (see encode_archive_payload in web_server.py).
+import argparse
+import os
+import sqlite3
+
+from web_server import encode_archive_payload, decode_archive_payload
+
+DB_FILE = "database.db"
+BATCH_SIZE = 500
+
+# (table, payload column)
+ARCHIVE_COLUMNS = [
+    ("archived_reports", "report_data"),
+    ("archived_daily_reports", "report_data"),
+]
+
+
+def compress_column(conn, table, column):
+    """Compresses every plain-text value in table.column; returns (rows, bytes_before, bytes_after)."""
+    cursor = conn.cursor()
+    rows = before = after = 0
+    while True:
+        cursor.execute(f"SELECT rowid, {column} FROM {table} WHERE typeof({column}) = 'text' LIMIT ?", (BATCH_SIZE,))
+        batch = cursor.fetchall()
+        if not batch:
+            break
+        updates = []
+        for rowid, value in batch:
+            blob = encode_archive_payload(decode_archive_payload(value))
+            before += len(value.encode('utf-8'))
+            after += len(blob)
+            updates.append((blob, rowid))
+        cursor.executemany(f"UPDATE {table} SET {column} = ? WHERE rowid = ?", updates)
+        conn.commit()
+        rows += len(batch)
+    return rows, before, after
+
+
+def compress_archives(db_file=DB_FILE, vacuum=False):
+    if not os.path.exists(db_file):
+        print(f"ข้อผิดพลาด: ไม่พบไฟล์ฐานข้อมูล '{db_file}'")
+        return
+
+    conn = sqlite3.connect(db_file)
+    try:
+        size_before = os.path.getsize(db_file)
+        total_before = total_after = 0
+        for table, column in ARCHIVE_COLUMNS:
+            print(f"กำลังบีบอัดข้อมูล {table}.{column}...")
+            rows, before, after = compress_column(conn, table, column)
+            total_before += before
+            total_after += after
+            print(f" -> {rows} แถว: {before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+
+        print(f"\nข้อมูลรายงานลดลง {(total_before - total_after) / 1024:.1f} KB")
+        if vacuum:
+            print("กำลัง VACUUM ไฟล์ฐานข้อมูล...")
+            # VACUUM also switches older files over to incremental vacuum (see MAINTENANCE_JOBS).
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            size_after = os.path.getsize(db_file)
+            print(f" -> ขนาดไฟล์ {size_before / (1024 * 1024):.1f} MB -> {size_after / (1024 * 1024):.1f} MB")
+        else:
+            print("(พื้นที่ว่างจะถูกนำกลับมาใช้ใหม่ภายในไฟล์ หากต้องการลดขนาดไฟล์ให้ใช้ --vacuum)")
+    except sqlite3.Error as e:
+        print(f"เกิดข้อผิดพลาดในการเชื่อมต่อฐานข้อมูล: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="บีบอัดข้อมูลรายงานที่เก็บถาวร")
+    parser.add_argument("--db", default=DB_FILE, help="ไฟล์ฐานข้อมูล")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM หลังบีบอัดเพื่อลดขนาดไฟล์ (ควรหยุดเซิร์ฟเวอร์ก่อน)")
+    args = parser.parse_args()
+    compress_archives(args.db, args.vacuum)
@@ -1,9 +1,9 @@
 // daily.js - Main script for the daily reporting system
 
 // --- Imports ---
-import { sendRequest } from './api.js';
+import { sendRequest, downloadExport } from './api.js';
 import * as ui from './ui.js'; 
-import { escapeHTML, formatThaiDateRangeArabic, exportSingleReportToExcel } from './utils.js';
+import { escapeHTML, formatThaiDateRangeArabic } from './utils.js';
 
 // --- Global State ---
 window.currentUser = null;
@@ -11,7 +11,8 @@ let currentDepartment = ''; // To store the department being reported
 let currentReportDate = ''; // To store the target date for the report
 let allDailyHistoryData = {}; // To cache history data
 let allArchivedDailyData = {}; // To cache archived daily data
-let currentDailyReports = []; // To store reports for archiving
+let currentDailyReports = []; // Reports shown in the final report pane
+let currentDailyReportDate = null; // Date the archive button archives
 window.editingDailyReportData = null; // To hold data for editing
 
 // --- DOM References ---
@@ -378,8 +379,9 @@ async function handleSubmitDailyReport() {
 
 async function handleArchiveDailyReport() {
     archiveConfirmModal.classList.remove('active');
+    downloadExport('export_daily_reports', { format: 'xlsx', start_date: currentDailyReportDate, end_date: currentDailyReportDate });
     try {
-        const response = await sendRequest('archive_daily_reports', { reports: currentDailyReports });
+        const response = await sendRequest('archive_daily_reports', { report_date: currentDailyReportDate });
         ui.showMessage(response.message, response.status === 'success');
         if (response.status === 'success') {
             loadDataForPane('pane-daily-report');
@@ -408,7 +410,7 @@ function renderDailyDashboard(summary) {
     dateEl.textContent = `ข้อมูลสำหรับ: ${formatThaiDate(summary.report_date)}`;
     container.innerHTML = '';
 
-    const { all_departments, submitted_info } = summary;
+    const { all_departments, submitted_info, headcounts = {} } = summary;
 
     if (!all_departments || all_departments.length === 0) {
         container.innerHTML = '<p class="text-gray-500 col-span-full">ไม่พบข้อมูลแผนกในระบบ</p>';
@@ -433,7 +435,8 @@ function renderDailyDashboard(summary) {
             `;
         }
 
-        let statusLine = isSubmitted ? `<p class="text-xs text-green-700">ส่งยอดแล้ว</p>` : `<p class="text-xs text-red-700">ยังไม่ส่งยอด</p>`;
+        const headcount = headcounts[dept];
+        let statusLine = isSubmitted ? `<p class="text-xs text-green-700">ส่งยอดแล้ว</p>` : `<p class="text-xs text-red-700">ยังไม่ส่งยอด${headcount ? ` (กำลังพล ${headcount.total} นาย)` : ''}</p>`;
         let detailsLine = isSubmitted ? `<p class="text-xs text-gray-500 mt-1">โดย: ${escapeHTML(submission.submitter_fullname)} (${new Date(submission.timestamp).toLocaleTimeString('th-TH')})</p>` : '';
 
         card.innerHTML = `<p class="font-semibold text-sm ${isSubmitted ? 'text-green-800' : 'text-red-800'}">${escapeHTML(dept)}</p>${statusLine}${summaryHtml}${detailsLine}`;
@@ -646,15 +649,16 @@ function renderSubmissionForm(res) {
 
 // --- Daily Report and Archive Rendering ---
 function renderDailyFinalReport(res) {
-    const { reports, report_date, all_departments, submitted_departments } = res;
+    const { reports, report_date, all_departments, pending_departments = [] } = res;
     currentDailyReports = reports;
+    currentDailyReportDate = report_date;
 
     const titleEl = document.querySelector('#pane-daily-report h2');
     titleEl.textContent = `ส่งรายงานประจำวัน (${formatThaiDate(report_date)})`;
 
     dailyReportContainer.innerHTML = '';
     
-    const allSubmitted = all_departments.length > 0 && all_departments.every(dept => submitted_departments.includes(dept));
+    const allSubmitted = all_departments.length > 0 && pending_departments.length === 0;
 
     if (exportDailyArchiveBtn) {
         exportDailyArchiveBtn.disabled = !allSubmitted;
@@ -662,7 +666,7 @@ function renderDailyFinalReport(res) {
         exportDailyArchiveBtn.classList.toggle('cursor-not-allowed', !allSubmitted);
         exportDailyArchiveBtn.classList.toggle('bg-blue-500', allSubmitted);
         exportDailyArchiveBtn.classList.toggle('hover:bg-blue-700', allSubmitted);
-        exportDailyArchiveBtn.title = allSubmitted ? 'ส่งออกและเก็บรายงาน' : 'ต้องรอให้ทุกแผนกส่งรายงานก่อน';
+        exportDailyArchiveBtn.title = allSubmitted ? 'ส่งออกและเก็บรายงาน' : `ต้องรอให้ทุกแผนกส่งรายงานก่อน (ยังไม่ส่ง: ${pending_departments.join(', ')})`;
     }
 
     if (!reports || reports.length === 0) {
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# generate_dataset.py
+# Fills a fresh database with synthetic personnel, statuses, holidays and
+# years of weekly/daily archives so performance work can run at real scale.
+import argparse
+import json
+import os
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+import web_server
+from web_server import RANK_CLASSIFICATION, classify_personnel
+
+STATUSES = ['ราชการ', 'คุมงาน', 'ศึกษา', 'ลากิจ', 'ลาพักผ่อน', 'ลาป่วย']
+FIRST_NAMES = ['สมชาย', 'สมศักดิ์', 'วิชัย', 'ประเสริฐ', 'อนุชา', 'กิตติ', 'ธนพล', 'ณัฐวุฒิ', 'สุภาพร', 'วรรณา',
+               'จิราพร', 'ปิยะ', 'ชัยวัฒน์', 'อรุณ', 'พงศกร', 'ศิริพร', 'กมล', 'ธีรพงษ์', 'นภา', 'ยุทธนา']
+LAST_NAMES = ['ใจดี', 'มั่นคง', 'ศรีสุข', 'ทองดี', 'แก้วมณี', 'บุญมา', 'สายทอง', 'วงศ์ใหญ่', 'พรหมมา', 'ชัยมงคล',
+              'รุ่งเรือง', 'สมบูรณ์', 'เพชรรัตน์', 'อินทร์แก้ว', 'จันทร์เพ็ญ', 'ประเสริฐสุข']
+POSITIONS = ['ผู้บังคับหน่วย', 'รองผู้บังคับหน่วย', 'นายทหารปฏิบัติการ', 'เสมียน', 'ช่างอากาศ', 'เจ้าหน้าที่ธุรการ', 'พนักงานขับรถ']
+SPECIALTIES = ['ธุรการ', 'ช่างอากาศยาน', 'สื่อสาร', 'ส่งกำลังบำรุง', 'การเงิน', 'ยุทธการ', 'ขนส่ง']
+# Fixed-date public holidays (month, day, description)
+HOLIDAYS = [(1, 1, 'วันขึ้นปีใหม่'), (4, 6, 'วันจักรี'), (4, 13, 'วันสงกรานต์'), (4, 14, 'วันสงกรานต์'),
+            (4, 15, 'วันสงกรานต์'), (5, 1, 'วันแรงงานแห่งชาติ'), (7, 28, 'วันเฉลิมพระชนมพรรษา'),
+            (8, 12, 'วันแม่แห่งชาติ'), (10, 13, 'วันนวมินทรมหาราช'), (10, 23, 'วันปิยมหาราช'),
+            (12, 5, 'วันพ่อแห่งชาติ'), (12, 10, 'วันรัฐธรรมนูญ'), (12, 31, 'วันสิ้นปี')]
+USER_PASSWORD = "Bench@1234"
+
+# Officers are rarer than NCOs; civilians sit in between.
+RANK_WEIGHTS = {'officer': 2, 'nco': 6, 'civilian': 2}
+
+
+def _random_rank(rng):
+    category = rng.choices(list(RANK_WEIGHTS), weights=list(RANK_WEIGHTS.values()))[0]
+    return rng.choice(RANK_CLASSIFICATION[category])
+
+
+def _random_status_item(rng, person, start_date, max_days=10):
+    start = start_date - timedelta(days=rng.randint(0, 3))
+    end = start_date + timedelta(days=rng.randint(0, max_days))
+    return {
+        "personnel_id": person['id'],
+        "personnel_name": f"{person['rank']} {person['first_name']} {person['last_name']}",
+        "status": rng.choice(STATUSES),
+        "details": rng.choice(['', 'ราชการภายนอก', 'ตามคำสั่ง', 'ศึกษาหลักสูตร']),
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat()
+    }
+
+
+def _working_days(start, end, holidays):
+    day = start
+    while day <= end:
+        if day.weekday() < 5 and day not in holidays:
+            yield day
+        day += timedelta(days=1)
+
+
+def generate(db_file, personnel_count=10000, department_count=40, years=5, status_ratio=0.1, seed=2534):
+    """Creates db_file from scratch and populates every table at the requested scale."""
+    rng = random.Random(seed)
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    web_server.DB_FILE = db_file
+    web_server.init_db()
+
+    conn = web_server.get_db_connection()
+    cursor = conn.cursor()
+    today = date.today()
+    first_day = date(today.year - years, 1, 1)
+
+    print(f"กำลังสร้างแผนกและผู้ใช้งาน {department_count} แผนก...")
+    departments = [f"แผนก {i + 1:03d}" for i in range(department_count)]
+    salt, key = web_server.hash_password(USER_PASSWORD)
+    users = []
+    for i, department in enumerate(departments):
+        username = f"user{i + 1:03d}"
+        rank = rng.choice(RANK_CLASSIFICATION['nco'])
+        users.append((username, rank, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), department))
+    cursor.executemany(
+        "INSERT INTO users (username, salt, key, rank, first_name, last_name, position, department, role) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(u, salt, key, r, f, l, 'เสมียน', d, 'user') for u, r, f, l, d in users]
+    )
+    submitter_by_dept = {u[4]: u for u in users}
+
+    print(f"กำลังสร้างข้อมูลกำลังพล {personnel_count} นาย...")
+    personnel = []
+    for i in range(personnel_count):
+        personnel.append({
+            "id": str(uuid.uuid4()), "rank": _random_rank(rng),
+            "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES),
+            "position": rng.choice(POSITIONS), "specialty": rng.choice(SPECIALTIES),
+            "department": departments[i % department_count]
+        })
+    cursor.executemany(
+        "INSERT INTO personnel (id, rank, first_name, last_name, position, specialty, department) VALUES (:id, :rank, :first_name, :last_name, :position, :specialty, :department)",
+        personnel
+    )
+    personnel_by_dept = {d: [] for d in departments}
+    for p in personnel:
+        personnel_by_dept[p['department']].append(p)
+
+    print("กำลังสร้างวันหยุดราชการ...")
+    holidays = set()
+    for year in range(first_day.year, today.year + 2):
+        for month, day, description in HOLIDAYS:
+            holidays.add(date(year, month, day))
+            cursor.execute("INSERT INTO holidays (date, description) VALUES (?, ?)", (date(year, month, day).isoformat(), description))
+
+    print("กำลังสร้างสถานะต่อเนื่อง (persistent_statuses)...")
+    status_rows = []
+    for p in rng.sample(personnel, int(personnel_count * status_ratio)):
+        item = _random_status_item(rng, p, today, max_days=30)
+        status_rows.append((str(uuid.uuid4()), p['id'], p['department'], item['status'], item['details'], item['start_date'], item['end_date']))
+    cursor.executemany(
+        "INSERT INTO persistent_statuses (id, personnel_id, department, status, details, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        status_rows
+    )
+
+    print(f"กำลังสร้างรายงานประจำสัปดาห์ย้อนหลัง {years} ปี...")
+    week_start = first_day - timedelta(days=first_day.weekday())
+    current_week_start = today - timedelta(days=today.weekday())
+    weekly_count = 0
+    while week_start < current_week_start:
+        reports = []
+        for department in departments:
+            submitter = submitter_by_dept[department]
+            members = personnel_by_dept[department]
+            items = [_random_status_item(rng, p, week_start) for p in rng.sample(members, max(1, int(len(members) * status_ratio)))] if members else []
+            submitted_at = datetime.combine(week_start + timedelta(days=rng.randint(0, 4)), datetime.min.time()) + timedelta(hours=rng.randint(7, 16))
+            reports.append({
+                "id": str(uuid.uuid4()), "date": submitted_at.strftime('%Y-%m-%d'), "department": department,
+                "timestamp": submitted_at.strftime('%Y-%m-%d %H:%M:%S'), "items": items,
+                "rank": submitter[1], "first_name": submitter[2], "last_name": submitter[3]
+            })
+        archived_at = datetime.combine(week_start + timedelta(days=6), datetime.min.time()) + timedelta(hours=17)
+        cursor.execute(
+            "INSERT INTO archived_reports (id, week_range, report_data, archived_by, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), week_start.isoformat(), web_server.encode_archive_payload(reports), 'jeerawut', archived_at.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        weekly_count += 1
+        week_start += timedelta(days=7)
+
+    print(f"กำลังสร้างรายงานประจำวันย้อนหลัง {years} ปี...")
+    classified_by_dept = {d: classify_personnel(members) for d, members in personnel_by_dept.items()}
+    daily_count = 0
+    for report_day in _working_days(first_day, today - timedelta(days=1), holidays):
+        rows = []
+        for department in departments:
+            submitter = submitter_by_dept[department]
+            summary_data, report_data = {}, {}
+            for category, members in classified_by_dept[department].items():
+                on_mission = rng.sample(members, int(len(members) * status_ratio)) if members else []
+                report_data[category] = [_random_status_item(rng, p, report_day) for p in on_mission]
+                summary_data[category] = {"total": len(members), "available": len(members) - len(on_mission), "mission": len(on_mission)}
+            timestamp = datetime.combine(report_day, datetime.min.time()) + timedelta(hours=rng.randint(6, 9), minutes=rng.randint(0, 59))
+            rows.append((
+                str(uuid.uuid4()), report_day.year, report_day.month, report_day.isoformat(), department,
+                f"{submitter[1]} {submitter[2]} {submitter[3]}", timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                json.dumps(summary_data), web_server.encode_archive_payload(report_data)
+            ))
+        cursor.executemany(
+            """INSERT INTO archived_daily_reports
+               (id, year, month, report_date, department, submitted_by, timestamp, summary_data, report_data)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+        daily_count += len(rows)
+
+    print("กำลังสร้างรายงานของรอบปัจจุบัน...")
+    cursor.execute("UPDATE system_settings SET value = ? WHERE key = 'current_week_start_date'", (current_week_start.isoformat(),))
+    target_date = web_server.get_daily_target_date(cursor)
+    submitted_at = (datetime.utcnow() + timedelta(hours=7)).strftime('%Y-%m-%d %H:%M:%S')
+    for department in rng.sample(departments, department_count // 2):
+        submitter = submitter_by_dept[department]
+        members = personnel_by_dept[department]
+        items = [_random_status_item(rng, p, today) for p in rng.sample(members, int(len(members) * status_ratio))] if members else []
+        cursor.execute(
+            "INSERT INTO status_reports (id, date, submitted_by, department, report_data, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), today.isoformat(), submitter[0], department, json.dumps(items), submitted_at)
+        )
+        summary_data, report_data = {}, {}
+        for category, cat_members in classified_by_dept[department].items():
+            on_mission = rng.sample(cat_members, int(len(cat_members) * status_ratio)) if cat_members else []
+            report_data[category] = [_random_status_item(rng, p, target_date) for p in on_mission]
+            summary_data[category] = {"total": len(cat_members), "available": len(cat_members) - len(on_mission), "mission": len(on_mission)}
+        cursor.execute(
+            "INSERT INTO daily_reports (id, report_date, department, submitted_by, timestamp, summary_data, report_data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), target_date.isoformat(), department, submitter[0], submitted_at, json.dumps(summary_data), json.dumps(report_data))
+        )
+
+    conn.commit()
+
+    # The archives above were inserted directly, so index and roll them up like the archive actions would have.
+    print("กำลังสร้างดัชนีประวัติการส่งรายงาน...")
+    history_count = web_server.rebuild_submission_history(conn)
+    print("กำลังคำนวณสรุปรายเดือนของรายงานประจำวัน...")
+    web_server.rebuild_daily_rollups(conn)
+    rollup_count = conn.execute("SELECT COUNT(*) FROM daily_rollups").fetchone()[0]
+    conn.close()
+    size_mb = os.path.getsize(db_file) / (1024 * 1024)
+    print(f"\nสร้างฐานข้อมูล '{db_file}' สำเร็จ ({size_mb:.1f} MB)")
+    print(f" -> กำลังพล {personnel_count} นาย, {department_count} แผนก, รายงานสัปดาห์ {weekly_count} รอบ, รายงานประจำวัน {daily_count} รายการ")
+    print(f" -> ดัชนีประวัติการส่งรายงาน {history_count} รายการ, สรุปรายเดือน {rollup_count} แถว")
+    print(f" -> รหัสผ่านของผู้ใช้ทดสอบ (user001...) คือ '{USER_PASSWORD}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="สร้างฐานข้อมูลจำลองสำหรับทดสอบประสิทธิภาพ")
+    parser.add_argument("--db", default="bench_database.db", help="ไฟล์ฐานข้อมูลปลายทาง (จะถูกสร้างใหม่ทั้งหมด)")
+    parser.add_argument("--personnel", type=int, default=10000, help="จำนวนกำลังพล")
+    parser.add_argument("--departments", type=int, default=40, help="จำนวนแผนก")
+    parser.add_argument("--years", type=int, default=5, help="จำนวนปีของรายงานย้อนหลัง")
+    parser.add_argument("--status-ratio", type=float, default=0.1, help="สัดส่วนกำลังพลที่มีสถานะ (0-1)")
+    parser.add_argument("--seed", type=int, default=2534, help="ค่า seed ของตัวสุ่ม")
+    args = parser.parse_args()
+
+    if args.db == web_server.DB_FILE:
+        parser.error(f"ไม่อนุญาตให้เขียนทับฐานข้อมูลใช้งานจริง '{args.db}'")
+    generate(args.db, args.personnel, args.departments, args.years, args.status_ratio, args.seed)
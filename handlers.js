@@ -1,9 +1,9 @@
 // handlers.js
 // Contains all event handler functions.
 
-import { sendRequest } from './api.js';
+import { sendRequest, downloadExport } from './api.js';
 import { showMessage, openPersonnelModal, openUserModal, showConfirmModal, addStatusRow, renderArchivedReports, renderFilteredHistoryReports } from './ui.js';
-import { exportSingleReportToExcel, formatThaiDateRangeArabic, escapeHTML } from './utils.js';
+import { reportDateRange, formatThaiDateRangeArabic, escapeHTML } from './utils.js';
 
 export async function handlePersonnelFormSubmit(e) {
     e.preventDefault();
@@ -104,7 +104,7 @@ export async function handleUserListClick(e) {
         });
     } else if (target.classList.contains('edit-user-btn')) {
         try {
-            const res = await sendRequest('list_users', { page: 1, searchTerm: '' });
+            const res = await sendRequest('list_users', { searchTerm: username });
             if (res.status === 'success') {
                 const userToEdit = res.users.find(u => u.username === username);
                 if (userToEdit) openUserModal(userToEdit);
@@ -255,21 +255,18 @@ export async function handleSubmitStatusReport() {
 }
 
 export async function handleExportAndArchive() {
-    const weekRangeText = document.getElementById('report-week-range')?.textContent.replace(/[()]/g, '').trim() || '';
-    
     window.archiveConfirmModal.classList.remove('active');
     if (!window.currentWeeklyReports || window.currentWeeklyReports.length === 0) {
         showMessage('ไม่มีข้อมูลรายงานที่จะส่งออก', false);
         return;
     }
     
-    exportSingleReportToExcel(window.currentWeeklyReports, `รายงานกำลังพล-${new Date().toISOString().split('T')[0]}.xlsx`, weekRangeText);
+    // The server builds the workbook and reads archived reports too, so the export is unaffected by the archive below.
+    downloadExport('export_weekly_reports', { format: 'xlsx', ...reportDateRange(window.currentWeeklyReports) });
     
     try {
-        const response = await sendRequest('archive_reports', { 
-            reports: window.currentWeeklyReports,
-            week_range: weekRangeText 
-        });
+        // The server archives its own copy of this week's reports.
+        const response = await sendRequest('archive_reports', { week_start_date: window.currentWeekStartDate });
 
         showMessage(response.message, response.status === 'success');
         if (response.status === 'success') {
@@ -280,7 +277,7 @@ export async function handleExportAndArchive() {
     }
 }
 
-export function handleShowArchive() {
+export async function handleShowArchive() {
     const year = window.archiveYearSelect.value;
     const month = window.archiveMonthSelect.value;
     const archiveTitle = document.getElementById('archive-pane-title');
@@ -296,6 +293,18 @@ export function handleShowArchive() {
         archiveTitle.textContent = `ประวัติการเก็บรายงานทั้งหมด - ${monthName} ${year}`;
     }
 
+    // The archive list only carries metadata; fetch this month's reports on demand.
+    try {
+        const res = await sendRequest('get_archived_reports', { year, month });
+        if (res.status === 'success') {
+            const monthArchives = res.archives[year] ? res.archives[year][month] : [];
+            if (window.allArchivedReports[year]) window.allArchivedReports[year][month] = monthArchives || [];
+        }
+    } catch (error) {
+        showMessage(error.message, false);
+        return;
+    }
+
     const reportsForMonth = window.allArchivedReports[year] ? window.allArchivedReports[year][month] : [];
     renderArchivedReports(reportsForMonth);
 }
@@ -310,25 +319,17 @@ export function handleArchiveDownloadClick(e) {
             return;
         }
 
-        const reportsForMonth = window.allArchivedReports[year] ? window.allArchivedReports[year][month] : [];
-        
-        if (!reportsForMonth || !Array.isArray(reportsForMonth)) {
-            showMessage('เกิดข้อผิดพลาด: ไม่พบข้อมูลสำหรับเดือนที่เลือก', false);
-            return;
-        }
-
-        const reportsToDownload = reportsForMonth.filter(r => r.date === date);
-        
-        if (reportsToDownload.length > 0) {
-            exportSingleReportToExcel(reportsToDownload, `รายงานย้อนหลัง-${date}.xlsx`);
-        } else {
-            showMessage('ไม่พบข้อมูลรายงานที่จะดาวน์โหลดสำหรับวันนี้', false);
-        }
+        downloadExport('export_weekly_reports', { format: 'xlsx', start_date: date, end_date: date });
     }
 }
 
 export async function handleHistoryEditClick(e) {
     const target = e.target;
+    if (target.classList.contains('load-more-history-btn')) {
+        target.disabled = true;
+        await loadHistoryPage();
+        return;
+    }
     if (!target.classList.contains('edit-history-btn')) return;
 
     const reportId = target.dataset.id;
@@ -347,15 +348,37 @@ export async function handleHistoryEditClick(e) {
     }
 }
 
-export function handleShowHistory() {
+export async function handleShowHistory() {
     const year = window.historyYearSelect.value;
     const month = window.historyMonthSelect.value;
     if (!year || !month) {
         showMessage('กรุณาเลือกปีและเดือน', false);
         return;
     }
-    const reportsForMonth = window.allHistoryData[year] ? window.allHistoryData[year][month] : [];
-    renderFilteredHistoryReports(reportsForMonth);
+    window.historyPage = { year, month, reports: [], nextCursor: null };
+    await loadHistoryPage();
+}
+
+// Fetches the next page of the selected month's history, then the contents of just those reports.
+async function loadHistoryPage() {
+    const { year, month, nextCursor } = window.historyPage;
+    try {
+        const res = await sendRequest('get_submission_history', { year, month, cursor: nextCursor });
+        if (res.status !== 'success') {
+            showMessage(res.message, false);
+            return;
+        }
+        if (res.reports.length > 0) {
+            const contents = await sendRequest('get_submission_reports', { ids: res.reports.map(r => r.id) });
+            const itemsById = Object.fromEntries((contents.reports || []).map(r => [r.id, r.items]));
+            res.reports.forEach(r => { r.items = itemsById[r.id] || []; });
+        }
+        window.historyPage.reports.push(...res.reports);
+        window.historyPage.nextCursor = res.next_cursor;
+        renderFilteredHistoryReports(window.historyPage.reports, Boolean(res.next_cursor));
+    } catch (error) {
+        showMessage(error.message, false);
+    }
 }
 
 export async function handleWeeklyReportEditClick(e) {
@@ -29,6 +29,8 @@ loginForm.addEventListener('submit', async (e) => {
     const submitButton = loginForm.querySelector('button[type="submit"]');
     const username = usernameInput.value; // Use the already sanitized value
     const password = loginForm.querySelector('#login-password').value;
+    // login.html?unit=<name> signs in to that unit's database (when the server has more than one).
+    const unit = new URLSearchParams(window.location.search).get('unit');
 
     if (!isPasswordComplex(password)) {
         showMessage('รหัสผ่านต้องมีความยาวอย่างน้อย 8 ตัวอักษร และประกอบด้วยตัวพิมพ์เล็ก, พิมพ์ใหญ่, และตัวเลข', false);
@@ -42,7 +44,7 @@ loginForm.addEventListener('submit', async (e) => {
         const response = await fetch(API_URL, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ action: 'login', payload: { username, password } })
+            body: JSON.stringify({ action: 'login', payload: unit ? { username, password, unit } : { username, password } })
         });
         
         const result = await response.json();
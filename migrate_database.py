@@ -1,16 +1,17 @@
 # migrate_database.py
+import argparse
 import sqlite3
 import os
 
 DB_FILE = "database.db"
 
-def migrate():
-    if not os.path.exists(DB_FILE):
-        print(f"ไม่พบไฟล์ฐานข้อมูล '{DB_FILE}' ไม่จำเป็นต้องทำการอัปเกรด")
+def migrate(db_file=DB_FILE):
+    if not os.path.exists(db_file):
+        print(f"ไม่พบไฟล์ฐานข้อมูล '{db_file}' ไม่จำเป็นต้องทำการอัปเกรด")
         return
 
     print("กำลังเชื่อมต่อฐานข้อมูลเพื่อทำการอัปเกรด...")
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
 
     try:
@@ -49,4 +50,6 @@ def migrate():
             conn.close()
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="อัปเกรดโครงสร้างตาราง archived_reports")
+    parser.add_argument("--db", default=DB_FILE, help="ไฟล์ฐานข้อมูลของหน่วยที่ต้องการอัปเกรด")
+    migrate(parser.parse_args().db)
\ No newline at end of file
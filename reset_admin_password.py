@@ -1,3 +1,4 @@
+import argparse
 import sqlite3
 import hashlib
 import os
@@ -13,7 +14,7 @@ def hash_password(password, salt=None):
     key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
     return salt, key
 
-def reset_admin_password():
+def reset_admin_password(db_file=DB_FILE):
     """Resets the password for the admin user."""
     print(f"กำลังทำการรีเซ็ตรหัสผ่านสำหรับผู้ใช้: {ADMIN_USERNAME}")
 
@@ -34,7 +35,7 @@ def reset_admin_password():
 
     try:
         # เชื่อมต่อฐานข้อมูลและอัปเดต
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(db_file)
         cursor = conn.cursor()
 
         cursor.execute("UPDATE users SET salt = ?, key = ? WHERE username = ?", (new_salt, new_key, ADMIN_USERNAME))
@@ -52,4 +53,6 @@ def reset_admin_password():
             conn.close()
 
 if __name__ == "__main__":
-    reset_admin_password()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=f"รีเซ็ตรหัสผ่านของผู้ดูแลระบบ ({ADMIN_USERNAME})")
+    parser.add_argument("--db", default=DB_FILE, help="ไฟล์ฐานข้อมูลของหน่วยที่ต้องการรีเซ็ต")
+    reset_admin_password(parser.parse_args().db)
\ No newline at end of file
@@ -0,0 +1,53 @@
+// roster.js
+// Keeps an in-page copy of the personnel roster and persistent statuses.
+// sync_roster only returns the rows changed since the last call, so
+// revisiting the submission form downloads deltas instead of the full list.
+
+import { sendRequest } from './api.js';
+import { RANK_ORDER } from './utils.js';
+
+const OFFICER_RANKS = new Set([
+    'น.อ.(พ)', 'น.อ.หม่อมหลวง', 'น.อ.', 'น.ท.', 'น.ต.', 'ร.อ.', 'ร.ท.', 'ร.ต.',
+    'น.อ.(พ).หญิง', 'น.อ.หญิง', 'น.ท.หญิง', 'น.ต.หญิง', 'ร.อ.หญิง', 'ร.ท.หญิง', 'ร.ต.หญิง'
+]);
+
+let rosterVersion = 0;
+const personnel = new Map();
+const statuses = new Map();
+
+// Brings the copy up to date; throws if the server refuses.
+export async function syncRoster() {
+    const res = await sendRequest('sync_roster', { since: rosterVersion });
+    if (!res || res.status !== 'success') {
+        throw new Error((res && res.message) || 'ไม่สามารถโหลดข้อมูลกำลังพลได้');
+    }
+    if (res.reset) {
+        personnel.clear();
+        statuses.clear();
+    }
+    res.personnel.forEach(p => personnel.set(String(p.id), p));
+    res.personnel_deleted.forEach(id => personnel.delete(String(id)));
+    res.statuses.forEach(s => statuses.set(String(s.id), s));
+    res.statuses_deleted.forEach(id => statuses.delete(String(id)));
+    rosterVersion = res.version;
+}
+
+function rankPosition(rank) {
+    const index = RANK_ORDER.indexOf(rank);
+    return index === -1 ? RANK_ORDER.length : index;
+}
+
+// Officers in the same order as list_personnel: rank, then first and last name.
+export function rosterOfficers() {
+    return [...personnel.values()]
+        .filter(p => OFFICER_RANKS.has(p.rank))
+        .sort((a, b) => rankPosition(a.rank) - rankPosition(b.rank)
+            || (a.first_name < b.first_name ? -1 : a.first_name > b.first_name ? 1 : 0)
+            || (a.last_name < b.last_name ? -1 : a.last_name > b.last_name ? 1 : 0)
+            || (a.id < b.id ? -1 : a.id > b.id ? 1 : 0));
+}
+
+// Persistent statuses still running after the given ISO date.
+export function rosterStatusesAfter(isoDate) {
+    return [...statuses.values()].filter(s => s.end_date > isoDate);
+}
@@ -1,8 +1,8 @@
 // ui.js
 // Contains all functions related to updating and rendering the user interface.
 
-import { escapeHTML, formatThaiDateArabic, formatThaiDateRangeArabic } from './utils.js';
-import { exportSingleReportToExcel } from './utils.js'; // Import the export function
+import { escapeHTML, formatThaiDateArabic, formatThaiDateRangeArabic, reportDateRange } from './utils.js';
+import { downloadExport } from './api.js';
 
 const ITEMS_PER_PAGE = 15;
 
@@ -91,13 +91,14 @@ export function showConfirmModal(title, message, onConfirm) {
 
 
 // --- Helper function to render pagination controls ---
-function renderPagination(containerId, totalItems, currentPage, onPageChange) {
+// Pages are fetched by cursor, so "next" is enabled by nextCursor rather than by the total.
+function renderPagination(containerId, totalItems, currentPage, nextCursor, onPageChange) {
     const container = document.getElementById(containerId);
     if (!container) return;
     container.innerHTML = '';
 
-    const totalPages = Math.ceil(totalItems / ITEMS_PER_PAGE);
-    if (totalPages <= 1) return;
+    const totalPages = totalItems != null ? Math.ceil(totalItems / ITEMS_PER_PAGE) : null;
+    if (currentPage === 1 && !nextCursor) return;
 
     const prevButton = document.createElement('button');
     prevButton.textContent = '‹ ก่อนหน้า';
@@ -106,12 +107,12 @@ function renderPagination(containerId, totalItems, currentPage, onPageChange) {
     prevButton.addEventListener('click', () => onPageChange(currentPage - 1));
 
     const pageInfo = document.createElement('span');
-    pageInfo.textContent = `หน้า ${currentPage} จาก ${totalPages}`;
+    pageInfo.textContent = totalPages ? `หน้า ${currentPage} จาก ${totalPages}` : `หน้า ${currentPage}`;
     pageInfo.className = 'text-sm text-gray-600';
 
     const nextButton = document.createElement('button');
     nextButton.textContent = 'ถัดไป ›';
-    nextButton.disabled = currentPage === totalPages;
+    nextButton.disabled = !nextCursor;
     nextButton.className = 'px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed';
     nextButton.addEventListener('click', () => onPageChange(currentPage + 1));
 
@@ -232,7 +233,8 @@ export function renderPersonnel(res) {
         window.personnelListArea.appendChild(row);
     });
 
-    renderPagination('personnel-pagination', total, page, (newPage) => {
+    window.pageCursors.personnelCurrentPage[page] = res.next_cursor;
+    renderPagination('personnel-pagination', total, page, res.next_cursor, (newPage) => {
         window.personnelCurrentPage = newPage;
         window.loadDataForPane('pane-personnel');
     });
@@ -266,7 +268,8 @@ export function renderUsers(res) {
         window.userListArea.appendChild(row);
     });
 
-    renderPagination('user-pagination', total, page, (newPage) => {
+    window.pageCursors.userCurrentPage[page] = res.next_cursor;
+    renderPagination('user-pagination', total, page, res.next_cursor, (newPage) => {
         window.userCurrentPage = newPage;
         window.loadDataForPane('pane-admin');
     });
@@ -518,7 +521,7 @@ export function renderWeeklyReport(res) {
     const reports = res.reports; 
     const weekly_date_range = res.weekly_date_range;
     const all_departments = res.all_departments || [];
-    const submitted_departments = res.submitted_departments || [];
+    const pending_departments = res.pending_departments || [];
 
     const weekRangeEl = document.getElementById('report-week-range');
     if (weekRangeEl && weekly_date_range) {
@@ -529,7 +532,7 @@ export function renderWeeklyReport(res) {
 
     const exportArchiveBtn = document.getElementById('export-archive-btn');
     if (exportArchiveBtn) {
-        const allSubmitted = all_departments.length > 0 && all_departments.every(dept => submitted_departments.includes(dept));
+        const allSubmitted = all_departments.length > 0 && pending_departments.length === 0;
         if (allSubmitted) {
             exportArchiveBtn.disabled = false;
             exportArchiveBtn.classList.remove('bg-gray-400', 'cursor-not-allowed');
@@ -539,13 +542,14 @@ export function renderWeeklyReport(res) {
             exportArchiveBtn.disabled = true;
             exportArchiveBtn.classList.add('bg-gray-400', 'cursor-not-allowed');
             exportArchiveBtn.classList.remove('bg-blue-500', 'hover:bg-blue-700');
-            exportArchiveBtn.title = 'ต้องรอให้ทุกแผนกส่งรายงานก่อนจึงจะสามารถส่งออกได้';
+            exportArchiveBtn.title = `ต้องรอให้ทุกแผนกส่งรายงานก่อนจึงจะสามารถส่งออกได้ (ยังไม่ส่ง: ${pending_departments.join(', ')})`;
         }
     }
 
     if(!window.reportContainer) return;
     window.reportContainer.innerHTML = '';
     window.currentWeeklyReports = reports;
+    window.currentWeekStartDate = res.week_start_date;
     if (!reports || reports.length === 0) {
         window.reportContainer.innerHTML = createEmptyState('ยังไม่มีแผนกใดส่งรายงานประจำสัปดาห์');
         return;
@@ -605,8 +609,8 @@ export function renderWeeklyReport(res) {
 }
 
 export function renderSubmissionHistory(res) {
-    const history = res.history;
-    window.allHistoryData = history || {};
+    // { year: { month: report count } }; the reports themselves are loaded per month.
+    window.allHistoryData = res.months || {};
     populateHistorySelectors(window.allHistoryData);
     if(window.historyContainer) window.historyContainer.innerHTML = createEmptyState('กรุณาเลือกปีและเดือนเพื่อแสดงประวัติ');
 }
@@ -630,7 +634,7 @@ export function populateHistorySelectors(history) {
     }
 }
 
-export function renderFilteredHistoryReports(reports) {
+export function renderFilteredHistoryReports(reports, hasMore = false) {
     const historyContainer = document.getElementById('history-container');
     if (!historyContainer) return;
     historyContainer.innerHTML = '';
@@ -673,6 +677,13 @@ export function renderFilteredHistoryReports(reports) {
             </div>`;
         historyContainer.appendChild(reportWrapper);
     });
+
+    if (hasMore) {
+        const loadMoreButton = document.createElement('button');
+        loadMoreButton.textContent = 'แสดงเพิ่มเติม';
+        loadMoreButton.className = 'load-more-history-btn w-full px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50';
+        historyContainer.appendChild(loadMoreButton);
+    }
 }
 
 
@@ -747,7 +758,7 @@ export function renderArchivedReports(reports) {
         `;
 
         archiveWrapper.querySelector('.download-archive-batch-btn').addEventListener('click', () => {
-            exportSingleReportToExcel(batch.reports, `รายงานย้อนหลัง-${batch.week_range}.xlsx`, batch.week_range);
+            downloadExport('export_weekly_reports', { format: 'xlsx', ...reportDateRange(batch.reports) });
         });
         // --- สิ้นสุดจุดที่แก้ไข ---
 
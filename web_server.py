@@ -1,26 +1,55 @@
 # -*- coding: utf-8 -*-
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import codecs
+import contextlib
+import contextvars
+import cProfile
+import csv
+import gzip
 import json
 import hashlib
+import multiprocessing
+import pickle
 import os
 import hmac
+import pstats
 import base64
 import uuid
 import sqlite3
 import secrets
+import shutil
+import tempfile
+import queue
+import signal
+import socket
+import sys
+import threading
 from html import escape
 from datetime import datetime, date, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict, namedtuple, OrderedDict
+from multiprocessing.connection import Client, Listener
 import time
 import re
+import zipfile
+import zlib
 from email.utils import formatdate
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qs, quote, unquote
+from xml.sax.saxutils import escape as xml_escape
+from pathlib import Path
 
 # --- Database Setup ---
 DB_FILE = "database.db"
+# Extra units served by the same process: name -> SQLite file. A request goes to
+# the unit mapped from its Host header (DATABASE_HOSTS: host -> name), else the
+# unit picked at login; anything unrouted uses DB_FILE.
+DATABASES = {}
+DATABASE_HOSTS = {}
 
 # --- Configuration ---
-FAILED_LOGIN_ATTEMPTS = {}
 LOCKOUT_TIME = 300
 MAX_ATTEMPTS = 5
 SESSION_TIMEOUT_SECONDS = 1800 # 30 minutes
@@ -48,9 +77,9 @@ RANK_CLASSIFICATION = {
 
 
 # --- Helper Functions ---
-def get_current_week_range_str(cursor):
+def get_current_week_start_date(cursor):
     """
-    ดึงวันที่เริ่มต้นของสัปดาห์ปัจจุบันจากฐานข้อมูล และคำนวณช่วงวันที่
+    ดึงวันที่เริ่มต้นของสัปดาห์ปัจจุบันจากฐานข้อมูล
     """
     cursor.execute("SELECT value FROM system_settings WHERE key = 'current_week_start_date'")
     start_date_row = cursor.fetchone()
@@ -58,10 +87,14 @@ def get_current_week_range_str(cursor):
     if not start_date_row:
         # กรณีฉุกเฉิน หากไม่มีข้อมูลใน settings ให้ใช้วันปัจจุบันไปก่อน
         today = date.today()
-        start_of_week = today - timedelta(days=today.weekday())
-    else:
-        start_of_week = date.fromisoformat(start_date_row['value'])
+        return today - timedelta(days=today.weekday())
+    return date.fromisoformat(start_date_row['value'])
 
+def get_current_week_range_str(cursor):
+    """
+    ดึงวันที่เริ่มต้นของสัปดาห์ปัจจุบันจากฐานข้อมูล และคำนวณช่วงวันที่
+    """
+    start_of_week = get_current_week_start_date(cursor)
     end_of_week = start_of_week + timedelta(days=6)
     
     thai_months_abbr = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
@@ -113,15 +146,164 @@ def get_daily_target_date(cursor):
 # --- END: NEW HELPER FOR DAILY SYSTEM LOGIC ---
 
 
+# --- START: ARCHIVE PAYLOAD CODEC ---
+# Archived report payloads are stored as zlib-compressed JSON blobs prefixed
+# with a codec marker. Rows written before compression existed are plain
+# JSON text and are still decoded transparently.
+ARCHIVE_CODEC_PREFIX = b"zlib:"
+ARCHIVE_COMPRESS_LEVEL = 6
+
+def encode_archive_payload(data):
+    return ARCHIVE_CODEC_PREFIX + zlib.compress(json.dumps(data).encode('utf-8'), ARCHIVE_COMPRESS_LEVEL)
+
+def decode_archive_payload(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        if value.startswith(ARCHIVE_CODEC_PREFIX):
+            value = zlib.decompress(value[len(ARCHIVE_CODEC_PREFIX):])
+        return json.loads(value.decode('utf-8'))
+    return json.loads(value)
+
+def register_archive_functions(conn):
+    """SQL versions of the codec so archive moves can run as INSERT ... SELECT."""
+    conn.create_function("archive_encode", 1, lambda text: None if text is None else
+                         ARCHIVE_CODEC_PREFIX + zlib.compress(text.encode('utf-8'), ARCHIVE_COMPRESS_LEVEL), deterministic=True)
+    conn.create_function("archive_decode", 1, lambda value: None if value is None else
+                         json.dumps(decode_archive_payload(value), ensure_ascii=False), deterministic=True)
+    conn.create_function("new_uuid", 0, lambda: str(uuid.uuid4()))
+
+def month_bounds(year, month):
+    """Returns ISO dates [first day of month, first day of next month)."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start.isoformat(), end.isoformat()
+# --- END: ARCHIVE PAYLOAD CODEC ---
+
+
 # --- Database Functions ---
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+DB_POOL_MAX_IDLE = 8 # idle connections kept per database file in each process
+DB_BUSY_TIMEOUT = 10 # seconds to wait for another process holding the write lock
+
+class PooledConnection(sqlite3.Connection):
+    """A connection whose close() hands it back to its pool instead of closing it."""
+    pool = None
+
+    def close(self):
+        if self.pool is None or not self.pool.release(self):
+            super().close()
+
+class ConnectionPool:
+    """
+    Per-process pool of connections to one database file. Connections are
+    never shared across fork(): a pool created in another process is
+    discarded the first time it is used after forking.
+    """
+    def __init__(self, db_file, read_only=False, max_idle=DB_POOL_MAX_IDLE):
+        self.db_file = db_file
+        self.read_only = read_only
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        if self.read_only:
+            uri = Path(self.db_file).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT, factory=PooledConnection, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_file, timeout=DB_BUSY_TIMEOUT, factory=PooledConnection, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        register_archive_functions(conn)
+        conn.pool = self
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._pid != os.getpid() or len(self._idle) >= self.max_idle:
+                return False
+            self._idle.append(conn)
+            return True
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            sqlite3.Connection.close(conn)
+
+# --- START: DATABASE ROUTING ---
+_current_db = contextvars.ContextVar("current_db", default=None)
+
+def current_db_file():
+    """The database the running request was routed to (DB_FILE outside a request)."""
+    return _current_db.get() or DB_FILE
+
+@contextlib.contextmanager
+def use_database(db_file):
+    token = _current_db.set(db_file)
+    try:
+        yield db_file
+    finally:
+        _current_db.reset(token)
+
+def parse_cookies(cookie_header):
+    if not cookie_header: return {}
+    return dict(item.strip().split('=', 1) for item in cookie_header.split(';') if '=' in item)
+
+def resolve_unit(host=None, cookie_header=None, login_unit=None):
+    """Returns the DATABASES name for a request, or None for the default database."""
+    if host:
+        unit = DATABASE_HOSTS.get(host.rsplit(':', 1)[0].strip().lower())
+        if unit in DATABASES:
+            return unit
+    if login_unit in DATABASES:
+        return login_unit
+    unit = unquote(parse_cookies(cookie_header).get('unit', ''))
+    return unit if unit in DATABASES else None
+
+def all_database_files():
+    return list(dict.fromkeys([DB_FILE, *DATABASES.values()]))
+# --- END: DATABASE ROUTING ---
+
+_DB_POOLS = {}
+_DB_POOLS_LOCK = threading.Lock()
+
+def get_db_connection(read_only=False):
+    """
+    Returns a pooled connection to the current database (see current_db_file).
+    read_only connections are opened with mode=ro and are meant for actions
+    flagged read_only in ACTION_MAP. Every database has its own pools.
+    """
+    db_file = current_db_file()
+    key = (db_file, read_only)
+    with _DB_POOLS_LOCK:
+        pool = _DB_POOLS.get(key)
+        if pool is None:
+            pool = _DB_POOLS[key] = ConnectionPool(db_file, read_only)
+    return pool.acquire()
+
+def close_db_pools():
+    """Closes every idle pooled connection, e.g. before forking worker processes."""
+    with _DB_POOLS_LOCK:
+        pools = list(_DB_POOLS.values())
+    for pool in pools:
+        pool.close_all()
 
 def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
+    # Only takes effect on a new file; existing files switch over on their next VACUUM.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers in every worker process proceed while one writer commits.
+    cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute('CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, salt BLOB NOT NULL, key BLOB NOT NULL, rank TEXT, first_name TEXT, last_name TEXT, position TEXT, department TEXT, role TEXT NOT NULL)')
     cursor.execute('CREATE TABLE IF NOT EXISTS personnel (id TEXT PRIMARY KEY, rank TEXT, first_name TEXT, last_name TEXT, position TEXT, specialty TEXT, department TEXT)')
     cursor.execute('CREATE TABLE IF NOT EXISTS status_reports (id TEXT PRIMARY KEY, date TEXT NOT NULL, submitted_by TEXT, department TEXT, timestamp DATETIME, report_data TEXT)')
@@ -138,6 +320,8 @@ def init_db():
     ''')
 
     cursor.execute('CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, username TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY (username) REFERENCES users (username) ON DELETE CASCADE)')
+    # Failed logins live in the database so the lockout holds across worker processes.
+    cursor.execute('CREATE TABLE IF NOT EXISTS login_attempts (ip_address TEXT PRIMARY KEY, attempts INTEGER NOT NULL, last_attempt REAL NOT NULL)')
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS persistent_statuses (
@@ -152,6 +336,12 @@ def init_db():
         )
     ''')
 
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_persistent_statuses_dept ON persistent_statuses (department, personnel_id)')
+    init_status_interval_index(cursor)
+    init_roster_change_log(cursor)
+    init_departments(cursor)
+    init_listing_indexes(cursor)
+
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS daily_reports (
             id TEXT PRIMARY KEY,
@@ -163,6 +353,7 @@ def init_db():
             report_data TEXT
         )
     ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_reports_date_dept ON daily_reports (report_date, department)')
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS archived_daily_reports (
@@ -178,6 +369,34 @@ def init_db():
         )
     ''')
 
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archived_daily_date_dept ON archived_daily_reports (report_date, department)')
+
+    # Monthly rollups of archived daily reports, maintained by handle_archive_daily_reports
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            department TEXT NOT NULL,
+            category TEXT NOT NULL,
+            report_days INTEGER NOT NULL DEFAULT 0,
+            total_sum INTEGER NOT NULL DEFAULT 0,
+            available_sum INTEGER NOT NULL DEFAULT 0,
+            mission_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month, department, category)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_status_rollups (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            department TEXT NOT NULL,
+            category TEXT NOT NULL,
+            status TEXT NOT NULL,
+            person_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month, department, category, status)
+        )
+    ''')
+
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS holidays (
             date TEXT PRIMARY KEY,
@@ -187,6 +406,11 @@ def init_db():
     
     # New table for system settings
     cursor.execute('CREATE TABLE IF NOT EXISTS system_settings (key TEXT PRIMARY KEY, value TEXT)')
+    init_cache_generations(cursor)
+
+    # Closed years whose archives were moved to per-year files (see archive_tiering.py)
+    cursor.execute('CREATE TABLE IF NOT EXISTS archive_tiers (year INTEGER PRIMARY KEY, moved_at DATETIME)')
+    history_created = init_submission_history(cursor)
     
     # Check and set the initial current week start date
     cursor.execute("SELECT value FROM system_settings WHERE key = 'current_week_start_date'")
@@ -204,9 +428,997 @@ def init_db():
         cursor.execute("INSERT INTO users (username, salt, key, rank, first_name, last_name, position, department, role) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
                        ('jeerawut', salt, key, 'น.อ.', 'จีราวุฒิ', 'ผู้ดูแลระบบ', 'ผู้ดูแลระบบ', 'ส่วนกลาง', 'admin'))
     conn.commit()
+    if history_created:
+        print(f"สร้างดัชนีประวัติการส่งรายงานแล้ว ({rebuild_submission_history(conn)} รายการ)")
     conn.close()
     print("ฐานข้อมูล SQLite พร้อมใช้งาน")
 
+# --- START: COLD ARCHIVE TIERS ---
+# Closed years of archived_reports/archived_daily_reports can be moved out of
+# the main file into archives/<db name>_<year>.db by archive_tiering.py.
+# Archive handlers read them through iter_archive_sources().
+ARCHIVE_TIER_DIR = "archives"
+
+def archive_tier_path(year, db_file=None):
+    db_file = db_file or current_db_file()
+    base_dir = os.path.dirname(os.path.abspath(db_file))
+    stem = os.path.splitext(os.path.basename(db_file))[0]
+    return os.path.join(base_dir, ARCHIVE_TIER_DIR, f"{stem}_{year}.db")
+
+def iter_archive_sources(conn, years=None):
+    """
+    Yields the schema name holding archived rows: "main" first, then each cold
+    year (newest first, optionally limited to `years`) ATTACHed one at a time.
+    SQLite cannot ATTACH inside a transaction, so the request's read snapshot
+    is ended before the first tier; closed years never change, so their rows
+    are consistent regardless.
+    """
+    cursor = conn.cursor()
+    main_file = next(row[2] for row in cursor.execute("PRAGMA database_list") if row[1] == "main")
+    cursor.execute("SELECT year FROM archive_tiers ORDER BY year DESC")
+    tier_years = [row['year'] for row in cursor.fetchall() if years is None or row['year'] in years]
+    yield "main"
+    if not tier_years:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    for year in tier_years:
+        path = archive_tier_path(year, main_file)
+        if not os.path.exists(path):
+            print(f"ไม่พบไฟล์ข้อมูลเก็บถาวรของปี {year}: {path}")
+            continue
+        alias = f"archive_{year}"
+        cursor.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        try:
+            yield alias
+        finally:
+            cursor.execute(f"DETACH DATABASE {alias}")
+# --- END: COLD ARCHIVE TIERS ---
+
+# --- START: STATUS INTERVAL INDEX ---
+# persistent_statuses rows as [start_day, end_day] intervals (days since 1970-01-01,
+# both ends inclusive) in an R*Tree, kept in sync by triggers on every write path.
+AVAILABILITY_MAX_DAYS = 366
+_DAY_NUMBER_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+def init_status_interval_index(cursor):
+    start_day = _DAY_NUMBER_SQL.format("NEW.start_date")
+    end_day = _DAY_NUMBER_SQL.format("NEW.end_date")
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS persistent_status_intervals USING rtree_i32(id, start_day, end_day)")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS persistent_statuses_interval_insert AFTER INSERT ON persistent_statuses
+        WHEN julianday(NEW.start_date) IS NOT NULL AND julianday(NEW.end_date) IS NOT NULL
+        BEGIN
+            INSERT INTO persistent_status_intervals (id, start_day, end_day) VALUES (NEW.rowid, {start_day}, {end_day});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS persistent_statuses_interval_update AFTER UPDATE OF start_date, end_date ON persistent_statuses
+        BEGIN
+            DELETE FROM persistent_status_intervals WHERE id = OLD.rowid;
+            INSERT INTO persistent_status_intervals (id, start_day, end_day)
+            SELECT NEW.rowid, {start_day}, {end_day}
+            WHERE julianday(NEW.start_date) IS NOT NULL AND julianday(NEW.end_date) IS NOT NULL;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS persistent_statuses_interval_delete AFTER DELETE ON persistent_statuses
+        BEGIN
+            DELETE FROM persistent_status_intervals WHERE id = OLD.rowid;
+        END
+    """)
+    # Index rows written before the R*Tree existed.
+    cursor.execute(f"""
+        INSERT INTO persistent_status_intervals (id, start_day, end_day)
+        SELECT rowid, {_DAY_NUMBER_SQL.format("start_date")}, {_DAY_NUMBER_SQL.format("end_date")}
+        FROM persistent_statuses
+        WHERE julianday(start_date) IS NOT NULL AND julianday(end_date) IS NOT NULL
+          AND rowid NOT IN (SELECT id FROM persistent_status_intervals)
+    """)
+
+def count_unavailable_by_day(cursor, start_date, end_date, department=None):
+    """Returns {(iso_date, department): personnel with a status that day} for start_date..end_date."""
+    query = f"""
+        WITH RECURSIVE days(day) AS (
+            SELECT {_DAY_NUMBER_SQL.format(":start")}
+            UNION ALL SELECT day + 1 FROM days WHERE day < {_DAY_NUMBER_SQL.format(":end")}
+        )
+        SELECT date(days.day * 86400, 'unixepoch') AS day, ps.department, COUNT(DISTINCT ps.personnel_id) AS unavailable
+        FROM persistent_status_intervals iv
+        JOIN persistent_statuses ps ON ps.rowid = iv.id
+        JOIN personnel p ON p.id = ps.personnel_id
+        JOIN days ON days.day BETWEEN iv.start_day AND iv.end_day
+        WHERE iv.end_day >= {_DAY_NUMBER_SQL.format(":start")} AND iv.start_day <= {_DAY_NUMBER_SQL.format(":end")}
+    """
+    params = {"start": start_date, "end": end_date}
+    if department:
+        query += " AND ps.department = :department"
+        params["department"] = department
+    query += " GROUP BY days.day, ps.department"
+    cursor.execute(query, params)
+    return {(row['day'], row['department']): row['unavailable'] for row in cursor.fetchall()}
+# --- END: STATUS INTERVAL INDEX ---
+
+# --- START: ROSTER CHANGE LOG ---
+# Every personnel / persistent_statuses write appends a row here via triggers.
+# The AUTOINCREMENT id is the roster version handed to sync_roster clients;
+# it never goes backwards, even after old rows are pruned.
+ROSTER_LOG_RETENTION_DAYS = 30
+ROSTER_LOGGED_TABLES = {"personnel": "personnel", "persistent_statuses": "status"}
+
+def init_roster_change_log(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS roster_changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            department TEXT,
+            old_department TEXT,
+            changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table, entity in ROSTER_LOGGED_TABLES.items():
+        for event, entity_id, department, old_department in (
+            ("INSERT", "NEW.id", "NEW.department", "NULL"),
+            ("UPDATE", "NEW.id", "NEW.department", "OLD.department"),
+            ("DELETE", "OLD.id", "NULL", "OLD.department"),
+        ):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_roster_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO roster_changes (entity, entity_id, department, old_department)
+                    VALUES ('{entity}', {entity_id}, {department}, {old_department});
+                END
+            """)
+    # roster_snapshot() reads the newest personnel version on every call.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_roster_changes_entity ON roster_changes (entity, version)')
+
+def current_roster_version(cursor):
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'roster_changes'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def prune_roster_changes(conn, retention_days=ROSTER_LOG_RETENTION_DAYS):
+    """Drops log rows older than retention_days; clients older than that get a full resync."""
+    deleted = conn.execute("DELETE FROM roster_changes WHERE changed_at < datetime('now', ?)", (f"-{retention_days} days",)).rowcount
+    conn.commit()
+    return deleted
+# --- END: ROSTER CHANGE LOG ---
+
+# --- START: DEPARTMENT DIRECTORY ---
+# One row per department that has personnel, with its headcount per rank
+# category. Triggers on personnel keep it current on every write path (forms,
+# imports, scripts), so department lists never need a DISTINCT scan of
+# personnel. Trigger names carry a hash of RANK_CLASSIFICATION; editing the
+# classification recreates them and recounts on the next start.
+DEPARTMENT_COUNT_COLUMNS = tuple(f"{category}_count" for category in RANK_CLASSIFICATION)
+
+def _category_flags_sql(row):
+    """One 0/1 expression per category for the personnel row alias `row` (NEW, OLD or a table name)."""
+    flags = []
+    for ranks in RANK_CLASSIFICATION.values():
+        quoted = ", ".join(f"'{rank}'" for rank in ranks)
+        flags.append(f"({row}.rank IN ({quoted}))")
+    return flags
+
+def init_departments(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS departments (
+            name TEXT PRIMARY KEY,
+            headcount INTEGER NOT NULL DEFAULT 0,
+            {", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in DEPARTMENT_COUNT_COLUMNS)}
+        )
+    ''')
+    suffix = hashlib.md5(json.dumps(RANK_CLASSIFICATION, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name GLOB 'personnel_departments_*'")
+    existing = {row[0] for row in cursor.fetchall()}
+    wanted = {f"personnel_departments_{event}_{suffix}" for event in ("insert", "update", "delete")}
+    if existing == wanted:
+        return
+    for name in existing:
+        cursor.execute(f"DROP TRIGGER {name}")
+
+    columns = ", ".join(("name", "headcount") + DEPARTMENT_COUNT_COLUMNS)
+    add = ", ".join(["headcount = headcount + 1"] + [f"{column} = {column} + excluded.{column}" for column in DEPARTMENT_COUNT_COLUMNS])
+    remove = ", ".join(["headcount = headcount - 1"] + [f"{column} = {column} - {flag}"
+                                                        for column, flag in zip(DEPARTMENT_COUNT_COLUMNS, _category_flags_sql("OLD"))])
+    insert_new = (f"INSERT INTO departments ({columns}) SELECT NEW.department, 1, {', '.join(_category_flags_sql('NEW'))} "
+                  f"WHERE NEW.department IS NOT NULL AND NEW.department != '' ON CONFLICT(name) DO UPDATE SET {add};")
+    delete_old = (f"UPDATE departments SET {remove} WHERE name = OLD.department; "
+                  "DELETE FROM departments WHERE name = OLD.department AND headcount <= 0;")
+    cursor.execute(f"CREATE TRIGGER personnel_departments_insert_{suffix} AFTER INSERT ON personnel BEGIN {insert_new} END")
+    cursor.execute(f"""
+        CREATE TRIGGER personnel_departments_update_{suffix} AFTER UPDATE OF rank, department ON personnel
+        WHEN OLD.rank IS NOT NEW.rank OR OLD.department IS NOT NEW.department
+        BEGIN {delete_old} {insert_new} END
+    """)
+    cursor.execute(f"CREATE TRIGGER personnel_departments_delete_{suffix} AFTER DELETE ON personnel BEGIN {delete_old} END")
+    rebuild_departments(cursor)
+
+def rebuild_departments(cursor):
+    cursor.execute("DELETE FROM departments")
+    cursor.execute(f"""
+        INSERT INTO departments ({", ".join(("name", "headcount") + DEPARTMENT_COUNT_COLUMNS)})
+        SELECT department, COUNT(*), {", ".join(f"SUM({flag})" for flag in _category_flags_sql("personnel"))}
+        FROM personnel WHERE department IS NOT NULL AND department != '' GROUP BY department
+    """)
+
+def list_departments(cursor):
+    cursor.execute("SELECT name FROM departments ORDER BY name")
+    return [row['name'] for row in cursor.fetchall()]
+
+def department_headcounts(cursor):
+    """{department: {"total": n, "officer": n, "nco": n, "civilian": n}}"""
+    cursor.execute(f"SELECT name, headcount, {', '.join(DEPARTMENT_COUNT_COLUMNS)} FROM departments ORDER BY name")
+    return {row['name']: {"total": row['headcount'], **{category: row[f"{category}_count"] for category in RANK_CLASSIFICATION}}
+            for row in cursor.fetchall()}
+
+def pending_departments(cursor, reports_table, where="", params=()):
+    """Departments with no report in reports_table (matching `where` on alias r) from a known user."""
+    cursor.execute(f"""
+        SELECT d.name FROM departments d
+        WHERE NOT EXISTS (SELECT 1 FROM {reports_table} r JOIN users u ON r.submitted_by = u.username
+                          WHERE r.department = d.name{where})
+        ORDER BY d.name
+    """, params)
+    return [row['name'] for row in cursor.fetchall()]
+# --- END: DEPARTMENT DIRECTORY ---
+
+# --- START: ROSTER SNAPSHOT ---
+# A per-process, read-only copy of personnel as compact tuples, indexed by id,
+# department and rank category, so hot handlers look people up without SQL.
+# A snapshot is tagged with the newest personnel entry in roster_changes
+# (written by triggers on every write path). The first request that sees a
+# newer version builds a fresh snapshot and swaps it in with one assignment;
+# requests still holding the old one are unaffected.
+PERSONNEL_COLUMNS = ("id", "rank", "first_name", "last_name", "position", "specialty", "department")
+RosterEntry = namedtuple("RosterEntry", PERSONNEL_COLUMNS + ("category", "rank_order"))
+RANK_CATEGORIES = {rank: category for category, ranks in RANK_CLASSIFICATION.items() for rank in ranks}
+_RANK_POSITIONS = {rank: i for i, rank in enumerate(RANK_ORDER)}
+
+def personnel_dict(entry):
+    return dict(zip(PERSONNEL_COLUMNS, entry))
+
+class RosterSnapshot:
+    """Entries are kept in listing order (rank, first name, last name, id) in every index."""
+    ALL = object()  # department argument meaning every department
+
+    __slots__ = ("version", "by_id", "_members", "_by_category")
+
+    def __init__(self, version, entries):
+        entries = sorted(entries, key=lambda e: (e.rank_order, e.first_name or '', e.last_name or '', e.id))
+        self.version = version
+        self.by_id = {e.id: e for e in entries}
+        members, by_category = defaultdict(list), defaultdict(list)
+        for e in entries:
+            # NULL departments are only reachable through ALL, as with "department = ?" in SQL.
+            scopes = (self.ALL,) if e.department is None else (self.ALL, e.department)
+            for scope in scopes:
+                members[scope].append(e)
+                if e.category:
+                    by_category[(scope, e.category)].append(e)
+        self._members = {key: tuple(value) for key, value in members.items()}
+        self._by_category = {key: tuple(value) for key, value in by_category.items()}
+
+    def members(self, department):
+        return self._members.get(department, ())
+
+    def in_category(self, category, department):
+        return self._by_category.get((department, category), ())
+
+_ROSTER_SNAPSHOTS = {}  # database file -> RosterSnapshot
+_ROSTER_SNAPSHOTS_LOCK = threading.Lock()
+
+def roster_snapshot(cursor):
+    """The current database's snapshot, rebuilt first if personnel changed since it was taken."""
+    db_file = current_db_file()
+    cursor.execute("SELECT MAX(version) FROM roster_changes WHERE entity = 'personnel'")
+    version = cursor.fetchone()[0]
+    snapshot = _ROSTER_SNAPSHOTS.get(db_file)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _ROSTER_SNAPSHOTS_LOCK:
+        snapshot = _ROSTER_SNAPSHOTS.get(db_file)
+        if snapshot is None or snapshot.version != version:
+            cursor.execute(f"SELECT {', '.join(PERSONNEL_COLUMNS)} FROM personnel")
+            entries = [RosterEntry(*row, RANK_CATEGORIES.get(row['rank']), _RANK_POSITIONS.get(row['rank'], len(RANK_ORDER)))
+                       for row in cursor.fetchall()]
+            snapshot = _ROSTER_SNAPSHOTS[db_file] = RosterSnapshot(version, entries)
+    return snapshot
+# --- END: ROSTER SNAPSHOT ---
+
+# --- START: KEYSET PAGINATION ---
+# Personnel and user listings page by (rank order, first name, last name, key)
+# instead of OFFSET, so page 500 costs the same index seek as page 1. The page
+# cursor handed to the client is the sort key of the last row it received.
+RANK_ORDER_SQL = "CASE rank " + " ".join(f"WHEN '{r}' THEN {i}" for i, r in enumerate(RANK_ORDER)) + f" ELSE {len(RANK_ORDER)} END"
+LISTING_SORT_KEYS = {
+    "personnel": (RANK_ORDER_SQL, "IFNULL(first_name, '')", "IFNULL(last_name, '')", "id"),
+    "users": (RANK_ORDER_SQL, "IFNULL(first_name, '')", "IFNULL(last_name, '')", "username"),
+}
+# Extra leading columns for filtered listings (non-admins only see their department).
+LISTING_INDEX_PREFIXES = {"personnel": ((), ("department",)), "users": ((),)}
+
+class InvalidPageCursor(ValueError):
+    pass
+
+def init_listing_indexes(cursor):
+    """(Re)creates the sort-key indexes; their names carry a hash of RANK_ORDER so edits to it rebuild them."""
+    suffix = hashlib.md5(RANK_ORDER_SQL.encode('utf-8')).hexdigest()[:8]
+    wanted = {}
+    for table, prefixes in LISTING_INDEX_PREFIXES.items():
+        for prefix in prefixes:
+            name = "_".join(("idx", table, *prefix, "sort", suffix))
+            wanted[name] = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(prefix + LISTING_SORT_KEYS[table])})"
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name GLOB 'idx_*_sort_*'")
+    for (name,) in cursor.fetchall():
+        if name not in wanted:
+            cursor.execute(f"DROP INDEX {name}")
+    for sql in wanted.values():
+        cursor.execute(sql)
+
+def encode_page_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_page_cursor(token, width):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidPageCursor(token)
+    if not isinstance(values, list) or len(values) != width or not all(isinstance(v, (int, str)) for v in values):
+        raise InvalidPageCursor(token)
+    return values
+
+def keyset_page(cursor, table, where_clauses, params, page_cursor=None, limit=ITEMS_PER_PAGE):
+    """
+    Returns (rows, next_cursor) for the page that follows page_cursor.
+    rows are dicts of the table's columns; next_cursor is None on the last page.
+    """
+    keys = LISTING_SORT_KEYS[table]
+    where_clauses, params = list(where_clauses), list(params)
+    if page_cursor:
+        after = decode_page_cursor(page_cursor, len(keys))
+        # The leading-key range lets SQLite seek the index; the row value then skips
+        # the rows of that rank already sent.
+        where_clauses.append(f"{keys[0]} >= ? AND ({', '.join(keys)}) > ({', '.join('?' for _ in keys)})")
+        params.extend([after[0], *after])
+    key_columns = ", ".join(f"{key} AS _sort_{i}" for i, key in enumerate(keys))
+    query = f"SELECT *, {key_columns} FROM {table}"
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    query += f" ORDER BY {', '.join(keys)} LIMIT ?"
+    cursor.execute(query, params + [limit + 1])
+    rows = [dict(row) for row in cursor.fetchmany(limit + 1)]
+    next_cursor = None
+    if len(rows) > limit:
+        rows.pop()
+        next_cursor = encode_page_cursor([rows[-1][f"_sort_{i}"] for i in range(len(keys))])
+    for row in rows:
+        for i in range(len(keys)):
+            del row[f"_sort_{i}"]
+    return rows, next_cursor
+
+def cached_listing_total(cursor, table, where_clauses, params, session):
+    """COUNT(*) for a listing filter, cached until the table's cache tag is bumped."""
+    where_clause_str = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    key = response_cache_key(cursor, f"{table}:total", {"where": where_clause_str, "params": list(params)}, session, (table,))
+    cached = RESPONSE_CACHE.get(key)
+    if cached is not None:
+        return cached["total"]
+    cursor.execute(f"SELECT COUNT(*) AS total FROM {table}{where_clause_str}", params)
+    total = cursor.fetchone()['total']
+    RESPONSE_CACHE.put(key, {"total": total})
+    return total
+# --- END: KEYSET PAGINATION ---
+
+# --- START: SUBMISSION HISTORY INDEX ---
+# One metadata row per submitted weekly report, wherever its contents live:
+#   active   - status_reports (kept current by triggers)
+#   archived - inside an archived_reports batch (archive_id), possibly in a cold tier
+#   legacy   - archived_reports_old, left behind by migrate_database.py
+# History pages are read from here; contents are fetched by id on demand.
+HISTORY_PAGE_SIZE = 20
+HISTORY_SOURCE_TABLES = {"active": "status_reports", "legacy": "archived_reports_old"}
+_HISTORY_COLUMNS = "report_id, source, department, date, submitted_by, timestamp, item_count"
+_ITEM_COUNT_SQL = "CASE WHEN json_valid({0}) THEN json_array_length({0}) END"
+
+def init_submission_history(cursor):
+    """Creates the index table and its triggers; returns True if the table is new and needs a rebuild."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'submission_history'")
+    created = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS submission_history (
+            report_id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            department TEXT,
+            date TEXT,
+            submitted_by TEXT,
+            timestamp DATETIME,
+            item_count INTEGER,
+            archive_id TEXT,
+            archived_at DATETIME
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_submission_history_dept_time ON submission_history (department, timestamp, report_id)')
+    values = f"NEW.id, 'active', NEW.department, NEW.date, NEW.submitted_by, NEW.timestamp, {_ITEM_COUNT_SQL.format('NEW.report_data')}"
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS status_reports_history_insert AFTER INSERT ON status_reports
+        BEGIN
+            INSERT OR REPLACE INTO submission_history ({_HISTORY_COLUMNS}) VALUES ({values});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS status_reports_history_update AFTER UPDATE ON status_reports
+        BEGIN
+            DELETE FROM submission_history WHERE report_id = OLD.id AND source = 'active';
+            INSERT OR REPLACE INTO submission_history ({_HISTORY_COLUMNS}) VALUES ({values});
+        END
+    """)
+    # Archiving re-labels the row as 'archived' before deleting the report, so only unarchived rows go.
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS status_reports_history_delete AFTER DELETE ON status_reports
+        BEGIN
+            DELETE FROM submission_history WHERE report_id = OLD.id AND source = 'active';
+        END
+    """)
+    return created
+
+def rebuild_submission_history(conn):
+    """Re-indexes every source (cold tiers included); returns the number of reports indexed."""
+    register_archive_functions(conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM submission_history")
+    cursor.execute(f"""
+        INSERT INTO submission_history ({_HISTORY_COLUMNS})
+        SELECT id, 'active', department, date, submitted_by, timestamp, {_ITEM_COUNT_SQL.format('report_data')} FROM status_reports
+    """)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archived_reports_old'")
+    if cursor.fetchone():
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO submission_history ({_HISTORY_COLUMNS})
+            SELECT id, 'legacy', department, date, submitted_by, timestamp, {_ITEM_COUNT_SQL.format('report_data')} FROM archived_reports_old
+        """)
+    conn.commit()
+    for schema in iter_archive_sources(conn):
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO main.submission_history ({_HISTORY_COLUMNS}, archive_id, archived_at)
+            SELECT json_extract(r.value, '$.id'), 'archived', json_extract(r.value, '$.department'), json_extract(r.value, '$.date'),
+                   NULL, json_extract(r.value, '$.timestamp'), json_array_length(r.value, '$.items'), a.id, a.timestamp
+            FROM {schema}.archived_reports a, json_each(archive_decode(a.report_data)) r
+            WHERE json_extract(r.value, '$.id') IS NOT NULL
+        """)
+        conn.commit()
+    return cursor.execute("SELECT COUNT(*) FROM submission_history").fetchone()[0]
+
+def load_history_contents(conn, cursor, rows):
+    """Maps report_id -> items for submission_history rows, reading each source (and archive batch) once."""
+    contents = {}
+    by_source = defaultdict(list)
+    for row in rows:
+        by_source[row['source']].append(row)
+    for source, table in HISTORY_SOURCE_TABLES.items():
+        ids = [row['report_id'] for row in by_source[source]]
+        if ids:
+            cursor.execute(f"SELECT id, report_data FROM {table} WHERE id IN ({', '.join('?' for _ in ids)})", ids)
+            contents.update((row['id'], json.loads(row['report_data'])) for row in cursor.fetchall())
+
+    wanted = {row['report_id'] for row in by_source["archived"]}
+    archive_ids = sorted({row['archive_id'] for row in by_source["archived"]})
+    if archive_ids:
+        years = {int(str(row['archived_at'])[:4]) for row in by_source["archived"] if row['archived_at']}
+        for schema in iter_archive_sources(conn, years):
+            cursor.execute(f"SELECT report_data FROM {schema}.archived_reports WHERE id IN ({', '.join('?' for _ in archive_ids)})", archive_ids)
+            for batch in cursor.fetchall():
+                for report in decode_archive_payload(batch['report_data']):
+                    if report.get('id') in wanted:
+                        contents[report['id']] = report.get('items', [])
+    return contents
+# --- END: SUBMISSION HISTORY INDEX ---
+
+# --- START: DAILY ROLLUPS ---
+ROLLUP_CATEGORIES = ('officer', 'nco', 'civilian')
+
+def rollup_archived_days(cursor, where, params=(), sign=1, schema="main"):
+    """
+    Adds (sign=1) or removes (sign=-1) the archived department-days matching
+    `where` (an SQL condition on alias a) to/from the monthly rollups.
+    """
+    categories = json.dumps(ROLLUP_CATEGORIES)
+    cursor.execute(f"""
+        INSERT INTO main.daily_rollups (year, month, department, category, report_days, total_sum, available_sum, mission_sum)
+        SELECT a.year, a.month, a.department, c.value, COUNT(*) * :sign,
+               SUM(CAST(COALESCE(json_extract(a.summary_data, '$.' || c.value || '.total'), 0) AS INTEGER)) * :sign,
+               SUM(CAST(COALESCE(json_extract(a.summary_data, '$.' || c.value || '.available'), 0) AS INTEGER)) * :sign,
+               SUM(CAST(COALESCE(json_extract(a.summary_data, '$.' || c.value || '.mission'), 0) AS INTEGER)) * :sign
+        FROM {schema}.archived_daily_reports a, json_each(:categories) c
+        WHERE {where}
+        GROUP BY a.year, a.month, a.department, c.value
+        ON CONFLICT(year, month, department, category) DO UPDATE SET
+            report_days = report_days + excluded.report_days,
+            total_sum = total_sum + excluded.total_sum,
+            available_sum = available_sum + excluded.available_sum,
+            mission_sum = mission_sum + excluded.mission_sum
+    """, {**dict(params), "sign": sign, "categories": categories})
+    cursor.execute(f"""
+        INSERT INTO main.daily_status_rollups (year, month, department, category, status, person_days)
+        SELECT a.year, a.month, a.department, c.value, COALESCE(NULLIF(json_extract(i.value, '$.status'), ''), 'ไม่ระบุ'), COUNT(*) * :sign
+        FROM {schema}.archived_daily_reports a, json_each(:categories) c,
+             json_each(archive_decode(a.report_data), '$.' || c.value) i
+        WHERE {where}
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT(year, month, department, category, status) DO UPDATE SET
+            person_days = person_days + excluded.person_days
+    """, {**dict(params), "sign": sign, "categories": categories})
+
+def rebuild_daily_rollups(conn):
+    """Recomputes all rollups from archived_daily_reports (cold tiers included); returns rows processed."""
+    register_archive_functions(conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM daily_rollups")
+    cursor.execute("DELETE FROM daily_status_rollups")
+    conn.commit()
+    processed = 0
+    for schema in iter_archive_sources(conn):
+        rollup_archived_days(cursor, "1 = 1", schema=schema)
+        processed += cursor.execute(f"SELECT COUNT(*) FROM {schema}.archived_daily_reports").fetchone()[0]
+        conn.commit()
+    return processed
+# --- END: DAILY ROLLUPS ---
+
+# --- START: SINGLE-WRITER SUBMISSION QUEUE ---
+# Report submissions are funnelled to one thread that owns the write
+# connection. Jobs that arrive together share one transaction (and one
+# fsync); each job runs inside its own SAVEPOINT so a failing submission
+# is rolled back alone and only its caller sees the error. A caller that
+# times out withdraws its job if the writer has not started it yet; once
+# started, the caller waits for the outcome, so a timeout never hides a
+# submission that still commits.
+WRITER_QUEUE_SIZE = 256 # pending submissions before callers are turned away
+WRITER_BATCH_SIZE = 32 # most jobs committed together
+WRITER_JOB_TIMEOUT = 30 # seconds a request waits for its submission to commit
+WRITER_BUSY_MESSAGE = "ระบบกำลังรับการส่งยอดจำนวนมาก กรุณาลองใหม่อีกครั้งในอีกสักครู่"
+
+class WriterQueueFull(Exception):
+    pass
+
+class WriterTimeout(Exception):
+    """The job was withdrawn before the writer started it; nothing was written."""
+
+class _WriteJob:
+    __slots__ = ("fn", "args", "done", "result", "error", "state", "_lock")
+
+    def __init__(self, fn, args):
+        self.fn, self.args = fn, args
+        self.done = threading.Event()
+        self.result = self.error = None
+        self.state = "queued"
+        self._lock = threading.Lock()
+
+    def claim(self, state):
+        """Moves a queued job to state ("running" or "abandoned"); False once it has left the queue."""
+        with self._lock:
+            if self.state != "queued":
+                return False
+            self.state = state
+            return True
+
+class SubmissionWriter:
+    def __init__(self, db_file, maxsize=WRITER_QUEUE_SIZE, batch_size=WRITER_BATCH_SIZE):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, timeout=WRITER_JOB_TIMEOUT):
+        """Runs fn(cursor, *args) on the writer thread and returns its result once committed."""
+        job = _WriteJob(fn, args)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise WriterQueueFull()
+        if not job.done.wait(timeout):
+            if job.claim("abandoned"):
+                raise WriterTimeout()
+            job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_file, timeout=DB_BUSY_TIMEOUT, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Jobs call helpers that look up current_db_file() (e.g. roster_snapshot).
+        _current_db.set(self.db_file)
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.batch_size:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit_group(conn, jobs)
+
+    def _commit_group(self, conn, jobs):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for job in jobs:
+                if not job.claim("running"):
+                    continue
+                cursor.execute("SAVEPOINT submission")
+                try:
+                    job.result = job.fn(cursor, *job.args)
+                    cursor.execute("RELEASE submission")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO submission")
+                    cursor.execute("RELEASE submission")
+                    job.error = e
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Submission writer error: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for job in jobs:
+                if job.error is None:
+                    job.error = e
+        finally:
+            for job in jobs:
+                job.done.set()
+
+_SUBMISSION_WRITERS = {}
+_SUBMISSION_WRITERS_LOCK = threading.Lock()
+
+def get_submission_writer():
+    """
+    Returns the writer for the current database: under pre-fork workers a
+    link to the one writer process, otherwise this process's own writer,
+    started on first use.
+    """
+    db_file = current_db_file()
+    if WRITER_SERVICE is not None and not WRITER_SERVICE.in_writer:
+        return WRITER_SERVICE.link(db_file)
+    key = (os.getpid(), db_file)
+    with _SUBMISSION_WRITERS_LOCK:
+        writer = _SUBMISSION_WRITERS.get(key)
+        if writer is None:
+            writer = _SUBMISSION_WRITERS[key] = SubmissionWriter(db_file)
+    return writer
+
+class WriterService:
+    """
+    Keeps a single writer per database when the server runs several worker
+    processes. The parent creates the Unix socket before fork(); one child
+    runs serve() and owns every SubmissionWriter, and the workers send their
+    jobs to it. Jobs are module-level functions, so they pickle by name.
+    """
+    def __init__(self):
+        self._dir = tempfile.mkdtemp(prefix="ps-writer-")
+        self.address = os.path.join(self._dir, "writer.sock")
+        self._authkey = secrets.token_bytes(32)
+        self._listener = Listener(self.address, "AF_UNIX", authkey=self._authkey)
+        self.in_writer = False
+        self._idle = {}  # pid -> LifoQueue of open connections, so forked workers never share one
+
+    def serve(self):
+        """Runs in the writer process: one thread per worker connection."""
+        self.in_writer = True
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                print(f"Writer service: rejected connection ({e})")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), name="writer-link", daemon=True).start()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    db_file, fn, args, timeout = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    with use_database(db_file):
+                        reply = (True, get_submission_writer().submit(fn, *args, timeout=timeout))
+                except Exception as e:
+                    reply = (False, e)
+                try:
+                    conn.send(reply)
+                except (TypeError, AttributeError, pickle.PicklingError) as e:
+                    conn.send((False, RuntimeError(f"{type(reply[1]).__name__}: {reply[1]} ({e})")))
+
+    def link(self, db_file):
+        return _WriterLink(self, db_file)
+
+    def _checkout(self):
+        idle = self._idle.setdefault(os.getpid(), queue.LifoQueue())
+        while True:
+            try:
+                conn = idle.get_nowait()
+            except queue.Empty:
+                break
+            # A readable idle link means the writer process went away (EOF); drop it.
+            if conn.poll(0):
+                conn.close()
+                continue
+            return conn
+        try:
+            return Client(self.address, "AF_UNIX", authkey=self._authkey)
+        except OSError:
+            # Nothing was sent, so this is safe to report like a full queue (the writer is restarting).
+            raise WriterQueueFull()
+
+    def submit(self, db_file, fn, args, timeout):
+        conn = self._checkout()
+        try:
+            conn.send((db_file, fn, args, timeout))
+            ok, value = conn.recv()
+        except BaseException:
+            conn.close()
+            raise
+        self._idle[os.getpid()].put(conn)
+        if not ok:
+            raise value
+        return value
+
+    def close(self):
+        self._listener.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+class _WriterLink:
+    """SubmissionWriter.submit() for a worker process, carried out by the writer process."""
+    __slots__ = ("service", "db_file")
+
+    def __init__(self, service, db_file):
+        self.service, self.db_file = service, db_file
+
+    def submit(self, fn, *args, timeout=WRITER_JOB_TIMEOUT):
+        return self.service.submit(self.db_file, fn, args, timeout)
+
+WRITER_SERVICE = None  # set by run() when it forks worker processes
+# --- END: SINGLE-WRITER SUBMISSION QUEUE ---
+
+# --- START: ONLINE BACKUP ---
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7                 # newest snapshots kept per database
+
+class BackupError(Exception):
+    """The snapshot could not be written or failed its integrity check."""
+
+_backup_locks = defaultdict(threading.Lock)  # one backup at a time per database file
+
+def list_backups(db_file=None):
+    """Existing snapshots of db_file, newest first."""
+    db_file = db_file or current_db_file()
+    stem = Path(db_file).stem
+    backup_dir = Path(db_file).resolve().parent / BACKUP_DIR
+    return sorted(backup_dir.glob(f"{stem}_????????_??????.db"), reverse=True)
+
+def backup_database(db_file=None, keep=BACKUP_KEEP):
+    """
+    Copies the live database into backups/<name>_<timestamp>.db with VACUUM INTO,
+    then checks the copy and drops all but the `keep` newest snapshots. The copy
+    is read from one WAL snapshot, so writers carry on and never restart it.
+    Cold archive tiers are separate files and are not included. Returns a
+    summary dict; raises BackupError.
+    """
+    db_file = db_file or current_db_file()
+    backup_lock = _backup_locks[str(Path(db_file).resolve())]
+    if not backup_lock.acquire(blocking=False):
+        raise BackupError("กำลังสำรองข้อมูลอยู่แล้ว")
+    try:
+        backup_dir = Path(db_file).resolve().parent / BACKUP_DIR
+        backup_dir.mkdir(exist_ok=True)
+        target = backup_dir / f"{Path(db_file).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        partial = target.with_suffix(".db.partial")
+        partial.unlink(missing_ok=True)  # VACUUM INTO refuses an existing file
+        start = time.perf_counter()
+
+        source = sqlite3.connect(db_file, timeout=DB_BUSY_TIMEOUT)
+        try:
+            source.execute("VACUUM INTO ?", (str(partial),))
+            dest = sqlite3.connect(partial)
+            try:
+                integrity = dest.execute("PRAGMA integrity_check").fetchone()[0]
+                pages = dest.execute("PRAGMA page_count").fetchone()[0]
+            finally:
+                dest.close()
+        except sqlite3.Error as e:
+            partial.unlink(missing_ok=True)
+            raise BackupError(str(e)) from e
+        finally:
+            source.close()
+        if integrity != "ok":
+            partial.unlink(missing_ok=True)
+            raise BackupError(f"integrity_check: {integrity}")
+        os.replace(partial, target)
+
+        removed = []
+        for old in list_backups(db_file)[max(keep, 1):]:
+            old.unlink(missing_ok=True)
+            removed.append(old.name)
+        return {
+            "file": target.name,
+            "size_kb": round(target.stat().st_size / 1024, 1),
+            "pages": pages,
+            "seconds": round(time.perf_counter() - start, 2),
+            "removed": removed,
+        }
+    finally:
+        backup_lock.release()
+# --- END: ONLINE BACKUP ---
+
+# --- START: BACKGROUND MAINTENANCE ---
+# Seconds between runs of each job; set an entry to 0 to disable that job.
+MAINTENANCE_INTERVALS = {
+    "session_sweep": 300,
+    "expired_status_cleanup": 3600,
+    "statistics_refresh": 6 * 3600,
+    "wal_checkpoint": 600,
+    "incremental_vacuum": 24 * 3600,
+    "roster_log_prune": 24 * 3600,
+    "online_backup": 0,
+}
+MAINTENANCE_IDLE_SECONDS = 2        # the server counts as busy if a request arrived this recently
+MAINTENANCE_MAX_BACKOFF = 1800      # longest a busy server can postpone a job
+MAINTENANCE_LOCK_TIMEOUT = 1        # jobs give up quickly instead of queueing behind writers
+MAINTENANCE_VACUUM_PAGES = 2000     # pages released per incremental_vacuum run
+
+class RequestActivity:
+    """
+    Counts in-flight API requests so background work can stay out of their way.
+    The counters live in shared memory, one slot per worker process, so the
+    scheduler in one pre-fork worker also sees requests running in the others.
+    """
+    def __init__(self, slots=1):
+        self.configure(slots)
+
+    def configure(self, slots):
+        """Allocates one counter per worker; call before fork() so every worker shares them."""
+        self._active = multiprocessing.Array('i', slots)
+        self._last_request = multiprocessing.Value('d', 0.0)  # time.monotonic() is system-wide
+        self._slot = 0
+
+    def bind_slot(self, slot):
+        """Called in a worker after fork(); clears whatever a crashed predecessor left in the slot."""
+        self._slot = slot
+        with self._active.get_lock():
+            self._active[slot] = 0
+
+    def enter(self):
+        with self._active.get_lock():
+            self._active[self._slot] += 1
+        self._last_request.value = time.monotonic()
+
+    def exit(self):
+        with self._active.get_lock():
+            self._active[self._slot] -= 1
+
+    def is_busy(self):
+        with self._active.get_lock():
+            active = sum(self._active)
+        return active > 0 or time.monotonic() - self._last_request.value < MAINTENANCE_IDLE_SECONDS
+
+REQUEST_ACTIVITY = RequestActivity()
+
+class MaintenanceBusy(Exception):
+    """Raised by a job that could not finish because the database was in use."""
+
+def _job_session_sweep(conn):
+    expiry_limit = (datetime.now() - timedelta(seconds=SESSION_TIMEOUT_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+    sessions = conn.execute("DELETE FROM sessions WHERE created_at < ?", (expiry_limit,)).rowcount
+    attempts = conn.execute("DELETE FROM login_attempts WHERE last_attempt < ?", (time.time() - LOCKOUT_TIME,)).rowcount
+    conn.commit()
+    return f"ลบ session {sessions} รายการ, ประวัติล็อกอิน {attempts} รายการ"
+
+def _job_expired_status_cleanup(conn):
+    # The daily report may still be filling in a day before today, so keep anything it can show.
+    keep_from = min(date.today(), get_daily_target_date(conn.cursor())).isoformat()
+    deleted = conn.execute("DELETE FROM persistent_statuses WHERE end_date < ?", (keep_from,)).rowcount
+    conn.commit()
+    return f"ลบสถานะที่หมดอายุ {deleted} รายการ"
+
+def _job_statistics_refresh(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    return "ปรับปรุงสถิติของตัววางแผนคำสั่ง"
+
+def _job_wal_checkpoint(conn):
+    busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    if busy:
+        raise MaintenanceBusy(f"checkpoint ได้ {checkpointed}/{wal_pages} หน้า")
+    return f"checkpoint {checkpointed} หน้า"
+
+def _job_incremental_vacuum(conn):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return "ข้าม (ฐานข้อมูลยังไม่ได้ตั้ง auto_vacuum=INCREMENTAL ต้อง VACUUM หนึ่งครั้ง)"
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})").fetchall()
+    free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return f"คืนพื้นที่ {free_before - free_after} หน้า (เหลือ {free_after} หน้าว่าง)"
+
+def _job_roster_log_prune(conn):
+    return f"ลบประวัติการเปลี่ยนแปลงกำลังพลเก่า {prune_roster_changes(conn)} รายการ"
+
+def _job_online_backup(conn):
+    result = backup_database()
+    return f"{result['file']} ({result['size_kb']} KB)"
+
+MAINTENANCE_JOBS = {
+    "session_sweep": _job_session_sweep,
+    "expired_status_cleanup": _job_expired_status_cleanup,
+    "statistics_refresh": _job_statistics_refresh,
+    "wal_checkpoint": _job_wal_checkpoint,
+    "incremental_vacuum": _job_incremental_vacuum,
+    "roster_log_prune": _job_roster_log_prune,
+    "online_backup": _job_online_backup,
+}
+
+class MaintenanceScheduler(threading.Thread):
+    """
+    Runs the MAINTENANCE_JOBS on their own connection. A job that comes due
+    while the server is busy (or that hits a locked database) is postponed
+    with exponential backoff, up to MAINTENANCE_MAX_BACKOFF.
+    """
+    def __init__(self, db_file, intervals=None, activity=REQUEST_ACTIVITY):
+        super().__init__(name=f"maintenance-{Path(db_file).stem}", daemon=True)
+        self.db_file = db_file
+        self.activity = activity
+        now = time.monotonic()
+        self.jobs = {
+            name: {"interval": interval, "next_run": now + min(interval, 60), "backoff": 0}
+            for name, interval in (intervals or MAINTENANCE_INTERVALS).items() if interval
+        }
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        with use_database(self.db_file):
+            self._run_jobs()
+
+    def _run_jobs(self):
+        conn = sqlite3.connect(self.db_file, timeout=MAINTENANCE_LOCK_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            while self.jobs and not self._stop_event.is_set():
+                name, job = min(self.jobs.items(), key=lambda j: j[1]["next_run"])
+                if self._stop_event.wait(max(0, job["next_run"] - time.monotonic())):
+                    break
+                self.run_job(conn, name, job)
+        finally:
+            conn.close()
+
+    def run_job(self, conn, name, job):
+        # Past the longest backoff the job runs anyway, so a busy server cannot starve it.
+        if self.activity.is_busy() and job["backoff"] < MAINTENANCE_MAX_BACKOFF:
+            self._postpone(name, job, "เซิร์ฟเวอร์กำลังใช้งาน")
+            return
+        start = time.perf_counter()
+        try:
+            result = MAINTENANCE_JOBS[name](conn)
+        except (MaintenanceBusy, sqlite3.OperationalError) as e:
+            conn.rollback()
+            self._postpone(name, job, str(e))
+            return
+        except Exception as e:
+            conn.rollback()
+            result = f"ผิดพลาด: {e}"
+        print(f"[maintenance] {name}: {result} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        job["backoff"] = 0
+        job["next_run"] = time.monotonic() + job["interval"]
+
+    def _postpone(self, name, job, reason):
+        job["backoff"] = min(max(job["backoff"] * 2, 30), MAINTENANCE_MAX_BACKOFF)
+        job["next_run"] = time.monotonic() + job["backoff"]
+        print(f"[maintenance] {name}: เลื่อนออกไป {job['backoff']} วินาที ({reason})")
+# --- END: BACKGROUND MAINTENANCE ---
+
 # --- Security Functions ---
 def hash_password(password, salt=None):
     if salt is None: salt = os.urandom(16)
@@ -246,9 +1458,10 @@ def classify_personnel(personnel_list):
 # --- Action Handlers ---
 def handle_login(payload, conn, cursor, client_address):
     ip_address = client_address[0]
-    if ip_address in FAILED_LOGIN_ATTEMPTS:
-        attempts, last_attempt_time = FAILED_LOGIN_ATTEMPTS[ip_address]
-        if attempts >= MAX_ATTEMPTS and time.time() - last_attempt_time < LOCKOUT_TIME:
+    cursor.execute("SELECT attempts, last_attempt FROM login_attempts WHERE ip_address = ?", (ip_address,))
+    failed = cursor.fetchone()
+    if failed:
+        if failed['attempts'] >= MAX_ATTEMPTS and time.time() - failed['last_attempt'] < LOCKOUT_TIME:
             return {"status": "error", "message": "คุณพยายามล็อกอินผิดพลาดบ่อยเกินไป กรุณาลองใหม่อีกครั้งใน 5 นาที"}, None
     
     username, password = payload.get("username"), payload.get("password")
@@ -256,10 +1469,10 @@ def handle_login(payload, conn, cursor, client_address):
     user_data = cursor.fetchone()
     
     if user_data and verify_password(user_data['salt'], user_data['key'], password):
-        if ip_address in FAILED_LOGIN_ATTEMPTS: del FAILED_LOGIN_ATTEMPTS[ip_address]
+        if failed: cursor.execute("DELETE FROM login_attempts WHERE ip_address = ?", (ip_address,))
         session_token = secrets.token_hex(16)
         cursor.execute("INSERT INTO sessions (token, username, created_at) VALUES (?, ?, ?)",
-                       (session_token, user_data["username"], datetime.now()))
+                       (session_token, user_data["username"], datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
         conn.commit()
         user_info = {k: user_data[k] for k in user_data.keys() if k not in ['salt', 'key']}
         expires_time = time.time() + SESSION_TIMEOUT_SECONDS
@@ -270,8 +1483,10 @@ def handle_login(payload, conn, cursor, client_address):
         headers = [('Set-Cookie', '; '.join(cookie_attrs))]
         return {"status": "success", "user": user_info}, headers
     else:
-        if ip_address in FAILED_LOGIN_ATTEMPTS: FAILED_LOGIN_ATTEMPTS[ip_address] = (FAILED_LOGIN_ATTEMPTS[ip_address][0] + 1, time.time())
-        else: FAILED_LOGIN_ATTEMPTS[ip_address] = (1, time.time())
+        cursor.execute("INSERT INTO login_attempts (ip_address, attempts, last_attempt) VALUES (?, 1, ?) "
+                       "ON CONFLICT(ip_address) DO UPDATE SET attempts = attempts + 1, last_attempt = excluded.last_attempt",
+                       (ip_address, time.time()))
+        conn.commit()
         return {"status": "error", "message": "ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง"}, None
 
 def handle_logout(payload, conn, cursor, session):
@@ -283,8 +1498,7 @@ def handle_logout(payload, conn, cursor, session):
     return {"status": "success", "message": "ออกจากระบบสำเร็จ"}, headers
 
 def handle_get_dashboard_summary(payload, conn, cursor):
-    cursor.execute("SELECT DISTINCT department FROM personnel WHERE department IS NOT NULL AND department != ''")
-    all_departments = [row['department'] for row in cursor.fetchall()]
+    all_departments = list_departments(cursor)
     query = "SELECT sr.department, sr.report_data, sr.timestamp, u.rank, u.first_name, u.last_name FROM status_reports sr JOIN users u ON sr.submitted_by = u.username WHERE sr.timestamp = (SELECT MAX(timestamp) FROM status_reports WHERE department = sr.department)"
     cursor.execute(query)
     submitted_info = {}
@@ -310,25 +1524,24 @@ def handle_get_dashboard_summary(payload, conn, cursor):
     }
     return {"status": "success", "summary": summary}
 
-def handle_list_users(payload, conn, cursor):
+def handle_list_users(payload, conn, cursor, session):
     page = payload.get("page", 1)
     search_term = payload.get("searchTerm", "").strip()
-    offset = (page - 1) * ITEMS_PER_PAGE
-    count_query = "SELECT COUNT(*) as total FROM users"
-    data_query = "SELECT username, rank, first_name, last_name, position, department, role FROM users"
-    params = []
-    where_clause = ""
+    params, where_clauses = [], []
     if search_term:
-        where_clause = " WHERE username LIKE ? OR first_name LIKE ? OR last_name LIKE ? OR department LIKE ?"
+        where_clauses.append("(username LIKE ? OR first_name LIKE ? OR last_name LIKE ? OR department LIKE ?)")
         term = f"%{search_term}%"
         params.extend([term, term, term, term])
-    cursor.execute(count_query + where_clause, params)
-    total_items = cursor.fetchone()['total']
-    data_query += where_clause + " LIMIT ? OFFSET ?"
-    params.extend([ITEMS_PER_PAGE, offset])
-    cursor.execute(data_query, params)
-    users = [{k: escape(str(v)) if v is not None else '' for k, v in dict(row).items()} for row in cursor.fetchall()]
-    return {"status": "success", "users": users, "total": total_items, "page": page}
+    try:
+        rows, next_cursor = keyset_page(cursor, "users", where_clauses, params, payload.get("cursor"))
+    except InvalidPageCursor:
+        return {"status": "error", "message": "ตำแหน่งหน้าข้อมูลไม่ถูกต้อง กรุณาโหลดรายการใหม่"}
+    columns = ("username", "rank", "first_name", "last_name", "position", "department", "role")
+    users = [{k: escape(str(row[k])) if row[k] is not None else '' for k in columns} for row in rows]
+    response = {"status": "success", "users": users, "next_cursor": next_cursor, "page": page}
+    if payload.get("includeTotal"):
+        response["total"] = cached_listing_total(cursor, "users", where_clauses, params, session)
+    return response
 
 def handle_add_user(payload, conn, cursor):
     data = payload.get("data", {}); username = data.get("username"); password = data.get("password")
@@ -366,8 +1579,8 @@ def handle_list_personnel(payload, conn, cursor, session):
     page = payload.get("page", 1)
     search_term = payload.get("searchTerm", "").strip()
     fetch_all = payload.get("fetchAll", False)
-    offset = (page - 1) * ITEMS_PER_PAGE
-    base_query = " FROM personnel"
+    # The weekly form keeps its own roster copy up to date with sync_roster and only needs the form's context.
+    roster_cached = fetch_all and payload.get("rosterCached", False)
     params, where_clauses = [], []
     is_admin, department = session.get("role") == "admin", session.get("department")
     
@@ -384,20 +1597,28 @@ def handle_list_personnel(payload, conn, cursor, session):
         where_clauses.append(f"rank IN ({placeholders})")
         params.extend(officer_ranks)
 
-    where_clause_str = ""
-    if where_clauses: where_clause_str = " WHERE " + " AND ".join(where_clauses)
-    
-    count_query = "SELECT COUNT(*) as total" + base_query + where_clause_str
-    cursor.execute(count_query, params)
-    total_items = cursor.fetchone()['total']
-    
-    data_query = "SELECT *" + base_query + where_clause_str
-    if not fetch_all:
-        data_query += " LIMIT ? OFFSET ?"
-        params.extend([ITEMS_PER_PAGE, offset])
-    
-    cursor.execute(data_query, params)
-    personnel = [{k: escape(str(v)) if v is not None else '' for k, v in dict(row).items()} for row in cursor.fetchall()]
+    total_items = None
+    next_cursor = None
+    if roster_cached:
+        rows = []
+    elif fetch_all and not search_term:
+        # The whole officer roster for the weekly report form.
+        scope = RosterSnapshot.ALL if is_admin else department
+        rows = [personnel_dict(entry) for entry in roster_snapshot(cursor).in_category('officer', scope)]
+        total_items = len(rows)
+    elif fetch_all:
+        where_clause_str = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        cursor.execute("SELECT * FROM personnel" + where_clause_str, params)
+        rows = cursor.fetchall()
+        total_items = len(rows)
+    else:
+        try:
+            rows, next_cursor = keyset_page(cursor, "personnel", where_clauses, params, payload.get("cursor"))
+        except InvalidPageCursor:
+            return {"status": "error", "message": "ตำแหน่งหน้าข้อมูลไม่ถูกต้อง กรุณาโหลดรายการใหม่"}
+        if payload.get("includeTotal"):
+            total_items = cached_listing_total(cursor, "personnel", where_clauses, params, session)
+    personnel = [{k: escape(str(v)) if v is not None else '' for k, v in dict(row).items()} for row in rows]
     
     submission_status = None
     if not is_admin:
@@ -407,38 +1628,95 @@ def handle_list_personnel(payload, conn, cursor, session):
 
     persistent_statuses = []
     all_departments = []
+    end_of_current_week_str = None
     if fetch_all:
         today = date.today()
         end_of_current_week = today + timedelta(days=6 - today.weekday())
         end_of_current_week_str = end_of_current_week.isoformat()
         
         if is_admin:
-            cursor.execute("SELECT DISTINCT department FROM personnel WHERE department IS NOT NULL AND department != '' ORDER BY department")
-            all_departments = [row['department'] for row in cursor.fetchall()]
-
-        query = "SELECT personnel_id, department, status, details, start_date, end_date FROM persistent_statuses WHERE end_date > ?"
-        params_status = [end_of_current_week_str]
-        if not is_admin:
-            query += " AND department = ?"
-            params_status.append(department)
-        
-        cursor.execute(query, params_status)
-        persistent_statuses = [dict(row) for row in cursor.fetchall()]
+            all_departments = list_departments(cursor)
+
+        if not roster_cached:
+            query = "SELECT personnel_id, department, status, details, start_date, end_date FROM persistent_statuses WHERE end_date > ?"
+            params_status = [end_of_current_week_str]
+            if not is_admin:
+                query += " AND department = ?"
+                params_status.append(department)
+
+            cursor.execute(query, params_status)
+            persistent_statuses = [dict(row) for row in cursor.fetchall()]
 
     response_data = {
         "status": "success",
         "personnel": personnel,
         "total": total_items,
+        "next_cursor": next_cursor,
         "page": page,
         "submission_status": submission_status,
         "weekly_date_range": get_current_week_range_str(cursor),
-        "persistent_statuses": persistent_statuses
+        "persistent_statuses": persistent_statuses,
+        "persistent_statuses_after": end_of_current_week_str
     }
     if is_admin and fetch_all:
         response_data["all_departments"] = all_departments
         
     return response_data
 
+def handle_sync_roster(payload, conn, cursor, session):
+    """
+    Personnel and persistent status rows changed since payload.since (a
+    version from an earlier call). since=0, or a version older than the
+    retained change log, returns everything with "reset": true.
+    """
+    is_admin = session.get("role") == "admin"
+    department = None if is_admin else session.get("department")
+    try:
+        since = int(payload.get("since") or 0)
+    except (TypeError, ValueError):
+        since = 0
+
+    version = current_roster_version(cursor)
+    cursor.execute("SELECT MIN(version) FROM roster_changes")
+    oldest = cursor.fetchone()[0]
+    retained_from = (oldest - 1) if oldest is not None else version
+    reset = since <= 0 or since < retained_from or since > version
+
+    scope_sql, scope_params = ("", []) if is_admin else (" AND department = ?", [department])
+    changed_sql = ""
+    changed_params = []
+    if not reset:
+        changed_sql = (" AND id IN (SELECT entity_id FROM roster_changes WHERE entity = ? AND version > ?"
+                       + ("" if is_admin else " AND (department = ? OR old_department = ?)") + ")")
+
+    def fetch(table, entity, columns):
+        params = list(scope_params)
+        if not reset:
+            params += [entity, since] + ([] if is_admin else [department, department])
+        cursor.execute(f"SELECT {columns} FROM {table} WHERE 1 = 1{scope_sql}{changed_sql}", params)
+        rows = [dict(row) for row in cursor.fetchall()]
+        deleted = []
+        if not reset:
+            cursor.execute("SELECT DISTINCT entity_id FROM roster_changes WHERE entity = ? AND version > ?"
+                           + ("" if is_admin else " AND (department = ? OR old_department = ?)"),
+                           [entity, since] + ([] if is_admin else [department, department]))
+            present = {row['id'] for row in rows}
+            deleted = [row['entity_id'] for row in cursor.fetchall() if row['entity_id'] not in present]
+        return rows, deleted
+
+    personnel, personnel_deleted = fetch("personnel", "personnel", "*")
+    statuses, statuses_deleted = fetch("persistent_statuses", "status",
+                                       "id, personnel_id, department, status, details, start_date, end_date")
+    return {
+        "status": "success",
+        "version": version,
+        "reset": reset,
+        "personnel": [{k: escape(str(v)) if v is not None else '' for k, v in p.items()} for p in personnel],
+        "personnel_deleted": personnel_deleted,
+        "statuses": statuses,
+        "statuses_deleted": statuses_deleted,
+    }
+
 def handle_get_personnel_details(payload, conn, cursor):
     person_id = payload.get("id")
     if not person_id: return {"status": "error", "message": "ไม่พบ ID ของกำลังพล"}
@@ -471,13 +1749,79 @@ def handle_delete_personnel(payload, conn, cursor):
     return {"status": "success", "message": "ลบข้อมูลสำเร็จ"}
 
 def handle_import_personnel(payload, conn, cursor):
-    new_data = payload.get("personnel", [])
+    """
+    Replaces the whole roster. payload.personnel is a list, or an iterator
+    parsing items off the request body (see REQUEST BODY LIMITS); rows are
+    staged in a TEMP table as they arrive, so the database write lock is only
+    held for the final swap.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS personnel_import (id TEXT, rank TEXT, first_name TEXT, last_name TEXT, position TEXT, specialty TEXT, department TEXT)")
+    cursor.execute("DELETE FROM personnel_import")
+    rows = ((str(uuid.uuid4()), p['rank'], p['first_name'], p['last_name'], p['position'], p['specialty'], p['department'])
+            for p in payload.get("personnel", []))
+    try:
+        cursor.executemany("INSERT INTO personnel_import VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    except (ValueError, KeyError, TypeError) as e:
+        conn.rollback()
+        print(f"Import personnel rejected: {e!r}")
+        return {"status": "error", "message": "รูปแบบข้อมูลนำเข้าไม่ถูกต้อง กรุณาตรวจสอบไฟล์"}
+    imported = cursor.execute("SELECT COUNT(*) FROM personnel_import").fetchone()[0]
     cursor.execute("DELETE FROM personnel")
-    for p in new_data:
-        cursor.execute("INSERT INTO personnel (id, rank, first_name, last_name, position, specialty, department) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                       (str(uuid.uuid4()), p['rank'], p['first_name'], p['last_name'], p['position'], p['specialty'], p['department']))
+    cursor.execute("INSERT INTO personnel (id, rank, first_name, last_name, position, specialty, department) "
+                   "SELECT id, rank, first_name, last_name, position, specialty, department FROM personnel_import ORDER BY rowid")
+    cursor.execute("DELETE FROM personnel_import")
     conn.commit()
-    return {"status": "success", "message": f"นำเข้าข้อมูลกำลังพลจำนวน {len(new_data)} รายการสำเร็จ"}
+    return {"status": "success", "message": f"นำเข้าข้อมูลกำลังพลจำนวน {imported} รายการสำเร็จ"}
+
+PERSISTENT_STATUS_FIELDS = ("status", "details", "start_date", "end_date")
+
+def _sync_persistent_statuses(cursor, department, current_rows, wanted_items):
+    """
+    Brings the department's persistent_statuses from current_rows to wanted_items,
+    writing only rows that changed. Returns the number of rows inserted, updated or deleted.
+    """
+    current_by_person = defaultdict(list)
+    for row in current_rows:
+        current_by_person[row['personnel_id']].append(row)
+    wanted_by_person = defaultdict(list)
+    for item in wanted_items:
+        wanted_by_person[item['personnel_id']].append(tuple(item.get(f) for f in PERSISTENT_STATUS_FIELDS))
+
+    inserts, updates, deletes = [], [], []
+    for personnel_id in set(current_by_person) | set(wanted_by_person):
+        stale = []
+        wanted = wanted_by_person.get(personnel_id, [])
+        for row in current_by_person.get(personnel_id, []):
+            values = tuple(row[f] for f in PERSISTENT_STATUS_FIELDS)
+            if values in wanted:
+                wanted.remove(values)
+            else:
+                stale.append(row['id'])
+        # Reuse stale rows for changed statuses before inserting or deleting any.
+        for row_id, values in zip(stale, wanted):
+            updates.append(values + (row_id,))
+        deletes.extend((row_id,) for row_id in stale[len(wanted):])
+        inserts.extend((str(uuid.uuid4()), personnel_id, department) + values for values in wanted[len(stale):])
+
+    if deletes:
+        cursor.executemany("DELETE FROM persistent_statuses WHERE id = ?", deletes)
+    if updates:
+        cursor.executemany("UPDATE persistent_statuses SET status = ?, details = ?, start_date = ?, end_date = ? WHERE id = ?", updates)
+    if inserts:
+        cursor.executemany(
+            "INSERT INTO persistent_statuses (id, personnel_id, department, status, details, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            inserts
+        )
+    return len(inserts) + len(updates) + len(deletes)
+
+def _write_status_report(cursor, user_department, submitted_by, items, date_str, timestamp_str, today_str):
+    cursor.execute("DELETE FROM status_reports WHERE department = ?", (user_department,))
+    cursor.execute("INSERT INTO status_reports (id, date, submitted_by, department, report_data, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                   (str(uuid.uuid4()), date_str, submitted_by, user_department, json.dumps(items), timestamp_str))
+
+    cursor.execute("SELECT id, personnel_id, status, details, start_date, end_date FROM persistent_statuses WHERE department = ?", (user_department,))
+    wanted = [item for item in items if item.get("status") != "ไม่มี" and item.get("end_date", "") >= today_str]
+    return _sync_persistent_statuses(cursor, user_department, cursor.fetchall(), wanted)
 
 def handle_submit_status_report(payload, conn, cursor, session):
     report_data = payload.get("report", {})
@@ -486,33 +1830,14 @@ def handle_submit_status_report(payload, conn, cursor, session):
     server_now = datetime.utcnow() + timedelta(hours=7)
     date_str = server_now.strftime('%Y-%m-%d')
     timestamp_str = server_now.strftime('%Y-%m-%d %H:%M:%S')
-    
-    cursor.execute("DELETE FROM status_reports WHERE department = ?", (user_department,))
-    cursor.execute("INSERT INTO status_reports (id, date, submitted_by, department, report_data, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
-                   (str(uuid.uuid4()), date_str, submitted_by, user_department, json.dumps(report_data["items"]), timestamp_str))
-    
     today_str = date.today().isoformat()
-    cursor.execute("DELETE FROM persistent_statuses WHERE department = ?", (user_department,))
-    
-    for item in report_data.get("items", []):
-        if item.get("status") != "ไม่มี" and item.get("end_date", "") >= today_str:
-            cursor.execute(
-                """INSERT INTO persistent_statuses
-                   (id, personnel_id, department, status, details, start_date, end_date)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    str(uuid.uuid4()),
-                    item["personnel_id"],
-                    user_department,
-                    item["status"],
-                    item["details"],
-                    item["start_date"],
-                    item["end_date"],
-                )
-            )
-    
-    conn.commit()
-    return {"status": "success", "message": "ส่งยอดกำลังพลสำเร็จ"}
+
+    try:
+        rows_touched = get_submission_writer().submit(_write_status_report, user_department, submitted_by, report_data["items"],
+                                                      date_str, timestamp_str, today_str)
+    except (WriterQueueFull, WriterTimeout):
+        return {"status": "error", "message": WRITER_BUSY_MESSAGE}
+    return {"status": "success", "message": "ส่งยอดกำลังพลสำเร็จ", "status_rows_touched": rows_touched}
 
 def handle_get_status_reports(payload, conn, cursor):
     cursor.execute("SELECT sr.id, sr.date, sr.department, sr.timestamp, sr.report_data, u.rank, u.first_name, u.last_name FROM status_reports sr JOIN users u ON sr.submitted_by = u.username ORDER BY sr.timestamp DESC")
@@ -525,64 +1850,94 @@ def handle_get_status_reports(payload, conn, cursor):
         reports.append(report)
         submitted_departments.add(report['department'])
 
-    cursor.execute("SELECT DISTINCT department FROM personnel WHERE department IS NOT NULL AND department != ''")
-    all_departments = [row['department'] for row in cursor.fetchall()]
+    all_departments = list_departments(cursor)
 
     return {
         "status": "success",
         "reports": reports,
         "weekly_date_range": get_current_week_range_str(cursor),
+        "week_start_date": get_current_week_start_date(cursor).isoformat(),
         "all_departments": all_departments,
-        "submitted_departments": list(submitted_departments)
+        "submitted_departments": list(submitted_departments),
+        "pending_departments": pending_departments(cursor, "status_reports")
     }
 
 def handle_archive_reports(payload, conn, cursor, session):
-    reports_to_archive = payload.get("reports", [])
-    week_range = payload.get("week_range", "")
+    """
+    Moves the current week's status_reports into archived_reports and starts
+    the next week, in one transaction. payload.week_start_date (optional)
+    must match the current week so a stale page cannot archive the next one.
+    """
     archived_by_user = session.get("username")
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        week_start = get_current_week_start_date(cursor)
+        if payload.get("week_start_date") and payload["week_start_date"] != week_start.isoformat():
+            conn.rollback()
+            return {"status": "error", "message": "รอบสัปดาห์นี้ถูกเก็บไปแล้ว กรุณาโหลดหน้าใหม่"}
 
-    if not reports_to_archive:
-        return {"status": "error", "message": "ไม่พบข้อมูลรายงานที่จะเก็บ"}
-
-    full_report_data = json.dumps(reports_to_archive)
-
-    cursor.execute(
-        "INSERT INTO archived_reports (id, week_range, report_data, archived_by, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (str(uuid.uuid4()), week_range, full_report_data, archived_by_user, datetime.utcnow() + timedelta(hours=7))
-    )
-
-    cursor.execute("DELETE FROM status_reports")
-    conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM status_reports")
+        if cursor.fetchone()[0] == 0:
+            conn.rollback()
+            return {"status": "error", "message": "ไม่พบข้อมูลรายงานที่จะเก็บ"}
 
-    print("กำลังอัปเดตรอบสัปดาห์ถัดไป...")
-    cursor.execute("SELECT value FROM system_settings WHERE key = 'current_week_start_date'")
-    start_date_row = cursor.fetchone()
-    
-    if start_date_row:
-        current_start_date_str = start_date_row['value']
-        current_start_date = date.fromisoformat(current_start_date_str)
-        
-        next_week_start_date = current_start_date + timedelta(days=7)
-        
-        cursor.execute("UPDATE system_settings SET value = ? WHERE key = ?", 
-                       (next_week_start_date.isoformat(), 'current_week_start_date'))
+        # Same shape as the reports returned by get_status_reports. LEFT JOIN keeps reports
+        # whose submitter was deleted since, as every status_reports row is deleted below.
+        archive_id = str(uuid.uuid4())
+        archived_at = (datetime.utcnow() + timedelta(hours=7)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute("""
+            INSERT INTO archived_reports (id, week_range, report_data, archived_by, timestamp)
+            SELECT :archive_id, :week_range, archive_encode(json_group_array(json_object(
+                       'id', id, 'date', date, 'department', department, 'timestamp', timestamp,
+                       'rank', rank, 'first_name', first_name, 'last_name', last_name, 'items', json(report_data)))),
+                   :archived_by, :archived_at
+            FROM (
+                SELECT sr.id, sr.date, sr.department, sr.timestamp, sr.report_data, u.rank, u.first_name, u.last_name
+                FROM status_reports sr LEFT JOIN users u ON sr.submitted_by = u.username
+                ORDER BY sr.timestamp DESC
+            )
+        """, {"archive_id": archive_id, "week_range": get_current_week_range_str(cursor), "archived_by": archived_by_user,
+              "archived_at": archived_at})
+        cursor.execute("""
+            UPDATE submission_history SET source = 'archived', archive_id = ?, archived_at = ?
+            WHERE source = 'active' AND report_id IN (SELECT id FROM status_reports)
+        """, (archive_id, archived_at))
+        cursor.execute("DELETE FROM status_reports")
+        next_week_start_date = week_start + timedelta(days=7)
+        cursor.execute("INSERT OR REPLACE INTO system_settings (key, value) VALUES ('current_week_start_date', ?)",
+                       (next_week_start_date.isoformat(),))
         conn.commit()
-        print(f" -> อัปเดตรอบสัปดาห์ใหม่เป็น: {next_week_start_date.isoformat()}")
-    else:
-        print(" -> ไม่พบ 'current_week_start_date' ใน system_settings ไม่สามารถเลื่อนสัปดาห์ได้")
-
-
-    return {"status": "success", "message": "เก็บรายงานและรีเซ็ตแดชบอร์ดสำเร็จ"}
+    except Exception:
+        conn.rollback()
+        raise
+    print(f" -> อัปเดตรอบสัปดาห์ใหม่เป็น: {next_week_start_date.isoformat()}")
+    return {"status": "success", "message": "เก็บรายงานและรีเซ็ตแดชบอร์ดสำเร็จ", "week_start_date": next_week_start_date.isoformat()}
 
 def handle_get_archived_reports(payload, conn, cursor):
-    cursor.execute("SELECT id, week_range, report_data, archived_by, timestamp FROM archived_reports ORDER BY timestamp DESC")
+    """
+    Without year/month, lists archive batches (metadata only) grouped by
+    Buddhist-era year and month. With {"year", "month"}, returns that month's
+    batches with their reports decompressed.
+    """
+    year_be, month = payload.get("year"), payload.get("month")
+    include_reports = bool(year_be and month)
+    columns = "id, week_range, archived_by, timestamp" + (", report_data" if include_reports else "")
+    where, params, years = "", [], None
+    if include_reports:
+        start, end = month_bounds(int(year_be) - 543, int(month))
+        where, params, years = " WHERE timestamp >= ? AND timestamp < ?", [start, end], [int(year_be) - 543]
+
+    rows = []
+    for schema in iter_archive_sources(conn, years):
+        cursor.execute(f"SELECT {columns} FROM {schema}.archived_reports{where} ORDER BY timestamp DESC", params)
+        rows.extend(cursor.fetchall())
     
     archives_by_month = defaultdict(lambda: defaultdict(list))
     
-    for row in cursor.fetchall():
+    for row in rows:
         archive_batch = dict(row)
-        archive_batch["reports"] = json.loads(archive_batch["report_data"])
-        del archive_batch["report_data"]
+        if include_reports:
+            archive_batch["reports"] = decode_archive_payload(archive_batch.pop("report_data"))
         
         timestamp_dt = datetime.strptime(archive_batch["timestamp"].split('.')[0], '%Y-%m-%d %H:%M:%S')
         year_be = str(timestamp_dt.year + 543)
@@ -593,57 +1948,75 @@ def handle_get_archived_reports(payload, conn, cursor):
     return {"status": "success", "archives": dict(archives_by_month)}
 
 def handle_get_submission_history(payload, conn, cursor, session):
+    """
+    Without year/month, returns how many reports the department submitted in
+    each Buddhist-era year and month. With {"year", "month"}, returns one page
+    of that month's report metadata, newest first; contents come from
+    get_submission_reports.
+    """
     user_dept = session.get("department")
     if not user_dept: return {"status": "error", "message": "ไม่พบข้อมูลแผนกของผู้ใช้"}
-    
+
+    year_be, month = payload.get("year"), payload.get("month")
+    if not (year_be and month):
+        cursor.execute("""
+            SELECT substr(timestamp, 1, 4) AS year, CAST(substr(timestamp, 6, 2) AS INTEGER) AS month, COUNT(*) AS reports
+            FROM submission_history WHERE department = ? AND timestamp IS NOT NULL
+            GROUP BY 1, 2
+        """, (user_dept,))
+        months = defaultdict(dict)
+        for row in cursor.fetchall():
+            months[str(int(row['year']) + 543)][str(row['month'])] = row['reports']
+        return {"status": "success", "months": dict(months)}
+
+    start, end = month_bounds(int(year_be) - 543, int(month))
     query = """
-    SELECT id, date, submitted_by, department, timestamp, report_data, 'active' as source
-    FROM status_reports WHERE department = :dept
+        SELECT report_id AS id, source, department, date, submitted_by, timestamp, item_count
+        FROM submission_history WHERE department = ? AND timestamp >= ? AND timestamp < ?
     """
-    
-    # Check if the old archive table exists before adding it to the query
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='archived_reports_old';")
-    if cursor.fetchone():
-        query += """
-        UNION ALL
-        SELECT id, date, submitted_by, department, timestamp, report_data, 'archived' as source
-        FROM archived_reports_old WHERE department = :dept
-        """
-
-    query += " ORDER BY timestamp DESC"
-    
-    cursor.execute(query, {"dept": user_dept})
-    
-    history_by_month = defaultdict(lambda: defaultdict(list))
-    
-    for row in cursor.fetchall():
-        report = dict(row)
-        report["items"] = json.loads(report["report_data"])
-        del report["report_data"]
-        
-        timestamp_dt = datetime.strptime(report["timestamp"].split('.')[0], '%Y-%m-%d %H:%M:%S')
-        year_be = str(timestamp_dt.year + 543)
-        month = str(timestamp_dt.month)
-        
-        history_by_month[year_be][month].append(report)
-        
-    return {"status": "success", "history": dict(history_by_month)}
+    params = [user_dept, start, end]
+    if payload.get("cursor"):
+        try:
+            after_timestamp, after_id = decode_page_cursor(payload["cursor"], 2)
+        except InvalidPageCursor:
+            return {"status": "error", "message": "ตำแหน่งหน้าข้อมูลไม่ถูกต้อง กรุณาโหลดรายการใหม่"}
+        query += " AND (timestamp, report_id) < (?, ?)"
+        params.extend([after_timestamp, after_id])
+    query += " ORDER BY timestamp DESC, report_id DESC LIMIT ?"
+    cursor.execute(query, params + [HISTORY_PAGE_SIZE + 1])
+    reports = [dict(row) for row in cursor.fetchall()]
+    next_cursor = None
+    if len(reports) > HISTORY_PAGE_SIZE:
+        reports.pop()
+        next_cursor = encode_page_cursor([reports[-1]['timestamp'], reports[-1]['id']])
+    return {"status": "success", "reports": reports, "next_cursor": next_cursor}
 
+def handle_get_submission_reports(payload, conn, cursor, session):
+    """Returns the items of the history reports in payload.ids (one history page at most)."""
+    ids = payload.get("ids")
+    if not isinstance(ids, list) or not ids or len(ids) > HISTORY_PAGE_SIZE:
+        return {"status": "error", "message": "รายการรายงานที่ขอไม่ถูกต้อง"}
+    query = f"SELECT report_id, source, archive_id, archived_at FROM submission_history WHERE report_id IN ({', '.join('?' for _ in ids)})"
+    params = [str(report_id) for report_id in ids]
+    if session.get("role") != "admin":
+        query += " AND department = ?"
+        params.append(session.get("department"))
+    cursor.execute(query, params)
+    contents = load_history_contents(conn, cursor, cursor.fetchall())
+    return {"status": "success", "reports": [{"id": report_id, "items": items} for report_id, items in contents.items()]}
 
 def handle_get_report_for_editing(payload, conn, cursor):
     report_id = payload.get("id")
     if not report_id: return {"status": "error", "message": "ไม่พบ ID ของรายงาน"}
-    
-    # 1. Check active reports
-    cursor.execute("SELECT report_data, department FROM status_reports WHERE id = ?", (report_id,))
-    report = cursor.fetchone()
-    
-    # 2. If not found, check the old archive table (if it exists)
-    if not report:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='archived_reports_old';")
-        if cursor.fetchone():
-            cursor.execute("SELECT report_data, department FROM archived_reports_old WHERE id = ?", (report_id,))
-            report = cursor.fetchone()
+
+    # Active and legacy reports can be reopened for editing; archived batches cannot.
+    cursor.execute("SELECT source FROM submission_history WHERE report_id = ?", (report_id,))
+    row = cursor.fetchone()
+    table = HISTORY_SOURCE_TABLES.get(row['source']) if row else None
+    report = None
+    if table:
+        cursor.execute(f"SELECT report_data, department FROM {table} WHERE id = ?", (report_id,))
+        report = cursor.fetchone()
 
     if report:
         return {"status": "success", "report": {"items": json.loads(report['report_data']), "department": report['department']}}
@@ -655,42 +2028,30 @@ def handle_get_active_statuses(payload, conn, cursor, session):
     is_admin = session.get("role") == "admin"
     department = session.get("department")
 
-    query_unavailable = """
-        SELECT
-            ps.status, ps.details, ps.start_date, ps.end_date, ps.personnel_id,
-            p.rank, p.first_name, p.last_name, p.department
-        FROM persistent_statuses ps
-        JOIN personnel p ON ps.personnel_id = p.id
-        WHERE ps.end_date >= ?
-    """
+    roster = roster_snapshot(cursor)
+    query_unavailable = "SELECT status, details, start_date, end_date, personnel_id FROM persistent_statuses WHERE end_date >= ?"
     params_unavailable = [today_str]
     if not is_admin:
-        query_unavailable += " AND ps.department = ?"
+        query_unavailable += " AND department = ?"
         params_unavailable.append(department)
     
     cursor.execute(query_unavailable, params_unavailable)
-    unavailable_personnel = [dict(row) for row in cursor.fetchall()]
+    unavailable = []
+    for row in cursor.fetchall():
+        person = roster.by_id.get(row['personnel_id'])
+        if person is None:
+            continue
+        item = dict(row)
+        item.update(rank=person.rank, first_name=person.first_name, last_name=person.last_name, department=person.department)
+        unavailable.append((person.rank_order, item))
+    unavailable.sort(key=lambda pair: pair[0])
+    unavailable_personnel = [item for _, item in unavailable]
     unavailable_ids = {p['personnel_id'] for p in unavailable_personnel}
 
-    query_all = "SELECT id, rank, first_name, last_name, department FROM personnel"
-    params_all = []
-    if not is_admin:
-        query_all += " WHERE department = ?"
-        params_all.append(department)
-
-    cursor.execute(query_all, params_all)
-    all_personnel = [dict(row) for row in cursor.fetchall()]
-
-    available_personnel = [p for p in all_personnel if p['id'] not in unavailable_ids]
-
-    def get_rank_index(item):
-        try:
-            return RANK_ORDER.index(item['rank'])
-        except ValueError:
-            return len(RANK_ORDER)
-
-    unavailable_personnel.sort(key=get_rank_index)
-    available_personnel.sort(key=get_rank_index)
+    # Snapshot entries are already in rank order.
+    all_personnel = roster.members(RosterSnapshot.ALL if is_admin else department)
+    available_personnel = [{"id": p.id, "rank": p.rank, "first_name": p.first_name, "last_name": p.last_name, "department": p.department}
+                           for p in all_personnel if p.id not in unavailable_ids]
     
     total_personnel_in_scope = len(all_personnel)
 
@@ -706,8 +2067,8 @@ def handle_get_daily_dashboard_summary(payload, conn, cursor, session):
     target_date = get_daily_target_date(cursor)
     target_date_str = target_date.strftime('%Y-%m-%d')
     
-    cursor.execute("SELECT DISTINCT department FROM personnel WHERE department IS NOT NULL AND department != ''")
-    all_departments = [row['department'] for row in cursor.fetchall()]
+    headcounts = department_headcounts(cursor)
+    all_departments = list(headcounts)
 
     query = """
         SELECT
@@ -733,7 +2094,8 @@ def handle_get_daily_dashboard_summary(payload, conn, cursor, session):
             }
         }
 
-    return {"status": "success", "summary": {"all_departments": all_departments, "submitted_info": submitted_info, "report_date": target_date_str}}
+    return {"status": "success", "summary": {"all_departments": all_departments, "submitted_info": submitted_info, "report_date": target_date_str,
+                                             "headcounts": headcounts}}
 
 def handle_get_daily_personnel_for_submission(payload, conn, cursor, session):
     is_admin = session.get("role") == "admin"
@@ -741,8 +2103,7 @@ def handle_get_daily_personnel_for_submission(payload, conn, cursor, session):
     all_departments = []
 
     if is_admin:
-        cursor.execute("SELECT DISTINCT department FROM personnel WHERE department IS NOT NULL AND department != '' ORDER BY department")
-        all_departments = [row['department'] for row in cursor.fetchall()]
+        all_departments = list_departments(cursor)
 
     department_to_view = (payload.get("department") or (all_departments[0] if all_departments else None)) if is_admin else user_department
 
@@ -761,9 +2122,9 @@ def handle_get_daily_personnel_for_submission(payload, conn, cursor, session):
         if last_submission:
             submission_status = {"timestamp": last_submission['timestamp']}
 
-    cursor.execute("SELECT * FROM personnel WHERE department = ?", (department_to_view,))
-    personnel_in_dept = [dict(row) for row in cursor.fetchall()]
-    classified_personnel = classify_personnel(personnel_in_dept)
+    roster = roster_snapshot(cursor)
+    classified_personnel = {category: [personnel_dict(entry) for entry in roster.in_category(category, department_to_view)]
+                            for category in RANK_CLASSIFICATION}
     
     cursor.execute("SELECT * FROM persistent_statuses WHERE end_date >= ? AND start_date <= ? AND department = ?",
                    (target_date_str, target_date_str, department_to_view))
@@ -795,6 +2156,28 @@ def handle_get_daily_personnel_for_submission(payload, conn, cursor, session):
         
     return response_data
 
+def _write_daily_report(cursor, department, report_date_str, submitted_by, timestamp_str, summary_data, report_data):
+    cursor.execute("DELETE FROM daily_reports WHERE department = ? AND report_date = ?", (department, report_date_str))
+    cursor.execute(
+        "INSERT INTO daily_reports (id, report_date, department, submitted_by, timestamp, summary_data, report_data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), report_date_str, department, submitted_by, timestamp_str, json.dumps(summary_data), json.dumps(report_data))
+    )
+
+    # --- START: Update persistent_statuses for NCOs and Civilians ---
+    # Officers' statuses come from the weekly report, so only NCO/civilian rows are synced here.
+    roster = roster_snapshot(cursor)
+    nco_civ_ids = {entry.id for category in ('nco', 'civilian') for entry in roster.in_category(category, department)}
+    cursor.execute("SELECT id, personnel_id, status, details, start_date, end_date FROM persistent_statuses WHERE department = ?", (department,))
+    current = [row for row in cursor.fetchall() if row['personnel_id'] in nco_civ_ids]
+
+    wanted = [
+        item for category_key in ['nco', 'civilian'] for item in report_data.get(category_key, [])
+        if item.get("status") != 'ไม่มี' and item.get("end_date", "") >= report_date_str
+    ]
+    rows_touched = _sync_persistent_statuses(cursor, department, current, wanted)
+    # --- END: Update persistent_statuses ---
+    return rows_touched
+
 def handle_submit_daily_report(payload, conn, cursor, session):
     data = payload.get("data", {})
     submitted_by = session.get("username")
@@ -807,37 +2190,12 @@ def handle_submit_daily_report(payload, conn, cursor, session):
     server_now = datetime.utcnow() + timedelta(hours=7)
     timestamp_str = server_now.strftime('%Y-%m-%d %H:%M:%S')
 
-    cursor.execute("DELETE FROM daily_reports WHERE department = ? AND report_date = ?", (department, report_date_str))
-    cursor.execute(
-        "INSERT INTO daily_reports (id, report_date, department, submitted_by, timestamp, summary_data, report_data) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (str(uuid.uuid4()), report_date_str, department, submitted_by, timestamp_str, json.dumps(data.get("summary_data", {})), json.dumps(data.get("report_data", {})))
-    )
-
-    # --- START: Update persistent_statuses for NCOs and Civilians ---
-    cursor.execute("SELECT id, rank FROM personnel WHERE department = ?", (department,))
-    personnel_in_dept = cursor.fetchall()
-    
-    nco_civ_ids = [
-        p['id'] for p in personnel_in_dept
-        if p['rank'] in RANK_CLASSIFICATION['nco'] or p['rank'] in RANK_CLASSIFICATION['civilian']
-    ]
-
-    if nco_civ_ids:
-        placeholders = ', '.join('?' for _ in nco_civ_ids)
-        cursor.execute(f"DELETE FROM persistent_statuses WHERE department = ? AND personnel_id IN ({placeholders})", [department] + nco_civ_ids)
-
-    report_data = data.get("report_data", {})
-    for category_key in ['nco', 'civilian']:
-        for item in report_data.get(category_key, []):
-            if item.get("status") != 'ไม่มี' and item.get("end_date", "") >= report_date_str:
-                cursor.execute(
-                    "INSERT INTO persistent_statuses (id, personnel_id, department, status, details, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (str(uuid.uuid4()), item["personnel_id"], department, item["status"], item["details"], item["start_date"], item["end_date"])
-                )
-    # --- END: Update persistent_statuses ---
-
-    conn.commit()
-    return {"status": "success", "message": f"ส่งยอดกำลังพลสำหรับวันที่ {report_date_str} สำเร็จ"}
+    try:
+        rows_touched = get_submission_writer().submit(_write_daily_report, department, report_date_str, submitted_by, timestamp_str,
+                                                      data.get("summary_data", {}), data.get("report_data", {}))
+    except (WriterQueueFull, WriterTimeout):
+        return {"status": "error", "message": WRITER_BUSY_MESSAGE}
+    return {"status": "success", "message": f"ส่งยอดกำลังพลสำหรับวันที่ {report_date_str} สำเร็จ", "status_rows_touched": rows_touched}
 
 
 def handle_get_daily_submission_history(payload, conn, cursor, session):
@@ -873,8 +2231,7 @@ def handle_get_daily_final_report(payload, conn, cursor, session):
     target_date = get_daily_target_date(cursor)
     target_date_str = target_date.strftime('%Y-%m-%d')
 
-    cursor.execute("SELECT DISTINCT department FROM personnel WHERE department IS NOT NULL AND department != '' ORDER BY department")
-    all_departments = [row['department'] for row in cursor.fetchall()]
+    all_departments = list_departments(cursor)
     
     query = """
         SELECT dr.*, u.rank, u.first_name, u.last_name
@@ -895,48 +2252,150 @@ def handle_get_daily_final_report(payload, conn, cursor, session):
         "reports": reports,
         "report_date": target_date_str,
         "all_departments": all_departments,
-        "submitted_departments": submitted_departments
+        "submitted_departments": submitted_departments,
+        "pending_departments": pending_departments(cursor, "daily_reports", " AND r.report_date = ?", (target_date_str,))
     }
     
 def handle_archive_daily_reports(payload, conn, cursor, session):
-    reports_to_archive = payload.get("reports", [])
-    if not reports_to_archive:
-        return {"status": "error", "message": "ไม่พบรายงานที่จะเก็บ"}
-
-    for report in reports_to_archive:
-        report_date = report["report_date"]
-        department = report["department"]
-        cursor.execute("DELETE FROM archived_daily_reports WHERE report_date = ? AND department = ?", (report_date, department))
-        year, month, _ = map(int, report_date.split('-'))
-        
-        submitted_by = f"{report['rank']} {report['first_name']} {report['last_name']}"
-        
-        cursor.execute(
-            """INSERT INTO archived_daily_reports
-               (id, year, month, report_date, department, submitted_by, timestamp, summary_data, report_data)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                str(uuid.uuid4()), year, month, report_date, department,
-                submitted_by, report["timestamp"],
-                json.dumps(report["summary_data"]), json.dumps(report["report_data"])
-            )
-        )
-    
-    report_date_to_clear = reports_to_archive[0]["report_date"]
-    cursor.execute("DELETE FROM daily_reports WHERE report_date = ?", (report_date_to_clear,))
-    conn.commit()
-    return {"status": "success", "message": f"เก็บรายงานวันที่ {report_date_to_clear} และรีเซ็ตแดชบอร์ดสำเร็จ"}
+    """
+    Moves one day's daily_reports into archived_daily_reports (replacing any
+    earlier archive of the same department-day) and updates the rollups, in
+    one transaction. payload: {"report_date": "YYYY-MM-DD"}.
+    """
+    report_date = payload.get("report_date") or payload.get("date")
+    try:
+        date.fromisoformat(report_date or "")
+    except ValueError:
+        return {"status": "error", "message": "กรุณาระบุวันที่ของรายงานที่จะเก็บ"}
+
+    replaced = "a.report_date = :report_date AND a.department IN (SELECT department FROM daily_reports WHERE report_date = :report_date)"
+    params = {"report_date": report_date}
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        rollup_archived_days(cursor, replaced, params, sign=-1)
+        cursor.execute(f"DELETE FROM archived_daily_reports AS a WHERE {replaced}", params)
+        cursor.execute("""
+            INSERT INTO archived_daily_reports
+                (id, year, month, report_date, department, submitted_by, timestamp, summary_data, report_data)
+            SELECT new_uuid(), CAST(substr(dr.report_date, 1, 4) AS INTEGER), CAST(substr(dr.report_date, 6, 2) AS INTEGER),
+                   dr.report_date, dr.department, u.rank || ' ' || u.first_name || ' ' || u.last_name,
+                   dr.timestamp, dr.summary_data, archive_encode(dr.report_data)
+            FROM daily_reports dr JOIN users u ON dr.submitted_by = u.username
+            WHERE dr.report_date = :report_date
+        """, params)
+        archived = cursor.rowcount
+        if archived == 0:
+            conn.rollback()
+            return {"status": "error", "message": "ไม่พบรายงานที่จะเก็บ"}
+        rollup_archived_days(cursor, replaced, params)
+        cursor.execute("DELETE FROM daily_reports WHERE report_date = ?", (report_date,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"status": "success", "message": f"เก็บรายงานวันที่ {report_date} และรีเซ็ตแดชบอร์ดสำเร็จ", "archived": archived}
 
 def handle_get_archived_daily_reports(payload, conn, cursor, session):
-    cursor.execute("SELECT * FROM archived_daily_reports ORDER BY year DESC, month DESC, report_date DESC")
+    """
+    Lists archived daily reports with their summaries. report_data is only
+    decompressed when a single month is requested with {"year", "month"}.
+    """
+    year, month = payload.get("year"), payload.get("month")
+    include_report_data = bool(year and month)
+    columns = "id, year, month, report_date, department, submitted_by, timestamp, summary_data" + (", report_data" if include_report_data else "")
+    where, params, years = "", [], None
+    if include_report_data:
+        where, params, years = " WHERE year = ? AND month = ?", [int(year), int(month)], [int(year)]
+
+    rows = []
+    for schema in iter_archive_sources(conn, years):
+        cursor.execute(f"SELECT {columns} FROM {schema}.archived_daily_reports{where} ORDER BY year DESC, month DESC, report_date DESC", params)
+        rows.extend(cursor.fetchall())
     archives = defaultdict(lambda: defaultdict(list))
-    for row in cursor.fetchall():
+    for row in rows:
         report = dict(row)
         report["summary_data"] = json.loads(report["summary_data"])
-        report["report_data"] = json.loads(report["report_data"])
+        if include_report_data:
+            report["report_data"] = decode_archive_payload(report["report_data"])
         archives[str(report["year"])][str(report["month"])].append(report)
     return {"status": "success", "archives": dict(archives)}
 
+def handle_get_cache_stats(payload, conn, cursor):
+    """Response cache counters of the worker process that served this request."""
+    return {"status": "success", "cache": RESPONSE_CACHE.stats()}
+
+def handle_create_backup(payload, conn, cursor):
+    try:
+        result = backup_database(keep=int(payload.get("keep") or BACKUP_KEEP))
+    except (BackupError, ValueError) as e:
+        return {"status": "error", "message": f"สำรองข้อมูลไม่สำเร็จ: {e}"}
+    result["backups"] = [p.name for p in list_backups()]
+    return {"status": "success", "message": f"สำรองข้อมูลเป็น {result['file']} สำเร็จ", **result}
+
+def handle_get_availability_range(payload, conn, cursor, session):
+    """
+    Per-day availability per department for start_date..end_date (inclusive).
+    Non-admins only see their own department.
+    """
+    try:
+        start = date.fromisoformat(payload.get("start_date", ""))
+        end = date.fromisoformat(payload.get("end_date", ""))
+    except ValueError:
+        return {"status": "error", "message": "กรุณาระบุวันที่ให้ถูกต้อง"}
+    if end < start or (end - start).days >= AVAILABILITY_MAX_DAYS:
+        return {"status": "error", "message": f"ช่วงวันที่ต้องไม่เกิน {AVAILABILITY_MAX_DAYS} วัน"}
+
+    department = payload.get("department") if session.get("role") == "admin" else session.get("department")
+    totals = {dept: counts["total"] for dept, counts in department_headcounts(cursor).items() if not department or dept == department}
+
+    unavailable = count_unavailable_by_day(cursor, start.isoformat(), end.isoformat(), department)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    availability = {}
+    for dept, total in totals.items():
+        counts = [unavailable.get((d, dept), 0) for d in dates]
+        availability[dept] = {"total": total, "unavailable": counts, "available": [total - c for c in counts]}
+
+    return {"status": "success", "dates": dates, "availability": availability}
+
+def handle_get_daily_trends(payload, conn, cursor, session):
+    """
+    Monthly trends from the rollup tables. payload: start/end as "YYYY-MM",
+    optional department and category. Averages are per reported day.
+    """
+    try:
+        start_year, start_month = map(int, payload.get("start", "").split('-'))
+        end_year, end_month = map(int, payload.get("end", "").split('-'))
+    except ValueError:
+        return {"status": "error", "message": "กรุณาระบุช่วงเดือนให้ถูกต้อง (YYYY-MM)"}
+
+    where = "(year * 100 + month) BETWEEN ? AND ?"
+    params = [start_year * 100 + start_month, end_year * 100 + end_month]
+    if payload.get("department"):
+        where += " AND department = ?"
+        params.append(payload["department"])
+    if payload.get("category"):
+        where += " AND category = ?"
+        params.append(payload["category"])
+
+    cursor.execute(f"""
+        SELECT year, month, department, category, report_days,
+               ROUND(CAST(total_sum AS REAL) / report_days, 2) AS avg_total,
+               ROUND(CAST(available_sum AS REAL) / report_days, 2) AS avg_available,
+               ROUND(CAST(mission_sum AS REAL) / report_days, 2) AS avg_mission
+        FROM daily_rollups WHERE {where} AND report_days > 0
+        ORDER BY year, month, department, category
+    """, params)
+    trends = [dict(row) for row in cursor.fetchall()]
+
+    cursor.execute(f"SELECT year, month, department, category, status, person_days FROM daily_status_rollups WHERE {where} AND person_days > 0", params)
+    status_days = defaultdict(dict)
+    for row in cursor.fetchall():
+        status_days[(row['year'], row['month'], row['department'], row['category'])][row['status']] = row['person_days']
+    for trend in trends:
+        trend["status_person_days"] = status_days.get((trend['year'], trend['month'], trend['department'], trend['category']), {})
+
+    return {"status": "success", "trends": trends}
+
 def handle_list_holidays(payload, conn, cursor, session):
     cursor.execute("SELECT date, description FROM holidays ORDER BY date ASC")
     holidays = [dict(row) for row in cursor.fetchall()]
@@ -964,95 +2423,1197 @@ def handle_delete_holiday(payload, conn, cursor, session):
 # --- END: DAILY SYSTEM ACTION HANDLERS ---
 
 
+# --- START: RESPONSE CACHE ---
+# Repeated admin reads are served from a per-process LRU. Entries are keyed by
+# the generation of every table group (tag) the action reads. Triggers on the
+# tag's tables bump its row in cache_generations inside the writing
+# transaction, so every write path (handlers, writer jobs, maintenance
+# scripts) invalidates, and every worker process sees it.
+RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+RESPONSE_CACHE_TAGS = {
+    "users": ("users",),
+    "personnel": ("personnel",),
+    "status_reports": ("status_reports",),
+    "daily_reports": ("daily_reports", "archived_daily_reports"),
+    "holidays": ("holidays",),
+    "settings": ("system_settings",),
+}
+
+def init_cache_generations(cursor):
+    cursor.execute('CREATE TABLE IF NOT EXISTS cache_generations (tag TEXT PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0)')
+    cursor.executemany("INSERT OR IGNORE INTO cache_generations (tag) VALUES (?)", [(tag,) for tag in RESPONSE_CACHE_TAGS])
+    for tag, tables in RESPONSE_CACHE_TAGS.items():
+        for table in tables:
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_cache_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE cache_generations SET generation = generation + 1 WHERE tag = '{tag}';
+                    END
+                """)
+
+class ResponseCache:
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (response, size)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, response):
+        size = len(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self.size -= old[1]
+            self._entries[key] = (response, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {"pid": os.getpid(), "entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+RESPONSE_CACHE = ResponseCache()
+
+def response_cache_key(cursor, action_name, payload, session, tags):
+    """Key for a cacheable read; must run inside the request's read snapshot."""
+    cursor.execute(f"SELECT tag, generation FROM cache_generations WHERE tag IN ({', '.join('?' for _ in tags)}) ORDER BY tag", tags)
+    generations = tuple((row['tag'], row['generation']) for row in cursor.fetchall())
+    scope = "admin" if session and session.get("role") == "admin" else (session or {}).get("department")
+    # Target dates and week ranges fall back on today's date, so the day is part of the key too.
+    return (current_db_file(), action_name, json.dumps(payload, sort_keys=True, ensure_ascii=False), scope,
+            date.today().isoformat(), generations)
+# --- END: RESPONSE CACHE ---
+
+# --- START: SERVER-SIDE STREAMING EXPORT ---
+# Export actions return a StreamingResponse whose chunks are produced while
+# the rows are read, so neither the server nor the browser ever holds a whole
+# year of reports in memory. They are reached with a plain GET to /export so
+# the browser saves the stream straight to disk.
+EXPORT_FORMATS = ("csv", "xlsx")
+EXPORT_CHUNK_ROWS = 500
+EXPORT_CATEGORIES = {'officer': 'สัญญาบัตร', 'nco': 'ประทวน', 'civilian': 'พลเรือน'}
+
+class StreamingResponse:
+    """A handler result that is sent as a stream of byte chunks instead of JSON."""
+    def __init__(self, chunks, content_type, filename=None):
+        self.chunks = chunks
+        self.content_type = content_type
+        self.filename = filename
+        self._on_close = []
+
+    def headers(self):
+        if not self.filename:
+            return []
+        return [('Content-Disposition', f"attachment; filename*=UTF-8''{quote(self.filename)}")]
+
+    def call_on_close(self, fn):
+        self._on_close.append(fn)
+
+    def close(self):
+        close_chunks = getattr(self.chunks, "close", None)
+        if close_chunks:
+            close_chunks()
+        for fn in self._on_close:
+            fn()
+
+class _ChunkBuffer:
+    """Write-only sink that zipfile/csv write into and the stream drains."""
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(p.encode('utf-8') if isinstance(p, str) else p for p in self._parts)
+        self._parts = []
+        return data
+
+def _csv_chunks(header, rows):
+    buffer = _ChunkBuffer()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff') # BOM so Excel opens Thai text as UTF-8
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.drain()
+    yield buffer.drain()
+
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    "_rels/.rels": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    "xl/workbook.xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="รายงาน" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    "xl/_rels/workbook.xml.rels": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>',
+}
+
+def _xlsx_row(values):
+    cells = ''.join(f'<c t="inlineStr"><is><t xml:space="preserve">{xml_escape(str(v))}</t></is></c>' for v in values)
+    return f'<row>{cells}</row>'.encode('utf-8')
+
+def _xlsx_chunks(header, rows):
+    """Writes a minimal single-sheet workbook into a non-seekable zip stream."""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            zf.writestr(name, content)
+        with zf.open("xl/worksheets/sheet1.xml", 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row(header))
+            for i, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row))
+                if i % EXPORT_CHUNK_ROWS == 0:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+        yield buffer.drain()
+    yield buffer.drain()
+
+def _parse_export_payload(payload):
+    """Validates the shared export filters; returns (filters, error_response)."""
+    export_format = payload.get("format", "csv")
+    category = payload.get("category") or None
+    try:
+        start_date = date.fromisoformat(payload.get("start_date", ""))
+        end_date = date.fromisoformat(payload.get("end_date", ""))
+    except ValueError:
+        return None, {"status": "error", "message": "กรุณาระบุช่วงวันที่ให้ถูกต้อง (YYYY-MM-DD)"}
+    if export_format not in EXPORT_FORMATS:
+        return None, {"status": "error", "message": "รูปแบบไฟล์ไม่ถูกต้อง"}
+    if category and category not in EXPORT_CATEGORIES:
+        return None, {"status": "error", "message": "ประเภทกำลังพลไม่ถูกต้อง"}
+    if end_date < start_date:
+        return None, {"status": "error", "message": "วันที่สิ้นสุดต้องไม่น้อยกว่าวันที่เริ่มต้น"}
+    return {
+        "format": export_format, "category": category, "department": payload.get("department") or None,
+        "start_date": start_date, "end_date": end_date
+    }, None
+
+def _streaming_export(filters, filename_prefix, header, rows):
+    chunks = (_xlsx_chunks if filters["format"] == "xlsx" else _csv_chunks)(header, rows)
+    content_type = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" if filters["format"] == "xlsx"
+                    else "text/csv; charset=utf-8")
+    filename = f"{filename_prefix}-{filters['start_date'].isoformat()}-{filters['end_date'].isoformat()}.{filters['format']}"
+    return StreamingResponse(chunks, content_type, filename)
+
+def _personnel_name_lookup(cursor):
+    cursor.execute("SELECT id, rank, first_name, last_name FROM personnel")
+    return {row['id']: (row['rank'], f"{row['rank']} {row['first_name']} {row['last_name']}") for row in cursor.fetchall()}
+
+def _rank_category(rank):
+    for category, ranks in RANK_CLASSIFICATION.items():
+        if rank in ranks:
+            return category
+    return None
+
+def handle_export_daily_reports(payload, conn, cursor, session):
+    filters, error = _parse_export_payload(payload)
+    if error:
+        return error
+    if session.get("role") != "admin":
+        filters["department"] = session.get("department")
+    names = _personnel_name_lookup(cursor)
+    start_str, end_str = filters["start_date"].isoformat(), filters["end_date"].isoformat()
+    categories = [filters["category"]] if filters["category"] else list(EXPORT_CATEGORIES)
+
+    where = "report_date >= ? AND report_date <= ?"
+    params = [start_str, end_str]
+    if filters["department"]:
+        where += " AND department = ?"
+        params.append(filters["department"])
+
+    def report_rows():
+        cursor.execute(f"SELECT report_date, department, submitted_by, report_data FROM daily_reports WHERE {where} ORDER BY report_date, department", params)
+        yield from cursor
+        years = list(range(filters["start_date"].year, filters["end_date"].year + 1))
+        for schema in iter_archive_sources(conn, years):
+            cursor.execute(f"SELECT report_date, department, submitted_by, report_data FROM {schema}.archived_daily_reports WHERE {where} ORDER BY report_date, department", params)
+            yield from cursor
+
+    def rows():
+        for report in report_rows():
+            report_data = decode_archive_payload(report['report_data']) or {}
+            for category in categories:
+                for item in report_data.get(category, []):
+                    name = item.get("personnel_name") or names.get(item.get("personnel_id"), ('', ''))[1]
+                    yield [report['report_date'], report['department'], EXPORT_CATEGORIES[category], name,
+                           item.get("status", ''), item.get("details", ''), item.get("start_date", ''), item.get("end_date", ''),
+                           report['submitted_by']]
+
+    header = ["วันที่รายงาน", "แผนก", "ประเภท", "ยศ-ชื่อ-สกุล", "สถานะ", "รายละเอียด", "วันที่เริ่ม", "วันที่สิ้นสุด", "ผู้ส่ง"]
+    return _streaming_export(filters, "daily-report", header, rows())
+
+def handle_export_weekly_reports(payload, conn, cursor, session):
+    filters, error = _parse_export_payload(payload)
+    if error:
+        return error
+    if session.get("role") != "admin":
+        filters["department"] = session.get("department")
+    names = _personnel_name_lookup(cursor)
+    # Weekly reports are filed by their own submission timestamp, archived ones included.
+    start_str = filters["start_date"].isoformat()
+    end_str = (filters["end_date"] + timedelta(days=1)).isoformat()
+    scope = " AND department = ?" if filters["department"] else ""
+    params = [start_str, end_str] + ([filters["department"]] if filters["department"] else [])
+
+    def report_batches():
+        cursor.execute(f"SELECT department, timestamp, report_data FROM status_reports WHERE timestamp >= ? AND timestamp < ?{scope} ORDER BY timestamp", params)
+        for row in cursor:
+            yield [{"department": row['department'], "timestamp": row['timestamp'], "items": json.loads(row['report_data'])}]
+        # A batch is stamped when it was archived, which can be well after its reports were
+        # submitted, so the history index picks the batches holding reports from this range.
+        cursor.execute(f"""
+            SELECT DISTINCT archive_id, archived_at FROM submission_history
+            WHERE source = 'archived' AND timestamp >= ? AND timestamp < ?{scope}
+        """, params)
+        batches = cursor.fetchall()
+        archive_ids = sorted({row['archive_id'] for row in batches})
+        if not archive_ids:
+            return
+        years = {int(str(row['archived_at'])[:4]) for row in batches if row['archived_at']}
+        for schema in iter_archive_sources(conn, years):
+            cursor.execute(f"SELECT report_data FROM {schema}.archived_reports WHERE id IN ({', '.join('?' for _ in archive_ids)}) ORDER BY timestamp",
+                           archive_ids)
+            for row in cursor.fetchall():
+                yield decode_archive_payload(row['report_data'])
+
+    def rows():
+        for reports in report_batches():
+            for report in reports:
+                timestamp = str(report.get("timestamp") or report.get("date") or '')
+                if not start_str <= timestamp < end_str:
+                    continue
+                if filters["department"] and report.get("department") != filters["department"]:
+                    continue
+                for item in report.get("items", []):
+                    rank, name = names.get(item.get("personnel_id"), (None, None))
+                    name = item.get("personnel_name") or name or ''
+                    if rank is None:
+                        rank = name.split(' ')[0] if name else ''
+                    category = _rank_category(rank)
+                    if filters["category"] and category != filters["category"]:
+                        continue
+                    yield [timestamp[:10], report.get("department", ''), EXPORT_CATEGORIES.get(category, ''), name,
+                           item.get("status", ''), item.get("details", ''), item.get("start_date", ''), item.get("end_date", '')]
+
+    header = ["วันที่ส่ง", "แผนก", "ประเภท", "ยศ-ชื่อ-สกุล", "สถานะ", "รายละเอียด", "วันที่เริ่ม", "วันที่สิ้นสุด"]
+    return _streaming_export(filters, "weekly-report", header, rows())
+# --- END: SERVER-SIDE STREAMING EXPORT ---
+
+# --- START: ADMISSION CONTROL ---
+# Caps how many /api requests run at once, per action class and overall.
+# Requests over the cap wait in one bounded queue, best priority first
+# (submissions, then logins, user reads and finally admin reads such as
+# dashboard polling). They are turned away with 503 + Retry-After when their
+# class's wait deadline passes, or when a better request needs their queue slot.
+# A waiter only holds back worse classes while its own class has room; one
+# stuck behind its class limit does not block others from idle capacity.
+ADMISSION_MAX_ACTIVE = 12   # below ASYNC_EXECUTOR_WORKERS so admitted work never queues in the executor
+ADMISSION_QUEUE_SIZE = 64
+ADMISSION_RETRY_AFTER = 3   # seconds, sent as Retry-After with every 503
+ADMISSION_PEEK_BYTES = 256  # the action name is read from the start of the body
+ADMISSION_CLASSES = {
+    # class: (concurrent limit, priority (lower is admitted first), seconds a request may wait)
+    "submit": (8, 0, 20),
+    "login": (4, 1, 10),
+    "read": (8, 2, 8),
+    "admin": (4, 3, 5),
+}
+ADMISSION_BUSY_MESSAGE = "ขณะนี้มีผู้ใช้งานระบบจำนวนมาก กรุณาลองใหม่อีกครั้งในอีกสักครู่"
+_ACTION_NAME_RE = re.compile(rb'"action"\s*:\s*"([A-Za-z_]+)"')
+
+class _AdmissionWaiter:
+    __slots__ = ("action_class", "priority", "seq", "wake", "state")
+
+    def __init__(self, action_class, priority, seq, wake):
+        self.action_class = action_class
+        self.priority = priority
+        self.seq = seq
+        self.wake = wake
+        self.state = "waiting"  # -> "admitted", "shed" or "expired"
+
+class AdmissionTicket:
+    """A running request's slot; release() is idempotent."""
+    def __init__(self, controller, action_class):
+        self._controller = controller
+        self.action_class = action_class
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller.release(self.action_class)
+
+class AdmissionController:
+    def __init__(self, classes=ADMISSION_CLASSES, max_active=ADMISSION_MAX_ACTIVE, queue_size=ADMISSION_QUEUE_SIZE):
+        self.classes = classes
+        self.max_active = max_active
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._active = dict.fromkeys(classes, 0)
+        self._total = 0
+        self._waiting = []  # kept sorted by (priority, seq)
+        self._seq = 0
+
+    def _class_has_room(self, action_class):
+        return self._active[action_class] < self.classes[action_class][0]
+
+    def _fits(self, action_class):
+        return self._total < self.max_active and self._class_has_room(action_class)
+
+    def _start(self, action_class):
+        self._active[action_class] += 1
+        self._total += 1
+        return AdmissionTicket(self, action_class)
+
+    def _try_enter(self, action_class, wake):
+        """Returns (ticket, waiter): a ticket to run now, a queued waiter, or neither when shed."""
+        priority = self.classes[action_class][1]
+        with self._lock:
+            # Only jump in if nobody of equal or better priority is waiting for the same free capacity.
+            if self._fits(action_class) and not any(w.priority <= priority and self._class_has_room(w.action_class)
+                                                    for w in self._waiting):
+                return self._start(action_class), None
+            if len(self._waiting) >= self.queue_size:
+                worst = self._waiting[-1]
+                if worst.priority <= priority:
+                    return None, None
+                self._waiting.pop()
+                worst.state = "shed"
+                worst.wake()
+            self._seq += 1
+            waiter = _AdmissionWaiter(action_class, priority, self._seq, wake)
+            self._waiting.append(waiter)
+            self._waiting.sort(key=lambda w: (w.priority, w.seq))
+            return None, waiter
+
+    def _settle(self, waiter):
+        """Called once a waiter stops waiting; returns its ticket if it was admitted in time."""
+        with self._lock:
+            if waiter.state == "admitted":
+                return AdmissionTicket(self, waiter.action_class)
+            if waiter.state == "waiting":
+                self._waiting.remove(waiter)
+                waiter.state = "expired"
+            return None
+
+    def release(self, action_class):
+        with self._lock:
+            self._active[action_class] -= 1
+            self._total -= 1
+            for waiter in list(self._waiting):
+                if self._total >= self.max_active:
+                    break
+                if self._fits(waiter.action_class):
+                    self._waiting.remove(waiter)
+                    self._start(waiter.action_class)
+                    waiter.state = "admitted"
+                    waiter.wake()
+
+    def admit(self, action_class):
+        """Blocks until the request may run; returns an AdmissionTicket, or None if it was shed."""
+        woken = threading.Event()
+        ticket, waiter = self._try_enter(action_class, woken.set)
+        if waiter is None:
+            return ticket
+        woken.wait(self.classes[action_class][2])
+        return self._settle(waiter)
+
+    async def admit_async(self, action_class):
+        """admit() for the asyncio engine: waits on the event loop instead of holding a thread."""
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+        def wake():
+            loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+        ticket, waiter = self._try_enter(action_class, wake)
+        if waiter is None:
+            return ticket
+        try:
+            await asyncio.wait_for(woken, self.classes[action_class][2])
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            ticket = self._settle(waiter)
+            if ticket:
+                ticket.release()
+            raise
+        return self._settle(waiter)
+
+    def stats(self):
+        with self._lock:
+            return {"active": dict(self._active), "waiting": len(self._waiting)}
+
+ADMISSION = AdmissionController()
+
+def peek_action_name(body):
+    """The action of a raw /api body (bytes or RequestBody), read from its start without parsing the payload;
+    None when the action is not within the first ADMISSION_PEEK_BYTES."""
+    head = body.head if isinstance(body, RequestBody) else body
+    match = _ACTION_NAME_RE.search(head[:ADMISSION_PEEK_BYTES])
+    return match.group(1).decode('ascii') if match else None
+
+def admission_rejected_response():
+    return {"status": "error", "message": ADMISSION_BUSY_MESSAGE}, 503, [('Retry-After', str(ADMISSION_RETRY_AFTER))]
+
+def release_after_response(ticket, response_data):
+    """Frees the slot now, or when a streaming response has been sent."""
+    if isinstance(response_data, StreamingResponse):
+        response_data.call_on_close(ticket.release)
+    else:
+        ticket.release()
+# --- END: ADMISSION CONTROL ---
+
+# --- START: REQUEST BODY LIMITS ---
+# Only the start of an /api body is read before its action is known; a
+# Content-Length over that action's "max_body" (MAX_REQUEST_BODY by default)
+# is answered with 413 and the connection is closed without reading the rest.
+# Actions flagged "stream_items" (bulk uploads) are not read up front at all:
+# the named payload array reaches the handler as an iterator that parses one
+# item at a time off the socket, so the raw body never sits in memory whole.
+MAX_REQUEST_BODY = 1024 * 1024
+REQUEST_BODY_CHUNK = 64 * 1024
+REQUEST_TOO_LARGE_MESSAGE = "ข้อมูลที่ส่งมีขนาดใหญ่เกินกว่าที่ระบบรองรับ"
+
+def request_too_large_response():
+    return {"status": "error", "message": REQUEST_TOO_LARGE_MESSAGE}, 413, None
+
+class RequestBody:
+    """An /api body still on the socket; head holds the bytes read to find its action."""
+
+    def __init__(self, head, remaining, read, items_key):
+        self.head = head
+        self.remaining = remaining
+        self.items_key = items_key
+        self._read = read
+        self._pending = head
+
+    def read(self, size=REQUEST_BODY_CHUNK):
+        if self._pending:
+            chunk, self._pending = self._pending, b''
+            return chunk
+        if self.remaining <= 0:
+            return b''
+        chunk = self._read(min(size, self.remaining))
+        if not chunk:
+            raise ConnectionError("client closed the connection before sending the whole body")
+        self.remaining -= len(chunk)
+        return chunk
+
+class JSONStreamReader:
+    """Pulls JSON values off a RequestBody, decoding only what the caller asks for."""
+    _WHITESPACE = " \t\r\n"
+
+    def __init__(self, body):
+        self._body = body
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            raise ValueError("JSON ends unexpectedly")
+        chunk = self._body.read()
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(chunk, final=self._eof)
+        self._pos = 0
+
+    def peek(self):
+        """The next non-whitespace character (not consumed); '' at the end of the body."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self._WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos:self._pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} in JSON, found {char!r}")
+        self._pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A value that runs to the end of the buffer may continue in the next chunk (e.g. a number).
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def members(self):
+        """Yields the keys of the object that starts here; the caller must consume each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("JSON object key must be a string")
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+def parse_streamed_request(body):
+    """
+    (action, payload) for a RequestBody. payload[body.items_key] is an iterator
+    over the array's items; payload keys after the array are added once it has
+    been consumed, and a malformed body raises ValueError from the iterator.
+    """
+    reader = JSONStreamReader(body)
+    members = reader.members()
+    action, payload = None, {}
+    for key in members:
+        if key == "action":
+            action = reader.value()
+        elif key == "payload" and reader.peek() == '{':
+            break
+        else:
+            reader.value()
+    else:
+        return action, payload
+    if not isinstance(action, str):
+        raise ValueError('"action" must come before "payload"')
+
+    payload_members = reader.members()
+
+    def items():
+        reader.expect('[')
+        if reader.peek() == ']':
+            reader.expect(']')
+        else:
+            while True:
+                yield reader.value()
+                if reader.expect(',]') == ']':
+                    break
+        for key in payload_members:
+            payload[key] = reader.value()
+        for key in members:
+            if key == "action":
+                raise ValueError('duplicate "action" in JSON body')
+            reader.value()
+        if reader.peek():
+            raise ValueError("unexpected data after the JSON body")
+
+    for key in payload_members:
+        if key == body.items_key and reader.peek() == '[':
+            payload[key] = items()
+            break
+        payload[key] = reader.value()
+    else:
+        for key in members:
+            reader.value()
+    return action, payload
+# --- END: REQUEST BODY LIMITS ---
+
+# --- START: REQUEST PROFILER ---
+# start_profiling arms the server to profile its next N API requests
+# (optionally only one action). Each runs under cProfile while a sampler
+# thread records its call stacks; the totals are written to PROFILE_DIR as
+# <name>.pstats (pstats, snakeviz) and <name>.collapsed (flamegraph.pl,
+# speedscope) and fetched with GET /export?action=download_profile&name=...
+# With --workers, the countdown lives in shared memory so every worker takes
+# part. Each worker writes its own files (its pid is in the name) once the
+# countdown ends: straight away if it is serving a profiled request then,
+# otherwise when its next request arrives.
+PROFILE_DIR = "profiles"
+PROFILER_MAX_REQUESTS = 500
+PROFILER_SAMPLE_INTERVAL = 0.001 # seconds between stack samples
+PROFILER_ACTIONS = ("start_profiling", "stop_profiling", "list_profiles", "download_profile")
+_PROFILE_NAME_RE = re.compile(r'^[\w.-]+\.(pstats|collapsed)$')
+
+def profile_dir():
+    return Path(DB_FILE).resolve().parent / PROFILE_DIR
+
+class _StackSampler(threading.Thread):
+    """Counts the folded call stacks of one thread every PROFILER_SAMPLE_INTERVAL."""
+    def __init__(self, thread_id):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(PROFILER_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class RequestProfiler:
+    def __init__(self):
+        # Shared with forked workers; the countdown's lock guards all three.
+        self._remaining = multiprocessing.Value('i', 0)
+        self._armed_action = multiprocessing.Array('c', 64)
+        self._armed_generation = multiprocessing.Value('i', 0, lock=False)  # bumped by every arm()
+        self._lock = threading.Lock()
+        # cProfile only sees its own thread (and allows one active profiler on 3.12+),
+        # so profiled requests run one at a time; others pass through untouched.
+        self._busy = threading.Lock()
+        # What this process has collected, and for which arm() it was.
+        self.generation = 0
+        self.action = None
+        self.profiled = 0
+        self._stats = None
+        self._stacks = Counter()
+
+    def arm(self, requests, action=None):
+        with self._remaining.get_lock():
+            self._remaining.value = requests
+            self._armed_action.value = (action or '').encode('ascii')
+            self._armed_generation.value += 1
+
+    def stop(self):
+        """Ends the countdown in every process; returns (whether it was running, file stem saved here or None)."""
+        with self._remaining.get_lock():
+            was_running = self._remaining.value > 0
+            self._remaining.value = 0
+        return was_running, self.save()
+
+    def _claim(self, action_name):
+        """(generation, action) of the countdown if this request takes one of its slots, else None."""
+        if action_name in PROFILER_ACTIONS or not self._busy.acquire(blocking=False):
+            return None
+        with self._remaining.get_lock():
+            action = self._armed_action.value.decode('ascii') or None
+            if self._remaining.value > 0 and not (action and action_name != action):
+                self._remaining.value -= 1
+                return self._armed_generation.value, action
+        self._busy.release()
+        return None
+
+    def _collection_done(self):
+        """True once the countdown this process collected for has ended or been re-armed."""
+        with self._remaining.get_lock():
+            return self._remaining.value <= 0 or self._armed_generation.value != self.generation
+
+    def run(self, action_name, fn, *args):
+        """Calls fn(*args), profiled if the profiler is armed for action_name."""
+        if self._stats is not None and self._collection_done():
+            self.save()
+        claim = self._claim(action_name) if self._remaining.value > 0 else None
+        if claim is None:
+            return fn(*args)
+        profile = cProfile.Profile()
+        sampler = _StackSampler(threading.get_ident())
+        # The sampler needs the GIL to look; by default the request would hold it for 5 ms at a time.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(PROFILER_SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            return profile.runcall(fn, *args)
+        finally:
+            sampler.stop()
+            sys.setswitchinterval(switch_interval)
+            if self._stats is not None and self.generation != claim[0]:
+                self.save()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                    self.generation, self.action = claim
+                else:
+                    self._stats.add(profile)
+                self._stacks.update(sampler.stacks)
+                self.profiled += 1
+            self._busy.release()
+            if self._collection_done():
+                self.save()
+
+    def save(self):
+        """Writes and clears what this process has collected; returns the file stem, or None if nothing was."""
+        with self._lock:
+            stats, stacks, count, action = self._stats, self._stacks, self.profiled, self.action
+            self._stats, self._stacks, self.profiled = None, Counter(), 0
+        if stats is None:
+            return None
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{action or 'all'}-{count}req-{os.getpid()}"
+        stats.dump_stats(str(directory / f"{name}.pstats"))
+        with open(directory / f"{name}.collapsed", "w", encoding="utf-8") as f:
+            for stack, samples in sorted(stacks.items()):
+                f.write(f"{stack} {samples}\n")
+        print(f" -> บันทึกผลการโปรไฟล์ {count} คำขอที่ {directory / name}.*")
+        return name
+
+    def status(self):
+        with self._remaining.get_lock():
+            remaining, action = self._remaining.value, self._armed_action.value.decode('ascii') or None
+        with self._lock:
+            return {"pid": os.getpid(), "remaining": remaining, "action": action, "profiled": self.profiled}
+
+REQUEST_PROFILER = RequestProfiler()
+
+def handle_start_profiling(payload, conn, cursor):
+    try:
+        requests = int(payload.get("requests", 20))
+    except (TypeError, ValueError):
+        requests = 0
+    if not 1 <= requests <= PROFILER_MAX_REQUESTS:
+        return {"status": "error", "message": f"จำนวนคำขอต้องอยู่ระหว่าง 1 ถึง {PROFILER_MAX_REQUESTS}"}
+    action = payload.get("action") or None
+    if action and (action not in APIHandler.ACTION_MAP or action in PROFILER_ACTIONS):
+        return {"status": "error", "message": "ไม่รู้จักคำสั่งที่ต้องการโปรไฟล์"}
+    REQUEST_PROFILER.arm(requests, action)
+    return {"status": "success", "message": f"จะโปรไฟล์ {requests} คำขอถัดไป" + (f" ของ {action}" if action else ""),
+            "profiler": REQUEST_PROFILER.status()}
+
+def handle_stop_profiling(payload, conn, cursor):
+    was_running, name = REQUEST_PROFILER.stop()
+    if not name:
+        if was_running:
+            # The requests profiled so far ran in other workers; each saves its part on its next request.
+            return {"status": "success", "message": "หยุดการโปรไฟล์แล้ว ผลจาก worker อื่นจะถูกบันทึกเมื่อได้รับคำขอถัดไป"}
+        return {"status": "error", "message": "ยังไม่มีคำขอที่ถูกโปรไฟล์"}
+    return {"status": "success", "message": f"บันทึกผลการโปรไฟล์เป็น {name} แล้ว", "name": name}
+
+def handle_list_profiles(payload, conn, cursor):
+    directory = profile_dir()
+    files = sorted(directory.iterdir(), reverse=True) if directory.is_dir() else []
+    profiles = [{"name": f.name, "size": f.stat().st_size} for f in files if _PROFILE_NAME_RE.match(f.name)]
+    return {"status": "success", "profiles": profiles, "profiler": REQUEST_PROFILER.status()}
+
+def handle_download_profile(payload, conn, cursor):
+    name = payload.get("name", "")
+    path = profile_dir() / name
+    if not _PROFILE_NAME_RE.match(name) or not path.is_file():
+        return {"status": "error", "message": "ไม่พบไฟล์ผลการโปรไฟล์"}
+
+    def chunks():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+    content_type = "text/plain; charset=utf-8" if name.endswith(".collapsed") else "application/octet-stream"
+    return StreamingResponse(chunks(), content_type, name)
+# --- END: REQUEST PROFILER ---
+
+# --- START: STATIC ASSET BUNDLES ---
+# At startup every HTML page's module entry script is bundled together with
+# its import graph into one file, whitespace-minified and gzip-compressed
+# once, and served as /assets/<entry>.<content hash>.js with an immutable
+# Cache-Control. The pages themselves are served rewritten to point at those
+# names and are revalidated on every load, so a restart with new code is
+# picked up immediately. Start with --no-bundle to serve the source modules.
+ASSET_PREFIX = "/assets/"
+ASSET_HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PAGE_CACHE_CONTROL = "no-cache"
+
+# name -> StaticAsset for everything served from memory (bundles and rewritten pages).
+STATIC_ASSETS = {}
+
+_MODULE_SCRIPT_RE = re.compile(r'<script\b[^>]*\btype="module"[^>]*>', re.I)
+_SCRIPT_SRC_RE = re.compile(r'\bsrc="([\w.-]+\.js)"')
+_IMPORT_RE = re.compile(r"""^import\s+(?:\*\s+as\s+(\w+)|\{([^}]*)\})\s+from\s+['"](\.{1,2}/[\w./-]+\.js)['"];?[ \t]*(?://.*)?$""", re.M)
+_EXPORT_RE = re.compile(r"^export\s+((?:async\s+)?function\*?|const|class)\s+(\w+)", re.M)
+_LEFTOVER_MODULE_SYNTAX_RE = re.compile(r"^\s*(?:import\b(?!\s*\()|export\b)", re.M)
+# After one of these a '/' starts a regular expression rather than a division.
+_REGEX_AFTER_CHARS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_AFTER_WORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+
+
+class BundleError(Exception):
+    """Raised when a module uses syntax the bundler does not rewrite."""
+
+
+class StaticAsset:
+    __slots__ = ("body", "gzip_body", "mimetype", "cache_control", "etag")
+
+    def __init__(self, body, mimetype, cache_control):
+        self.body = body
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.gzip_body = gzipped if len(gzipped) < len(body) else None
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = 'W/"' + hashlib.sha256(body).hexdigest()[:ASSET_HASH_LENGTH] + '"'
+
+
+def minify_js(source):
+    """
+    Drops comments, indentation, trailing spaces and blank lines and collapses
+    runs of spaces. Line breaks are kept so automatic semicolon insertion works
+    exactly as in the source; strings, template literals and regular
+    expressions are copied untouched.
+    """
+    source = source.replace('\r\n', '\n')
+    out = []
+    n = len(source)
+    i = 0
+    depth = 0                 # open '{' in code
+    template_depths = []      # depth at which each enclosing '${' was opened
+    in_template = False
+    last_char = ''            # last significant character emitted in code
+    last_word = ''
+
+    def copy_quoted(start, quote):
+        j = start + 1
+        while j < n and source[j] != quote:
+            j += 2 if source[j] == '\\' else 1
+        return j + 1
+
+    while i < n:
+        c = source[i]
+        if in_template:
+            if c == '\\':
+                out.append(source[i:i + 2])
+                i += 2
+            elif c == '`':
+                out.append(c)
+                i += 1
+                in_template = False
+                last_char, last_word = c, ''
+            elif source.startswith('${', i):
+                out.append('${')
+                i += 2
+                template_depths.append(depth)
+                depth += 1
+                in_template = False
+                last_char, last_word = '{', ''
+            else:
+                out.append(c)
+                i += 1
+            continue
+
+        if c == '\n':
+            while out and out[-1] in (' ', '\t'):
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            i += 1
+            while i < n and source[i] in ' \t':
+                i += 1
+        elif c in ' \t':
+            while i < n and source[i] in ' \t':
+                i += 1
+            if out and out[-1] not in (' ', '\n'):
+                out.append(' ')
+        elif source.startswith('//', i):
+            while i < n and source[i] != '\n':
+                i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            if out and out[-1] not in (' ', '\n'):
+                out.append(' ')
+        elif c in '\'"':
+            end = copy_quoted(i, c)
+            out.append(source[i:end])
+            i = end
+            last_char, last_word = c, ''
+        elif c == '`':
+            out.append(c)
+            i += 1
+            in_template = True
+        elif c == '/' and (not last_char or last_char in _REGEX_AFTER_CHARS or last_word in _REGEX_AFTER_WORDS):
+            j = i + 1
+            in_class = False
+            while j < n and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                elif source[j] == '/' and not in_class:
+                    break
+                j += 1
+            out.append(source[i:j + 1])
+            i = j + 1
+            last_char, last_word = '/', ''
+        elif c.isalnum() or c in '_$':
+            j = i
+            while j < n and (source[j].isalnum() or source[j] in '_$'):
+                j += 1
+            last_word = source[i:j]
+            out.append(last_word)
+            i = j
+            last_char = last_word[-1]
+        else:
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+                if template_depths and template_depths[-1] == depth:
+                    template_depths.pop()
+                    in_template = True
+            out.append(c)
+            i += 1
+            last_char, last_word = c, ''
+    return ''.join(out).strip('\n') + '\n'
+
+
+def _module_graph(entry, root):
+    """Returns the modules reachable from entry, dependencies first, with their sources."""
+    order, sources, visiting = [], {}, set()
+
+    def visit(name):
+        if name in sources:
+            return
+        if name in visiting:
+            raise BundleError(f"พบการ import วนซ้ำที่ {name}")
+        visiting.add(name)
+        with open(os.path.join(root, name), encoding='utf-8') as f:
+            source = f.read().replace('\r\n', '\n')
+        for match in _IMPORT_RE.finditer(source):
+            visit(_resolve_module(name, match.group(3)))
+        visiting.discard(name)
+        sources[name] = source
+        order.append(name)
+
+    visit(entry)
+    return [(name, sources[name]) for name in order]
+
+
+def _resolve_module(importer, specifier):
+    return os.path.normpath(os.path.join(os.path.dirname(importer), specifier)).replace(os.sep, '/')
+
+
+def _wrap_module(name, source):
+    """Turns one ES module into a function scope registered in __modules."""
+    def rewrite_import(match):
+        namespace, names, specifier = match.groups()
+        key = json.dumps(_resolve_module(name, specifier))
+        if namespace:
+            return f"const {namespace} = __modules[{key}];"
+        bindings = ", ".join(re.sub(r"\s+as\s+", ": ", part.strip()) for part in names.split(",") if part.strip())
+        return f"const {{ {bindings} }} = __modules[{key}];"
+
+    exports = []
+
+    def rewrite_export(match):
+        exports.append(match.group(2))
+        return f"{match.group(1)} {match.group(2)}"
+
+    body = _EXPORT_RE.sub(rewrite_export, _IMPORT_RE.sub(rewrite_import, source))
+    leftover = _LEFTOVER_MODULE_SYNTAX_RE.search(body)
+    if leftover:
+        line = body.count('\n', 0, leftover.start()) + 1
+        raise BundleError(f"{name}:{line}: ไม่รองรับรูปแบบ import/export นี้")
+    # Getters keep the bindings live, as they are between real modules.
+    getters = ", ".join(f"get {export}() {{ return {export}; }}" for export in exports)
+    return f"__modules[{json.dumps(name)}] = (() => {{\n{body}\nreturn {{ {getters} }};\n}})();\n"
+
+
+def build_bundle(entry, root="."):
+    """Bundles entry and its imports; returns the minified source."""
+    parts = [f"// {entry} bundle\nconst __modules = {{}};\n"]
+    for name, source in _module_graph(entry, root):
+        parts.append(_wrap_module(name, source))
+    return minify_js("".join(parts))
+
+
+def build_static_assets(root="."):
+    """Bundles the module entry script of every HTML page and rewrites the pages to load the bundles."""
+    assets = {}
+    bundle_paths = {}
+
+    def bundle_path(entry):
+        if entry not in bundle_paths:
+            body = build_bundle(entry, root).encode('utf-8')
+            digest = hashlib.sha256(body).hexdigest()[:ASSET_HASH_LENGTH]
+            path = f"{ASSET_PREFIX}{os.path.splitext(entry)[0]}.{digest}.js"
+            assets[path] = StaticAsset(body, APIHandler.MIMETYPES['.js'], IMMUTABLE_CACHE_CONTROL)
+            bundle_paths[entry] = path
+        return bundle_paths[entry]
+
+    for page in sorted(Path(root).glob("*.html")):
+        html = page.read_text(encoding='utf-8')
+        failed = []
+
+        def rewrite_tag(match):
+            tag = match.group(0)
+            src = _SCRIPT_SRC_RE.search(tag)
+            if not src:
+                return tag
+            try:
+                path = bundle_path(src.group(1))
+            except (BundleError, OSError) as e:
+                failed.append(f"{src.group(1)}: {e}")
+                return tag
+            return tag.replace(src.group(0), f'src="{path}"')
+
+        rewritten = _MODULE_SCRIPT_RE.sub(rewrite_tag, html)
+        for error in failed:
+            print(f" -> [assets] ใช้ไฟล์ต้นฉบับแทน bundle ({page.name}) {error}")
+        if rewritten != html:
+            assets[f"/{page.name}"] = StaticAsset(rewritten.encode('utf-8'), APIHandler.MIMETYPES['.html'], PAGE_CACHE_CONTROL)
+
+    STATIC_ASSETS.clear()
+    STATIC_ASSETS.update(assets)
+    bundles = sorted(path for path in assets if path.startswith(ASSET_PREFIX))
+    print(f" -> [assets] สร้าง bundle {len(bundles)} ไฟล์: {', '.join(bundles)}")
+
+
+def accepts_gzip(accept_encoding):
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+# --- END: STATIC ASSET BUNDLES ---
+
+
+
 # --- HTTP Request Handler ---
 class APIHandler(BaseHTTPRequestHandler):
     ACTION_MAP = {
         # Weekly System Actions
-        "login": {"handler": handle_login, "auth_required": False},
+        "login": {"handler": handle_login, "auth_required": False, "admission": "login", "max_body": 4 * 1024},
         "logout": {"handler": handle_logout, "auth_required": True},
-        "get_dashboard_summary": {"handler": handle_get_dashboard_summary, "auth_required": True, "admin_only": True},
-        "list_users": {"handler": handle_list_users, "auth_required": True, "admin_only": True},
+        "get_dashboard_summary": {"handler": handle_get_dashboard_summary, "auth_required": True, "admin_only": True, "read_only": True},
+        "list_users": {"handler": handle_list_users, "auth_required": True, "admin_only": True, "read_only": True},
         "add_user": {"handler": handle_add_user, "auth_required": True, "admin_only": True},
         "update_user": {"handler": handle_update_user, "auth_required": True, "admin_only": True},
         "delete_user": {"handler": handle_delete_user, "auth_required": True, "admin_only": True},
-        "list_personnel": {"handler": handle_list_personnel, "auth_required": True},
-        "get_personnel_details": {"handler": handle_get_personnel_details, "auth_required": True, "admin_only": True},
+        "list_personnel": {"handler": handle_list_personnel, "auth_required": True, "read_only": True},
+        "sync_roster": {"handler": handle_sync_roster, "auth_required": True, "read_only": True},
+        "get_personnel_details": {"handler": handle_get_personnel_details, "auth_required": True, "admin_only": True, "read_only": True},
         "add_personnel": {"handler": handle_add_personnel, "auth_required": True, "admin_only": True},
         "update_personnel": {"handler": handle_update_personnel, "auth_required": True, "admin_only": True},
         "delete_personnel": {"handler": handle_delete_personnel, "auth_required": True, "admin_only": True},
-        "import_personnel": {"handler": handle_import_personnel, "auth_required": True, "admin_only": True},
-        "submit_status_report": {"handler": handle_submit_status_report, "auth_required": True},
-        "get_status_reports": {"handler": handle_get_status_reports, "auth_required": True, "admin_only": True},
+        "import_personnel": {"handler": handle_import_personnel, "auth_required": True, "admin_only": True,
+                             "max_body": 32 * 1024 * 1024, "stream_items": "personnel"},
+        "submit_status_report": {"handler": handle_submit_status_report, "auth_required": True, "admission": "submit"},
+        "get_status_reports": {"handler": handle_get_status_reports, "auth_required": True, "admin_only": True, "read_only": True,
+                               "cache_tags": ("users", "personnel", "status_reports", "settings")},
         "archive_reports": {"handler": handle_archive_reports, "auth_required": True, "admin_only": True},
-        "get_archived_reports": {"handler": handle_get_archived_reports, "auth_required": True, "admin_only": True},
-        "get_submission_history": {"handler": handle_get_submission_history, "auth_required": True},
-        "get_report_for_editing": {"handler": handle_get_report_for_editing, "auth_required": True},
-        "get_active_statuses": {"handler": handle_get_active_statuses, "auth_required": True},
+        "get_archived_reports": {"handler": handle_get_archived_reports, "auth_required": True, "admin_only": True, "read_only": True},
+        "get_submission_history": {"handler": handle_get_submission_history, "auth_required": True, "read_only": True},
+        "get_submission_reports": {"handler": handle_get_submission_reports, "auth_required": True, "read_only": True},
+        "get_report_for_editing": {"handler": handle_get_report_for_editing, "auth_required": True, "read_only": True},
+        "get_active_statuses": {"handler": handle_get_active_statuses, "auth_required": True, "read_only": True},
+        "get_cache_stats": {"handler": handle_get_cache_stats, "auth_required": True, "admin_only": True, "read_only": True},
+        "start_profiling": {"handler": handle_start_profiling, "auth_required": True, "admin_only": True, "read_only": True},
+        "stop_profiling": {"handler": handle_stop_profiling, "auth_required": True, "admin_only": True, "read_only": True},
+        "list_profiles": {"handler": handle_list_profiles, "auth_required": True, "admin_only": True, "read_only": True},
+        "create_backup": {"handler": handle_create_backup, "auth_required": True, "admin_only": True},
+        "get_availability_range": {"handler": handle_get_availability_range, "auth_required": True, "read_only": True},
 
         # Daily System Actions
-        "get_daily_dashboard_summary": {"handler": handle_get_daily_dashboard_summary, "auth_required": True, "admin_only": True},
-        "get_daily_personnel_for_submission": {"handler": handle_get_daily_personnel_for_submission, "auth_required": True},
-        "submit_daily_report": {"handler": handle_submit_daily_report, "auth_required": True},
-        "get_daily_submission_history": {"handler": handle_get_daily_submission_history, "auth_required": True},
-        "get_daily_final_report": {"handler": handle_get_daily_final_report, "auth_required": True, "admin_only": True},
+        "get_daily_dashboard_summary": {"handler": handle_get_daily_dashboard_summary, "auth_required": True, "admin_only": True, "read_only": True,
+                                        "cache_tags": ("users", "personnel", "daily_reports", "holidays")},
+        "get_daily_personnel_for_submission": {"handler": handle_get_daily_personnel_for_submission, "auth_required": True, "read_only": True},
+        "submit_daily_report": {"handler": handle_submit_daily_report, "auth_required": True, "admission": "submit"},
+        "get_daily_submission_history": {"handler": handle_get_daily_submission_history, "auth_required": True, "read_only": True},
+        "get_daily_final_report": {"handler": handle_get_daily_final_report, "auth_required": True, "admin_only": True, "read_only": True,
+                                   "cache_tags": ("users", "personnel", "daily_reports", "holidays")},
         "archive_daily_reports": {"handler": handle_archive_daily_reports, "auth_required": True, "admin_only": True},
-        "get_archived_daily_reports": {"handler": handle_get_archived_daily_reports, "auth_required": True, "admin_only": True},
-        "list_holidays": {"handler": handle_list_holidays, "auth_required": True, "admin_only": True},
+        "get_archived_daily_reports": {"handler": handle_get_archived_daily_reports, "auth_required": True, "admin_only": True, "read_only": True},
+        "get_daily_trends": {"handler": handle_get_daily_trends, "auth_required": True, "admin_only": True, "read_only": True},
+        "list_holidays": {"handler": handle_list_holidays, "auth_required": True, "admin_only": True, "read_only": True, "cache_tags": ("holidays",)},
         "add_holiday": {"handler": handle_add_holiday, "auth_required": True, "admin_only": True},
         "delete_holiday": {"handler": handle_delete_holiday, "auth_required": True, "admin_only": True},
+
+        # Streaming exports (GET /export?action=...)
+        "export_daily_reports": {"handler": handle_export_daily_reports, "auth_required": True, "read_only": True, "streaming": True, "admission": "admin"},
+        "export_weekly_reports": {"handler": handle_export_weekly_reports, "auth_required": True, "read_only": True, "streaming": True, "admission": "admin"},
+        "download_profile": {"handler": handle_download_profile, "auth_required": True, "admin_only": True, "read_only": True, "streaming": True},
     }
 
-    def _serve_static_file(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        path_map = {'/': '/login.html', '/main': '/main.html', '/daily': '/daily.html'}
-        path = path_map.get(path, path)
-        filepath = path.lstrip('/')
-        if not os.path.exists(filepath):
-            self.send_error(404, "File not found")
-            return
-        mimetypes = {'.html': 'text/html', '.js': 'application/javascript', '.css': 'text/css'}
-        mimetype = mimetypes.get(os.path.splitext(filepath)[1], 'application/octet-stream')
-        self.send_response(200)
-        self.send_header('Content-type', mimetype)
-        self.end_headers()
-        with open(filepath, 'rb') as f:
-            self.wfile.write(f.read())
+    STATIC_PATH_MAP = {'/': '/login.html', '/main': '/main.html', '/daily': '/daily.html'}
+    MIMETYPES = {'.html': 'text/html', '.js': 'application/javascript', '.css': 'text/css'}
+    # Server-written directories and database files under the web root that must never be served.
+    STATIC_DENIED_DIRS = {PROFILE_DIR, BACKUP_DIR, ARCHIVE_TIER_DIR}
+    STATIC_DENIED_SUFFIXES = ('.db', '.db-wal', '.db-shm', '.db-journal')
 
-    def do_GET(self):
-        self._serve_static_file()
+    @classmethod
+    def resolve_static_file(cls, raw_path):
+        """Maps a request path to (filepath, mimetype), or None when the file does not exist or is not public."""
+        path = urlparse(raw_path).path
+        path = cls.STATIC_PATH_MAP.get(path, path)
+        filepath = os.path.normpath(path.lstrip('/'))
+        if filepath.startswith('..') or os.path.isabs(filepath) or filepath.split(os.sep)[0] in cls.STATIC_DENIED_DIRS:
+            return None
+        if filepath.lower().endswith(cls.STATIC_DENIED_SUFFIXES):
+            return None
+        if not os.path.isfile(filepath):
+            return None
+        return filepath, cls.MIMETYPES.get(os.path.splitext(filepath)[1], 'application/octet-stream')
 
-    def do_POST(self):
-        if self.path == "/api":
-            self._handle_api_request()
-        else:
-            self.send_error(404, "Endpoint not found")
+    @classmethod
+    def asset_response(cls, raw_path, accept_encoding=None, if_none_match=None):
+        """(status, mimetype, body, headers) for a bundle or rewritten page held in STATIC_ASSETS, else None."""
+        path = urlparse(raw_path).path
+        asset = STATIC_ASSETS.get(cls.STATIC_PATH_MAP.get(path, path))
+        if asset is None:
+            return None
+        headers = [('Cache-Control', asset.cache_control), ('ETag', asset.etag), ('Vary', 'Accept-Encoding')]
+        if if_none_match and asset.etag in if_none_match:
+            return 304, asset.mimetype, b'', headers
+        if asset.gzip_body and accepts_gzip(accept_encoding):
+            return 200, asset.mimetype, asset.gzip_body, headers + [('Content-Encoding', 'gzip')]
+        return 200, asset.mimetype, asset.body, headers
 
-    def _send_json_response(self, data, status_code=200, headers=None):
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        if headers:
-            for key, value in headers:
-                self.send_header(key, value)
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
-
-    def _get_session(self):
-        cookie_header = self.headers.get('Cookie')
-        if not cookie_header: return None
-        cookies = dict(item.strip().split('=', 1) for item in cookie_header.split(';') if '=' in item)
-        session_token = cookies.get('session_token')
+    @staticmethod
+    def get_session_from_cookie(cookie_header):
+        session_token = parse_cookies(cookie_header).get('session_token')
         if not session_token: return None
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        expiry_limit = datetime.now() - timedelta(seconds=SESSION_TIMEOUT_SECONDS)
-        cursor.execute("DELETE FROM sessions WHERE created_at < ?", (expiry_limit,))
-        conn.commit()
-
-        cursor.execute("SELECT u.username, u.role, u.department, s.created_at FROM sessions s JOIN users u ON s.username = u.username WHERE s.token = ?", (session_token,))
+        # Expired rows are removed by the session_sweep maintenance job.
+        expiry_limit = (datetime.now() - timedelta(seconds=SESSION_TIMEOUT_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute("SELECT u.username, u.role, u.department, s.created_at FROM sessions s JOIN users u ON s.username = u.username WHERE s.token = ? AND s.created_at >= ?",
+                       (session_token, expiry_limit))
         session_data = cursor.fetchone()
         conn.close()
         
@@ -1062,54 +3623,536 @@ class APIHandler(BaseHTTPRequestHandler):
             return session_dict
         return None
 
-    def _handle_api_request(self):
+    @classmethod
+    def admission_class(cls, body):
+        """Admission class of a raw /api body, from the action name at its start."""
+        config = cls.ACTION_MAP.get(peek_action_name(body), {})
+        return config.get("admission") or ("admin" if config.get("admin_only") else "read")
+
+    @classmethod
+    def body_policy(cls, head):
+        """(max body bytes, payload key streamed to the handler or None) for an /api body starting with head."""
+        config = cls.ACTION_MAP.get(peek_action_name(head), {})
+        return config.get("max_body", MAX_REQUEST_BODY), config.get("stream_items")
+
+    @classmethod
+    def process_api_request(cls, body, cookie_header, client_address, host=None):
+        """
+        Runs one /api call independently of the server engine, once admitted.
+        Returns (response_data, status_code, headers).
+        """
+        ticket = ADMISSION.admit(cls.admission_class(body))
+        if ticket is None:
+            return admission_rejected_response()
+        try:
+            response = cls.run_admitted_request(body, cookie_header, client_address, host)
+        except BaseException:
+            ticket.release()
+            raise
+        release_after_response(ticket, response[0])
+        return response
+
+    @classmethod
+    def run_admitted_request(cls, body, cookie_header, client_address, host=None):
+        REQUEST_ACTIVITY.enter()
+        try:
+            return REQUEST_PROFILER.run(peek_action_name(body), cls._dispatch_api_request, body, cookie_header, client_address, host)
+        finally:
+            REQUEST_ACTIVITY.exit()
+
+    @classmethod
+    def _dispatch_api_request(cls, body, cookie_header, client_address, host):
         action_name = "unknown"
         try:
-            session = self._get_session()
-            content_length = int(self.headers['Content-Length'])
-            request_data = json.loads(self.rfile.read(content_length).decode('utf-8'))
-            action_name, payload = request_data.get("action"), request_data.get("payload", {})
-            action_config = self.ACTION_MAP.get(action_name)
+            try:
+                if isinstance(body, RequestBody):
+                    parsed_action, payload = parse_streamed_request(body)
+                else:
+                    request_data = json.loads(body.decode('utf-8'))
+                    parsed_action, payload = request_data.get("action"), request_data.get("payload", {})
+            except ValueError:
+                return {"status": "error", "message": "รูปแบบคำขอไม่ถูกต้อง"}, 400, None
+            peeked_action = peek_action_name(body)
+            if peeked_action is not None and parsed_action != peeked_action:
+                # The size limit, streaming and admission class were chosen for the
+                # action found at the start of the body; it must be the one that runs.
+                # A body whose action comes later got the defaults and runs as parsed.
+                return {"status": "error", "message": "รูปแบบคำขอไม่ถูกต้อง"}, 400, None
+            action_name = parsed_action
+            login_unit = payload.get("unit") if action_name == "login" else None
+            unit = resolve_unit(host, cookie_header, login_unit)
+            with use_database(DATABASES.get(unit, DB_FILE)):
+                response_data, status_code, headers = cls._run_action(action_name, payload, cookie_header, client_address)
+            if login_unit and unit == login_unit and status_code == 200 and response_data.get("status") == "success":
+                # Later requests from this browser stay on the unit chosen at login.
+                headers = (headers or []) + [('Set-Cookie', f'unit={quote(unit)}; Path=/; SameSite=Strict')]
+            return response_data, status_code, headers
+        except Exception as e:
+            print(f"API Error on action '{action_name}': {e}")
+            return {"status": "error", "message": "Server error"}, 500, None
+
+    @classmethod
+    def _run_action(cls, action_name, payload, cookie_header, client_address):
+        try:
+            session = cls.get_session_from_cookie(cookie_header)
+            action_config = cls.ACTION_MAP.get(action_name)
             if not action_config:
-                return self._send_json_response({"status": "error", "message": "ไม่รู้จักคำสั่งนี้"}, 404)
+                return {"status": "error", "message": "ไม่รู้จักคำสั่งนี้"}, 404, None
             if action_config.get("auth_required") and not session:
-                return self._send_json_response({"status": "error", "message": "Unauthorized"}, 401)
+                return {"status": "error", "message": "Unauthorized"}, 401, None
             if action_config.get("admin_only") and (not session or session.get("role") != "admin"):
-                return self._send_json_response({"status": "error", "message": "คุณไม่มีสิทธิ์ดำเนินการ"}, 403)
+                return {"status": "error", "message": "คุณไม่มีสิทธิ์ดำเนินการ"}, 403, None
             
-            conn = get_db_connection()
+            read_only = action_config.get("read_only", False)
+            conn = get_db_connection(read_only)
             cursor = conn.cursor()
+            if read_only:
+                # One read transaction per request: every query sees the same WAL snapshot.
+                cursor.execute("BEGIN")
             try:
                 handler_kwargs = {"payload": payload, "conn": conn, "cursor": cursor}
                 if action_name == "login":
-                    handler_kwargs["client_address"] = self.client_address
+                    handler_kwargs["client_address"] = client_address
                 if session and action_name in [
-                    "logout", "list_personnel", "submit_status_report",
-                    "get_submission_history", "get_active_statuses",
+                    "logout", "list_users", "list_personnel", "sync_roster", "submit_status_report",
+                    "get_submission_history", "get_submission_reports", "get_active_statuses", "get_availability_range",
                     "get_daily_personnel_for_submission", "submit_daily_report",
                     "get_daily_dashboard_summary", "get_daily_submission_history",
                     "get_daily_final_report", "archive_daily_reports",
                     "get_archived_daily_reports", "archive_reports",
-                    "list_holidays", "add_holiday", "delete_holiday"
+                    "list_holidays", "add_holiday", "delete_holiday", "get_daily_trends",
+                    "export_daily_reports", "export_weekly_reports"
                     ]:
                     handler_kwargs["session"] = session
 
+                cache_key = None
+                if action_config.get("cache_tags"):
+                    cache_key = response_cache_key(cursor, action_name, payload, session, action_config["cache_tags"])
+                    cached = RESPONSE_CACHE.get(cache_key)
+                    if cached is not None:
+                        return cached, 200, None
+
                 response_data = action_config["handler"](**handler_kwargs)
                 headers = None
                 if isinstance(response_data, tuple):
                     response_data, headers = response_data
-                self._send_json_response(response_data, headers=headers)
+                succeeded = isinstance(response_data, dict) and response_data.get("status") == "success"
+                if cache_key and succeeded and headers is None:
+                    RESPONSE_CACHE.put(cache_key, response_data)
+                if isinstance(response_data, StreamingResponse):
+                    # The stream keeps reading after we return; the engine closes it when done.
+                    response_data.call_on_close(conn.close)
+                    conn = None
+                return response_data, 200, headers
             finally:
-                conn.close()
+                if conn is not None:
+                    conn.close()
         except Exception as e:
             print(f"API Error on action '{action_name}': {e}")
-            self._send_json_response({"status": "error", "message": "Server error"}, 500)
+            return {"status": "error", "message": "Server error"}, 500, None
+
+    @classmethod
+    def process_export_request(cls, raw_path, cookie_header, client_address, host=None):
+        """GET /export?action=...&...: query parameters become the payload of a streaming action."""
+        query = {k: v[-1] for k, v in parse_qs(urlparse(raw_path).query).items()}
+        action_name = query.pop("action", None)
+        if not cls.ACTION_MAP.get(action_name, {}).get("streaming"):
+            return {"status": "error", "message": "ไม่รู้จักคำสั่งนี้"}, 404, None
+        body = json.dumps({"action": action_name, "payload": query}).encode('utf-8')
+        return cls.process_api_request(body, cookie_header, client_address, host)
+
+    def _serve_static_file(self):
+        response = self.asset_response(self.path, self.headers.get('Accept-Encoding'), self.headers.get('If-None-Match'))
+        if response is None:
+            resolved = self.resolve_static_file(self.path)
+            if not resolved:
+                self.send_error(404, "File not found")
+                return
+            filepath, mimetype = resolved
+            response = 200, mimetype, _read_file_bytes(filepath), []
+        status_code, mimetype, body, headers = response
+        self.send_response(status_code)
+        self.send_header('Content-type', mimetype)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/export":
+            response_data, status_code, headers = self.process_export_request(self.path, self.headers.get('Cookie'), self.client_address, self.headers.get('Host'))
+            self._send_json_response(response_data, status_code, headers)
+            return
+        self._serve_static_file()
+
+    def do_POST(self):
+        if self.path == "/api":
+            self._handle_api_request()
+        else:
+            self.send_error(404, "Endpoint not found")
+
+    def _send_json_response(self, data, status_code=200, headers=None):
+        if isinstance(data, StreamingResponse):
+            return self._send_stream_response(data, status_code, headers)
+        self.send_response(status_code)
+        self.send_header('Content-type', 'application/json')
+        if headers:
+            for key, value in headers:
+                self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
 
-def run(server_class=HTTPServer, handler_class=APIHandler, port=9999):
-    init_db()
-    httpd = server_class(('', port), handler_class)
-    print(f"เซิร์ฟเวอร์ระบบจัดการกำลังพลกำลังทำงานที่ http://localhost:{port}")
-    httpd.serve_forever()
+    def _send_stream_response(self, stream, status_code=200, headers=None):
+        try:
+            self.send_response(status_code)
+            self.send_header('Content-type', stream.content_type)
+            for key, value in stream.headers() + (headers or []):
+                self.send_header(key, value)
+            self.end_headers()
+            for chunk in stream.chunks:
+                if chunk:
+                    self.wfile.write(chunk)
+        except Exception as e:
+            print(f"Stream Error: {e}")
+        finally:
+            self.close_connection = True
+            stream.close()
+
+    def _get_session(self):
+        return self.get_session_from_cookie(self.headers.get('Cookie'))
+
+    def _handle_api_request(self):
+        try:
+            content_length = int(self.headers['Content-Length'])
+            if content_length < 0:
+                raise ValueError(f"invalid Content-Length {content_length}")
+            head = self.rfile.read(min(content_length, ADMISSION_PEEK_BYTES))
+            max_body, items_key = self.body_policy(head)
+            if content_length > max_body:
+                self.close_connection = True
+                return self._send_json_response(*request_too_large_response())
+            if items_key:
+                body = RequestBody(head, content_length - len(head), self.rfile.read, items_key)
+            else:
+                body = head + self.rfile.read(content_length - len(head))
+        except Exception as e:
+            print(f"API Error on action 'unknown': {e}")
+            return self._send_json_response({"status": "error", "message": "Server error"}, 500)
+        response_data, status_code, headers = self.process_api_request(body, self.headers.get('Cookie'), self.client_address, self.headers.get('Host'))
+        if isinstance(body, RequestBody) and body.remaining:
+            # Rejected before the handler read it all; the rest cannot be told apart from a next request.
+            self.close_connection = True
+        self._send_json_response(response_data, status_code, headers)
+
+
+# --- START: ASYNCIO SERVER ENGINE ---
+# An alternative to http.server for slow links: idle keep-alive connections
+# cost a coroutine instead of a thread, while SQLite and PBKDF2 work runs
+# on a thread pool so the event loop never blocks.
+ASYNC_EXECUTOR_WORKERS = 16
+ASYNC_KEEPALIVE_TIMEOUT = 75 # seconds an idle connection may wait for its next request
+ASYNC_MAX_HEADER_LINES = 100
+
+class AsyncAPIServer:
+    def __init__(self, handler_class=APIHandler, port=9999, executor_workers=ASYNC_EXECUTOR_WORKERS):
+        self.handler_class = handler_class
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="api-worker")
+
+    async def serve_forever(self, sock=None):
+        if sock is not None:
+            server = await asyncio.start_server(self._handle_connection, sock=sock)
+        else:
+            server = await asyncio.start_server(self._handle_connection, '', self.port)
+        async with server:
+            await server.serve_forever()
+
+    async def _read_request(self, reader):
+        """Returns (method, path, version, headers) or None when the client has gone away."""
+        request_line = await asyncio.wait_for(reader.readline(), ASYNC_KEEPALIVE_TIMEOUT)
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ValueError("Malformed request line")
+        method, path, version = parts
+        headers = {}
+        for _ in range(ASYNC_MAX_HEADER_LINES):
+            line = await asyncio.wait_for(reader.readline(), ASYNC_KEEPALIVE_TIMEOUT)
+            if line in (b'\r\n', b'\n', b''):
+                return method, path, version, headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        raise ValueError("Too many headers")
+
+    async def _send_response(self, writer, status_code, content_type, body, keep_alive, headers=None):
+        lines = [
+            f"HTTP/1.1 {status_code} {HTTPStatus(status_code).phrase}",
+            f"Date: {formatdate(usegmt=True)}",
+            f"Content-type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        for key, value in headers or []:
+            lines.append(f"{key}: {value}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_api_response(self, writer, response_data, status_code, keep_alive, headers=None):
+        if not isinstance(response_data, StreamingResponse):
+            await self._send_response(writer, status_code, 'application/json',
+                                      json.dumps(response_data).encode('utf-8'), keep_alive, headers)
+            return
+        loop = asyncio.get_running_loop()
+        stream = response_data
+        try:
+            lines = [
+                f"HTTP/1.1 {status_code} {HTTPStatus(status_code).phrase}",
+                f"Date: {formatdate(usegmt=True)}",
+                f"Content-type: {stream.content_type}",
+                "Transfer-Encoding: chunked",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            ]
+            for key, value in stream.headers() + (headers or []):
+                lines.append(f"{key}: {value}")
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            chunks = iter(stream.chunks)
+            while True:
+                # Producing a chunk reads SQLite, so it runs on the executor.
+                try:
+                    chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                except Exception as e:
+                    # Headers are already sent; the only way to signal failure is to cut the stream.
+                    print(f"Stream Error: {e}")
+                    raise ConnectionAbortedError() from e
+                if chunk is None:
+                    break
+                if chunk:
+                    writer.write(f"{len(chunk):X}\r\n".encode('latin-1') + chunk + b"\r\n")
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            await loop.run_in_executor(self.executor, stream.close)
+
+    @staticmethod
+    def _blocking_reader(reader, loop):
+        """read(size) for an executor thread, served by the event loop that owns reader."""
+        def read(size):
+            coroutine = asyncio.wait_for(reader.read(size), ASYNC_KEEPALIVE_TIMEOUT)
+            return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+        return read
+
+    async def _handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        client_address = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (asyncio.TimeoutError, ValueError, asyncio.IncompleteReadError):
+                    return
+                if request is None:
+                    return
+                method, path, version, headers = request
+                connection_header = headers.get('connection', '').lower()
+                keep_alive = connection_header == 'keep-alive' if version == 'HTTP/1.0' else connection_header != 'close'
+
+                if method == 'GET' and urlparse(path).path == '/export':
+                    response_data, status_code, extra_headers = await loop.run_in_executor(
+                        self.executor, self.handler_class.process_export_request, path, headers.get('cookie'), client_address, headers.get('host'))
+                    await self._send_api_response(writer, response_data, status_code, keep_alive, extra_headers)
+                elif method == 'GET':
+                    response = self.handler_class.asset_response(path, headers.get('accept-encoding'), headers.get('if-none-match'))
+                    resolved = None if response else self.handler_class.resolve_static_file(path)
+                    if response:
+                        status_code, mimetype, body, extra_headers = response
+                        await self._send_response(writer, status_code, mimetype, body, keep_alive, extra_headers)
+                    elif not resolved:
+                        await self._send_response(writer, 404, 'text/plain', b'File not found', keep_alive)
+                    else:
+                        filepath, mimetype = resolved
+                        body = await loop.run_in_executor(self.executor, _read_file_bytes, filepath)
+                        await self._send_response(writer, 200, mimetype, body, keep_alive)
+                elif method == 'POST' and path == '/api':
+                    try:
+                        content_length = int(headers.get('content-length', 0))
+                        head = await reader.readexactly(min(content_length, ADMISSION_PEEK_BYTES))
+                    except (ValueError, asyncio.IncompleteReadError):
+                        return
+                    max_body, items_key = self.handler_class.body_policy(head)
+                    if content_length > max_body:
+                        response_data, status_code, extra_headers = request_too_large_response()
+                        await self._send_api_response(writer, response_data, status_code, False, extra_headers)
+                        return
+                    if items_key:
+                        body = RequestBody(head, content_length - len(head), self._blocking_reader(reader, loop), items_key)
+                    else:
+                        try:
+                            body = head + await reader.readexactly(content_length - len(head))
+                        except asyncio.IncompleteReadError:
+                            return
+                    # Admission waits here on the loop, so queued requests do not tie up executor threads.
+                    ticket = await ADMISSION.admit_async(self.handler_class.admission_class(body))
+                    if ticket is None:
+                        response_data, status_code, extra_headers = admission_rejected_response()
+                    else:
+                        try:
+                            response_data, status_code, extra_headers = await loop.run_in_executor(
+                                self.executor, self.handler_class.run_admitted_request, body, headers.get('cookie'), client_address, headers.get('host'))
+                        except BaseException:
+                            ticket.release()
+                            raise
+                        release_after_response(ticket, response_data)
+                    if isinstance(body, RequestBody) and body.remaining:
+                        keep_alive = False
+                    await self._send_api_response(writer, response_data, status_code, keep_alive, extra_headers)
+                else:
+                    await self._send_response(writer, 404, 'text/plain', b'Endpoint not found', keep_alive)
+
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+def _read_file_bytes(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read()
+# --- END: ASYNCIO SERVER ENGINE ---
+
+SERVER_ENGINES = ("http", "asyncio")
+
+# --- START: PRE-FORK WORKER PROCESSES ---
+def _run_prefork(serve, workers, on_primary_start=None, services=None):
+    """
+    Forks `workers` children that all accept on the listening socket created
+    by the parent, and respawns any child that dies. Every child opens its own
+    connection pool; sessions and login lockouts are shared through SQLite.
+    on_primary_start runs in the first child only (and in its replacements),
+    e.g. to start the single maintenance scheduler. services maps a name to a
+    function run in its own (also respawned) child, e.g. the writer process.
+    """
+    if not hasattr(os, "fork"):
+        print("ระบบปฏิบัติการนี้ไม่รองรับ fork() จะทำงานแบบโปรเซสเดียว")
+        if on_primary_start:
+            on_primary_start()
+        serve()
+        return
+
+    children = {}  # pid -> worker slot
+    stopping = False
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                if slot in services:
+                    services[slot]()
+                    return
+                REQUEST_ACTIVITY.bind_slot(slot)
+                if slot == 0 and on_primary_start:
+                    on_primary_start()
+                serve()
+            finally:
+                os._exit(0)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    services = services or {}
+    for slot in list(services) + list(range(workers)):
+        spawn(slot)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f" -> เริ่มโปรเซสย่อย {workers} โปรเซส (pid หลัก {os.getpid()})")
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if not stopping and slot is not None:
+            print(f" -> โปรเซสย่อย {pid} หยุดทำงาน กำลังเริ่มใหม่...")
+            spawn(slot)
+# --- END: PRE-FORK WORKER PROCESSES ---
+
+def start_maintenance_scheduler():
+    schedulers = [MaintenanceScheduler(db_file) for db_file in all_database_files()]
+    for scheduler in schedulers:
+        scheduler.start()
+        print(f" -> เริ่มงานบำรุงรักษาเบื้องหลังของ {scheduler.db_file} ({', '.join(scheduler.jobs)}) ใน pid {os.getpid()}")
+    return schedulers
+
+class APIHTTPServer(ThreadingHTTPServer):
+    """The http engine: one thread per connection; ADMISSION bounds how many do API work at once."""
+    request_queue_size = 128 # same listen backlog as the asyncio engine
+    daemon_threads = True
+
+def run(server_class=APIHTTPServer, handler_class=APIHandler, port=9999, engine="http", workers=1, maintenance=True, bundle=True):
+    global WRITER_SERVICE
+    for db_file in all_database_files():
+        with use_database(db_file):
+            init_db()
+    # Built before fork() so every worker shares the same bundles.
+    if bundle:
+        build_static_assets()
+    # Worker processes must open their own connections after fork().
+    close_db_pools()
+    print(f"เซิร์ฟเวอร์ระบบจัดการกำลังพลกำลังทำงานที่ http://localhost:{port} (engine: {engine}, workers: {workers})")
+    if engine == "asyncio":
+        sock = socket.create_server(('', port), backlog=128)
+        serve = lambda: asyncio.run(AsyncAPIServer(handler_class, port).serve_forever(sock))
+    else:
+        httpd = server_class(('', port), handler_class)
+        serve = httpd.serve_forever
+
+    # Started inside the serving process: a thread would not survive fork().
+    on_start = start_maintenance_scheduler if maintenance else None
+    if workers > 1 and hasattr(os, "fork"):
+        REQUEST_ACTIVITY.configure(workers)
+        # Submissions from every worker go through one writer process, as with a single process.
+        WRITER_SERVICE = WriterService()
+        try:
+            _run_prefork(serve, workers, on_start, services={"writer": WRITER_SERVICE.serve})
+        finally:
+            WRITER_SERVICE.close()
+    elif workers > 1:
+        _run_prefork(serve, workers, on_start)
+    else:
+        if on_start:
+            on_start()
+        serve()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="เซิร์ฟเวอร์ระบบจัดการกำลังพล")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--engine", choices=SERVER_ENGINES, default="http", help="http = http.server เดิม, asyncio = asyncio streams")
+    parser.add_argument("--workers", type=int, default=1, help="จำนวนโปรเซสย่อยแบบ pre-fork (ค่าเริ่มต้น 1 = โปรเซสเดียว)")
+    parser.add_argument("--no-maintenance", action="store_true", help="ไม่เริ่มงานบำรุงรักษาเบื้องหลัง (ล้าง session, ANALYZE, checkpoint ฯลฯ)")
+    parser.add_argument("--database", action="append", default=[], metavar="NAME=FILE", help="เพิ่มหน่วยที่ใช้ฐานข้อมูลแยก (ระบุได้หลายครั้ง)")
+    parser.add_argument("--no-bundle", action="store_true", help="ส่งไฟล์ JavaScript ต้นฉบับแทน bundle ที่สร้างตอนเริ่มเซิร์ฟเวอร์ (สำหรับการพัฒนา)")
+    parser.add_argument("--host", action="append", default=[], metavar="HOST=NAME", help="ส่งคำขอที่มาจากชื่อโฮสต์นี้ไปยังหน่วย NAME")
+    args = parser.parse_args()
+    for option, target in ((args.database, DATABASES), (args.host, DATABASE_HOSTS)):
+        for item in option:
+            key, sep, value = item.partition('=')
+            if not sep or not key or not value:
+                parser.error(f"รูปแบบไม่ถูกต้อง: '{item}'")
+            target[key.strip().lower() if target is DATABASE_HOSTS else key.strip()] = value.strip()
+    unknown = set(DATABASE_HOSTS.values()) - set(DATABASES)
+    if unknown:
+        parser.error(f"ไม่พบหน่วย: {', '.join(sorted(unknown))}")
+    run(port=args.port, engine=args.engine, workers=args.workers, maintenance=not args.no_maintenance, bundle=not args.no_bundle)
\ No newline at end of file